@@ -21,9 +21,9 @@ more general than this one
 
 from itertools import islice
 import codecs
+import re
 
 from educe.annotation import Span, Standoff
-from educe.internalutil import ifilterfalse
 
 # I don't yet see how "too few public methods" is helpful
 # pylint: disable=R0903
@@ -111,6 +111,42 @@ def read_token_file(fname):
 # ---------------------------------------------------------------------
 
 
+_NON_SPACE_RE = re.compile(r"\S", re.UNICODE)
+
+
+def _char_token_span(text, start, token, tok_text, tok_chars, offset):
+    """
+    Character-wise alignment of a token (with whitespace removed)
+    on the text from position `start`, skipping over whitespace.
+
+    This is the slow path of `generic_token_spans`, for when the
+    token does not match the text.
+
+    Returns
+    -------
+    span : Span
+        Span of the token in the text, shifted by `offset`
+    """
+    prefix = [m.start() for m in
+              islice(_NON_SPACE_RE.finditer(text, start), len(tok_chars))]
+    if not prefix:
+        msg = "Too many tokens (current: %s)" % tok_text
+        raise EducePosTagException(msg)
+    span = Span(prefix[0] + offset, prefix[-1] + 1 + offset)
+    pretty_prefix = text[span.char_start:span.char_end]
+    # check the text prefix to make sure we have the same
+    # non-whitespace characters
+    for idx, tok_char in zip(prefix, tok_chars):
+        txt_char = text[idx]
+        if txt_char != tok_char:
+            msg = "token mismatch at char %d (%s vs %s)\n"\
+                % (idx, txt_char, tok_char)\
+                + " token: [%s]\n" % token\
+                + " text:  [%s]" % pretty_prefix
+            raise EducePosTagException(msg)
+    return span
+
+
 def generic_token_spans(text, tokens, offset=0, txtfn=None):
     """
     Given a string and a sequence of substrings within than string,
@@ -125,6 +161,11 @@ def generic_token_spans(text, tokens, offset=0, txtfn=None):
     shifted by passing an offset (the start of the original string's
     span). Empty tokens are accepted but have a zero-length span.
 
+    Tokens are looked up in bulk at the next non-whitespace character
+    of the text, then word by word if their whitespace differs from
+    that of the text. We only fall back to walking the text character
+    by character if this fails, to report the mismatch.
+
     Note: this function is lazy so you can use it incrementally
     provided you can generate the tokens lazily too
 
@@ -134,34 +175,38 @@ def generic_token_spans(text, tokens, offset=0, txtfn=None):
     :param txtfn: function to extract text from a token (default None,
                   treated as identity function)
     """
-    txt_iter = ifilterfalse(lambda x: x[1].isspace(),
-                            enumerate(text))
     txtfn = txtfn or (lambda x: x)
+    next_char = _NON_SPACE_RE.search
+    pos = 0  # next position to read from in the text
     last = offset  # for corner case of empty tokens
     for token in tokens:
-        tok_chars = list(ifilterfalse(lambda x: x.isspace(),
-                                      txtfn(token)))
-        if not tok_chars:
+        tok_text = txtfn(token)
+        tok_str = tok_text.strip()
+        if not tok_str:
             yield Span(last, last)
             continue
-        prefix = list(islice(txt_iter, len(tok_chars)))
-        if not prefix:
-            msg = "Too many tokens (current: %s)" % txtfn(token)
-            raise EducePosTagException(msg)
-        last = prefix[-1][0] + 1 + offset
-        span = Span(prefix[0][0] + offset, last)
-        pretty_prefix = text[span.char_start:span.char_end]
-        # check the text prefix to make sure we have the same
-        # non-whitespace characters
-        for txt_pair, tok_char in zip(prefix, tok_chars):
-            idx, txt_char = txt_pair
-            if txt_char != tok_char:
-                msg = "token mismatch at char %d (%s vs %s)\n"\
-                    % (idx, txt_char, tok_char)\
-                    + " token: [%s]\n" % token\
-                    + " text:  [%s]" % pretty_prefix
-                raise EducePosTagException(msg)
-        yield span
+        match = next_char(text, pos)
+        start = match.start() if match is not None else len(text)
+        if text.startswith(tok_str, start):
+            # same whitespace in the token and the text
+            pos = start + len(tok_str)
+        else:
+            # different whitespace: match the token word by word
+            pos = start
+            for word in tok_str.split():
+                match = next_char(text, pos)
+                if match is None or not text.startswith(word, match.start()):
+                    span = _char_token_span(text, start, token, tok_text,
+                                            ''.join(tok_str.split()),
+                                            offset)
+                    # no error: the text has whitespace inside a word
+                    # of the token (eg. "a\nb" for "ab"), or the token
+                    # runs past the end of the text (truncated span)
+                    pos = span.char_end - offset
+                    break
+                pos = match.start() + len(word)
+        last = pos + offset
+        yield Span(start + offset, last)
 
 
 def token_spans(text, tokens, offset=0):
@@ -12,7 +12,7 @@ Tests for educe.external
 import unittest
 
 from educe.annotation import Span
-from .postag import generic_token_spans
+from .postag import EducePosTagException, generic_token_spans
 
 
 class PosTag(unittest.TestCase):
@@ -39,3 +39,23 @@ class PosTag(unittest.TestCase):
                     Span(2, 4),
                     Span(8, 11)]
         self.assertEquals(expected, spans)
+
+    def test_split_align(self):
+        "ignore whitespace in text"
+
+        tokens = ["ab", "b b", "", "ccc"]
+        text = "a\nb bb \n c\tcc "
+        spans = list(generic_token_spans(text, tokens, offset=10))
+        expected = [Span(10, 13),
+                    Span(14, 16),
+                    Span(16, 16),
+                    Span(19, 23)]
+        self.assertEqual(expected, spans)
+
+    def test_bad_align(self):
+        "mismatches and leftover tokens"
+
+        text = "a bb    ccc"
+        for tokens in [["a", "bc"], ["a", "bb", "ccc", "d"]]:
+            spans = generic_token_spans(text, tokens)
+            self.assertRaises(EducePosTagException, list, spans)
@@ -95,7 +95,6 @@ Classes
 """
 
 from __future__ import print_function
-import copy
 import collections
 import subprocess
 import textwrap
@@ -103,7 +102,6 @@ import textwrap
 import pydot
 import pygraph.classes.hypergraph as gr
 import pygraph.classes.digraph as dgr
-from pygraph.algorithms import accessibility
 
 
 # pylint: disable=too-few-public-methods
@@ -197,6 +195,106 @@ class AttrsMixin():
             return self.mirror(x)
 
 
+_MISSING = object()
+"marker for attributes that are not set on a node/edge"
+
+
+class _GraphIndex(object):
+    """
+    Index over the objects of a `Graph`, kept up to date as the graph
+    is modified.
+
+    Every node/edge gets an integer row, and its 'type', 'annotation'
+    and 'mirror' attributes are stored in flat lists, so that looking
+    them up does not involve rebuilding an attribute dictionary.
+    As with `Graph._attrs`, an object that is both a node and an edge
+    gets the attributes of the edge.
+    The rows are updated one object at a time by the mutators of the
+    graph (see `refresh`), so that code which alternates lookups and
+    modifications (eg. `strip_cdus` in the STAC layer) does not
+    rebuild the whole index at each step.
+
+    Adjacency (incoming/outgoing relations and containing CDUs per
+    node) is filled out on demand by the graph, see `Graph._adjacency`,
+    and so is the CDU hierarchy (members and chain of containing CDUs),
+    see `Graph.cdu_members` and `Graph.containing_cdu_chain`.
+    These are discarded by any modification, see `forget_structure`.
+    """
+    def __init__(self, graph):
+        self.rows = {}
+        self.types = []
+        self.annotations = []
+        self.mirrors = []
+        for xs, attributes in [(graph.nodes(), graph.node_attributes),
+                               (graph.hyperedges(), graph.edge_attributes)]:
+            for x in xs:
+                self._set_row(x, attributes(x))
+        self.forget_structure()
+
+    def _set_row(self, x, attributes):
+        """
+        Store the attributes of a node/edge in its row, creating the
+        row if needed
+        """
+        attrs = dict(attributes)
+        row = self.rows.get(x)
+        if row is None:
+            self.rows[x] = len(self.types)
+            self.types.append(attrs.get('type', _MISSING))
+            self.annotations.append(attrs.get('annotation', _MISSING))
+            self.mirrors.append(attrs.get('mirror', _MISSING))
+        else:
+            self.types[row] = attrs.get('type', _MISSING)
+            self.annotations[row] = attrs.get('annotation', _MISSING)
+            self.mirrors[row] = attrs.get('mirror', _MISSING)
+
+    def refresh(self, graph, x):
+        """
+        Update the row of a node/edge after it has been added, deleted
+        or given an attribute.
+
+        The rows of deleted objects are left in the columns, they are
+        just no longer reachable.
+        """
+        if graph.has_hyperedge(x):
+            self._set_row(x, graph.edge_attributes(x))
+        elif graph.has_node(x):
+            self._set_row(x, graph.node_attributes(x))
+        else:
+            self.rows.pop(x, None)
+
+    def forget_structure(self):
+        """
+        Discard everything that is computed on demand from the
+        structure of the graph
+        """
+        # filled out by Graph._adjacency
+        self.incoming = None
+        self.outgoing = None
+        self.cdu_parents = None
+        # filled out by Graph.relations, edus, cdus
+        self.subsets = {}
+        # filled out by Graph.cdu_members, containing_cdu_chain
+        self.members = {}
+        self.cdu_chains = {}
+        # CDU heads, filled out by the project layer (eg. educe.stac.graph)
+        self.heads = {}
+
+    def lookup(self, column, x, attr):
+        """
+        Value of an attribute for a node/edge, raising the same
+        exceptions as a lookup in `Graph._attrs`
+        """
+        row = self.rows.get(x)
+        if row is None:
+            raise Exception("Tried to get attributes of non-existing object"
+                            " " + str(x))
+        val = column[row]
+        if val is _MISSING:
+            raise KeyError(attr)
+        return val
+
+
 class Graph(gr.hypergraph, AttrsMixin):
     """
     Hypergraph representation of discourse structure.
@@ -228,9 +326,146 @@ class Graph(gr.hypergraph, AttrsMixin):
     """
 
     def __init__(self):
+        self._graph_index = None
         AttrsMixin.__init__(self)
         gr.hypergraph.__init__(self)
 
+    # --------------------------------------------------
+    # index maintenance: modifications update the rows of the objects
+    # they touch and discard the rest of the index
+    # --------------------------------------------------
+
+    def _index(self):
+        """
+        `_GraphIndex` for the graph in its current state
+        """
+        if self._graph_index is None:
+            self._graph_index = _GraphIndex(self)
+        return self._graph_index
+
+    def _modified(self, x=None):
+        """
+        Update the index after a modification of the graph that
+        concerns the node/edge `x` (if any)
+        """
+        index = self._graph_index
+        if index is not None:
+            if x is not None:
+                index.refresh(self, x)
+            index.forget_structure()
+
+    def add_node(self, node):
+        gr.hypergraph.add_node(self, node)
+        self._modified(node)
+
+    def del_node(self, node):
+        gr.hypergraph.del_node(self, node)
+        self._modified(node)
+
+    def add_hyperedge(self, hyperedge):
+        gr.hypergraph.add_hyperedge(self, hyperedge)
+        self._modified(hyperedge)
+
+    def del_hyperedge(self, hyperedge):
+        # (same as the python-graph version, which looks the edge up in
+        # a fresh list of all the edges)
+        if self.has_hyperedge(hyperedge):
+            for node in self.edge_links[hyperedge]:
+                self.node_links[node].remove(hyperedge)
+            del self.edge_links[hyperedge]
+            self.del_edge_labeling(hyperedge)
+            self.graph.del_node((hyperedge, 'h'))
+        self._modified(hyperedge)
+
+    def link(self, node, hyperedge):
+        gr.hypergraph.link(self, node, hyperedge)
+        self._modified()
+
+    def unlink(self, node, hyperedge):
+        gr.hypergraph.unlink(self, node, hyperedge)
+        self._modified()
+
+    def add_node_attribute(self, node, attr):
+        gr.hypergraph.add_node_attribute(self, node, attr)
+        self._modified(node)
+
+    def add_edge_attribute(self, edge, attr):
+        gr.hypergraph.add_edge_attribute(self, edge, attr)
+        self._modified(edge)
+
+    # --------------------------------------------------
+    # attribute lookup
+    # --------------------------------------------------
+
+    def type(self, x):
+        """
+        Return if a node/edge is of type 'EDU', 'rel', or 'CDU'
+        """
+        index = self._index()
+        return index.lookup(index.types, x, 'type')
+
+    def annotation(self, x):
+        """
+        Return the annotation object corresponding to a node or edge
+        """
+        index = self._index()
+        return index.lookup(index.annotations, x, 'annotation')
+
+    def mirror(self, x):
+        """
+        For objects (particularly, relations/CDUs) that have a mirror image,
+        ie. an edge representation if it's a node or vice-versa, return the
+        identifier for that image
+        """
+        index = self._index()
+        return index.lookup(index.mirrors, x, 'mirror')
+
+    def _adjacency(self):
+        """
+        Index with the relations and CDUs around each node, see
+        `incoming_relations`, `outgoing_relations` and `containing_cdu`
+        """
+        index = self._index()
+        if index.incoming is None:
+            incoming = {}
+            outgoing = {}
+            cdu_parents = {}
+            for node in self.nodes():
+                n_in = []
+                n_out = []
+                n_cdus = []
+                for lnk in self.links(node):
+                    if self.is_relation(lnk):
+                        lnk_nodes = self.links(lnk)
+                        if len(lnk_nodes) == 2:
+                            if lnk_nodes[1] == node:
+                                n_in.append(lnk)
+                            if lnk_nodes[0] == node:
+                                n_out.append(lnk)
+                    elif self.is_cdu(lnk):
+                        n_cdus.append(lnk)
+                incoming[node] = n_in
+                outgoing[node] = n_out
+                cdu_parents[node] = n_cdus
+            index.incoming = incoming
+            index.outgoing = outgoing
+            index.cdu_parents = cdu_parents
+        return index
+
+    def incoming_relations(self, node):
+        """
+        Relation edges that point to this node (ie. of which the node
+        is the second link), in the order of `self.links(node)`
+        """
+        return self._adjacency().incoming[node]
+
+    def outgoing_relations(self, node):
+        """
+        Relation edges that point from this node (ie. of which the node
+        is the first link), in the order of `self.links(node)`
+        """
+        return self._adjacency().outgoing[node]
+
     @classmethod
     def from_doc(cls, corpus, doc_key,
                  could_include=lambda x: False,
@@ -341,23 +576,34 @@ class Graph(gr.hypergraph, AttrsMixin):
         for x in cdus:
             nodes_wanted.update(self.cdu_members(x, deep=True))
 
-        def is_wanted_edge(e):
-            return all([l in nodes_wanted for l in self.links(e)])
+        # expand the copyable edge list until we've covered everything
+        # that exclusively points (indirectly or otherwise) to our copy
+        # set: we count the links that each edge is still missing, and
+        # an edge becomes copyable when this count drops to zero ;
+        # its (obligatory) node mirror then becomes wanted in turn
+        incident = collections.defaultdict(list)
+        missing = {}
+        ready = []
+        for e in self.hyperedges():
+            links = self.links(e)
+            for l in links:
+                incident[l].append(e)
+            missing[e] = len([l for l in links if l not in nodes_wanted])
+            if not missing[e]:
+                ready.append(e)
 
-        # keep expanding the copyable edge list until we've
-        # covered everything that exclusively points
-        # (indirectly or otherwise) to our copy set
-        keep_growing = True
-        edges_remaining = self.hyperedges()
         edges_wanted = set()
-        while keep_growing:
-            keep_growing = False
-            for e in edges_remaining:
-                if is_wanted_edge(e):
-                    edges_wanted.add(e)
-                    nodes_wanted.add(self.mirror(e))  # obligatory node mirror
-                    edges_remaining.remove(e)
-                    keep_growing = True
+        while ready:
+            e = ready.pop()
+            edges_wanted.add(e)
+            n = self.mirror(e)
+            if n in nodes_wanted:
+                continue
+            nodes_wanted.add(n)
+            for e2 in incident[n]:
+                missing[e2] -= 1
+                if not missing[e2]:
+                    ready.append(e2)
 
         for n in self.nodes():
             if n in nodes_wanted:
@@ -382,41 +628,44 @@ class Graph(gr.hypergraph, AttrsMixin):
         Each connected component set can be passed to `self.copy()`
         to be copied as a subgraph.
 
-        This builds on python-graph's version of a function with the
-        same name but also adds awareness of our conventions about there
-        being both a node/edge for relations/CDUs.
+        Like python-graph's function of the same name, nodes are
+        connected if they share a hyperedge; but we also add awareness
+        of our conventions about there being both a node/edge for
+        relations/CDUs: anything connected *via* the edge is also
+        considered as connected *to* its node mirror.
         """
-        ccs = accessibility.connected_components(self)
+        # union-find over the nodes
+        parent = dict((n, n) for n in self.nodes())
+
+        def find(n):
+            "representative of the component of a node"
+            root = n
+            while parent[root] != root:
+                root = parent[root]
+            while parent[n] != root:  # path compression
+                parent[n], n = root, parent[n]
+            return root
+
+        def union(n1, n2):
+            "merge the components of two nodes"
+            root1 = find(n1)
+            root2 = find(n2)
+            if root1 != root2:
+                parent[root2] = root1
+
+        for e in self.hyperedges():
+            links = self.links(e)
+            for l in links[1:]:
+                union(links[0], l)
+        for n in self.nodes():
+            e = self.mirror(n)
+            if e is not None:
+                for l in self.links(e):
+                    union(n, l)
+
         subgraphs = collections.defaultdict(set)
-        for node, i in ccs.items():
-            subgraphs[i].add(node)
-
-        # the basic idea here: if any member of connected component is
-        # one of our hybrid node/edge creatures, we need to help the
-        # graph library recognise that that anything connected *via*
-        # the edge should also be considered as connected *to* the
-        # edge, so we merge the components
-        eaten = set()
-        merged = {}
-        prior = subgraphs.keys()
-        while sorted(merged.keys()) != prior:
-            prior = sorted(merged.keys())
-            merged = {}
-            for k in subgraphs:
-                if k in eaten:
-                    continue
-                subg = subgraphs[k]
-                merged[k] = copy.copy(subg)
-                for n in subg:
-                    e = self.mirror(n)
-                    if e is not None:
-                        links = set(self.links(e))
-                        for k2 in subgraphs.keys():
-                            links2 = subgraphs[k2]
-                            if k2 != k and not links2.isdisjoint(links):
-                                eaten.add(k2)
-                                merged[k] |= links2
-            subgraphs = merged
+        for n in parent:
+            subgraphs[find(n)].add(n)
 
         ccs = frozenset([frozenset(v) for v in subgraphs.values()])
         return ccs
@@ -436,15 +685,21 @@ class Graph(gr.hypergraph, AttrsMixin):
         By convention, the first link is considered the source and the
         the second is considered the target.
         """
-        return frozenset(e for e in self.hyperedges()
-                         if self.is_relation(e))
+        subsets = self._index().subsets
+        if 'relations' not in subsets:
+            subsets['relations'] = frozenset(e for e in self.hyperedges()
+                                             if self.is_relation(e))
+        return subsets['relations']
 
     def edus(self):
         """
         Set of nodes representing elementary discourse units
         """
-        return frozenset(e for e in self.nodes()
-                         if self.is_edu(e))
+        subsets = self._index().subsets
+        if 'edus' not in subsets:
+            subsets['edus'] = frozenset(e for e in self.nodes()
+                                        if self.is_edu(e))
+        return subsets['edus']
 
     def cdus(self):
         """
@@ -452,8 +707,11 @@ class Graph(gr.hypergraph, AttrsMixin):
 
         See also `cdu_members`
         """
-        return frozenset(e for e in self.hyperedges()
-                         if self.is_cdu(e))
+        subsets = self._index().subsets
+        if 'cdus' not in subsets:
+            subsets['cdus'] = frozenset(e for e in self.hyperedges()
+                                        if self.is_cdu(e))
+        return subsets['cdus']
 
     def rel_links(self, edge):
         """
@@ -478,10 +736,8 @@ class Graph(gr.hypergraph, AttrsMixin):
         If there is more than one containing CDU, return one of them
         arbitrarily.
         """
-        for node in self.links(self.nodeform(node)):
-            if self.is_cdu(node):
-                return node
-        return None
+        cdus = self._adjacency().cdu_parents[self.nodeform(node)]
+        return cdus[0] if cdus else None
 
     def containing_cdu_chain(self, node):
         """
@@ -489,12 +745,33 @@ class Graph(gr.hypergraph, AttrsMixin):
         containing CDU, the container's container, and forth.
         Return the empty list if no CDU contains this one.
         """
-        res = []
-        while node:
-            node = self.nodeform(node)
-            res.append(node)
-            node = self.containing_cdu(node)
-        return res[1:]  # drop the node itself
+        return list(self._cdu_chain(self.nodeform(node)))
+
+    def _cdu_chain(self, node):
+        """
+        Memoized version of `containing_cdu_chain` for a node ;
+        every containing CDU is looked up only once
+        """
+        chains = self._adjacency().cdu_chains
+        if node not in chains:
+            cdu = self.containing_cdu(node)
+            if cdu:
+                parent = self.nodeform(cdu)
+                chains[node] = (parent,) + self._cdu_chain(parent)
+            else:
+                chains[node] = ()
+        return chains[node]
+
+    def _cdu_hierarchy(self):
+        """
+        Fill out the index with the CDU hierarchy of the whole graph,
+        ie. the members of each CDU and the containing CDUs of each
+        node, so that queries on it become lookups
+        """
+        for node in self.nodes():
+            self._cdu_chain(node)
+        for cdu in self.cdus():
+            self.cdu_members(cdu, deep=True)
 
     def cdu_members(self, cdu, deep=False):
         """
@@ -507,14 +784,15 @@ class Graph(gr.hypergraph, AttrsMixin):
         """
 
         hyperedge = self.edgeform(cdu)
-        members = set(self.links(hyperedge))
-
-        if deep:
-            for m in list(members):
-                if self.is_cdu(m):
-                    members.update(self.cdu_members(m, deep=deep))
-
-        return frozenset(members)
+        memo = self._index().members
+        if (hyperedge, deep) not in memo:
+            members = set(self.links(hyperedge))
+            if deep:
+                for m in list(members):
+                    if self.is_cdu(m):
+                        members.update(self.cdu_members(m, deep=deep))
+            memo[hyperedge, deep] = frozenset(members)
+        return memo[hyperedge, deep]
 
     def _mk_guid(self, x):
         return self.doc_key.mk_global_id(x)
@@ -570,7 +848,10 @@ class Graph(gr.hypergraph, AttrsMixin):
         return self._mk_edge(anno, 'rel', members, mirrored=True)
 
     def _schema_edge(self, anno):
-        return self._mk_edge(anno, 'CDU', anno.span, mirrored=True)
+        # the members of a schema are a set: sort them so that the
+        # graph (and eg. its dot output) does not depend on the order
+        # in which they happen to be stored
+        return self._mk_edge(anno, 'CDU', sorted(anno.span), mirrored=True)
 
     def _repr_dot_(self):
         """Ipython magic: show Graphviz dot representation of the graph
@@ -884,20 +1165,22 @@ class DotGraph(pydot.Dot):
             self._add_edu(node)
 
         # Add nodes that have some sort of error condition or another
-        for edge in (self.core.relations() | self.core.cdus()):
+        # (sets of edges are sorted so that the dot output is the same
+        # from one run to the next)
+        for edge in sorted(self.core.relations() | self.core.cdus()):
             for node in self.core.links(edge):
                 if not (self.core.is_edu(node) or
                         self.core.is_relation(node) or
                         self.core.is_cdu(node)):
                     self._add_edu(node)
 
-        for edge in self.core.relations():
+        for edge in sorted(self.core.relations()):
             if edge in self.complex_rels:
                 self._add_complex_rel(edge)
             else:
                 self._add_simple_rel(edge)
 
-        for edge in self.core.cdus():
+        for edge in sorted(self.core.cdus()):
             if edge in self.contained_cdus:
                 continue
             elif edge in self.complex_cdus:
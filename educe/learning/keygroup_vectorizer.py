@@ -4,19 +4,120 @@
 # pylint: disable=invalid-name
 # lots of scikit-conventional names here
 
+from array import array
 from collections import defaultdict
+import zlib
+
+import numpy as np
+import scipy.sparse as sp
+
+from .keys import feature_name
+
+
+def _as_ndarray(buf, dtype):
+    """View an `array.array` as a numpy array, without copying."""
+    if not buf:
+        return np.zeros(0, dtype=dtype)
+    return np.frombuffer(buf, dtype=dtype)
+
+
+def _hash_feature(feature):
+    """Stable, unsigned 32-bit hash of a feature name.
+
+    We cannot use `hash()`, which is salted differently in each
+    process for strings under Python 3.
+    """
+    return zlib.crc32(feature.encode('utf-8')) & 0xffffffff
 
 
 class KeyGroupVectorizer(object):
     """Transforms lists of KeyGroups to sparse vectors.
 
+    Parameters
+    ----------
+    dtype : numpy dtype, defaults to np.float64
+        Type of the values in the feature matrix ; np.float32 halves
+        the memory used by the values.
+    n_features : int, optional
+        If given, use the hashing trick: features are mapped to
+        `n_features` columns by a hash of their name, instead of
+        through a vocabulary. Colliding features are summed.
+    alternate_sign : boolean, defaults to True
+        In hashing mode, multiply each value by a sign derived from
+        the hash, so that collisions tend to cancel out rather than
+        accumulate.
+    hash_sample_size : int, defaults to 0
+        In hashing mode, remember the column of (up to) this many
+        feature names, for debugging purposes.
+
     Attributes
     ----------
     vocabulary_ : dict(str, int)
-        Vocabulary mapping.
+        Vocabulary mapping ; None in hashing mode.
+    hash_sample_ : dict(str, int)
+        In hashing mode, sample of feature names with their column.
     """
-    def __init__(self):
+    def __init__(self, dtype=np.float64, n_features=None,
+                 alternate_sign=True, hash_sample_size=0):
+        if n_features is not None and n_features <= 0:
+            raise ValueError('n_features={}, should be int > 0 or None'
+                             ''.format(n_features))
+        self.dtype = dtype
+        self.n_features = n_features
+        self.alternate_sign = alternate_sign
+        self.hash_sample_size = hash_sample_size
         self.vocabulary_ = None  # FIXME should be set in fit()
+        self.hash_sample_ = {}
+
+    def _hash_vectors(self, vectors):
+        """Create sparse feature matrix with the hashing trick.
+
+        Parameters
+        ----------
+        vectors : list of KeyGroup
+            List of feature vectors, one vector per sample.
+
+        Returns
+        -------
+        X : scipy.sparse.csr_matrix
+            Feature matrix, one row per sample, `n_features` columns.
+        """
+        n_features = self.n_features
+        alternate_sign = self.alternate_sign
+        sample = self.hash_sample_
+        sample_size = self.hash_sample_size
+
+        # column and sign of each feature code, so that we only build
+        # and hash the name of a feature the first time we see it
+        code_cols = {}
+
+        indices = array('i')
+        values = array(np.dtype(self.dtype).char)
+        indptr = array('i', [0])
+        for vec in vectors:
+            for code, featval in vec.one_hot_codes_gen():
+                col = code_cols.get(code)
+                if col is None:
+                    feature = feature_name(code)
+                    fhash = _hash_feature(feature)
+                    idx = fhash % n_features
+                    # the top bit is (nearly) independent from idx
+                    negate = bool(alternate_sign and fhash & 0x80000000)
+                    col = code_cols[code] = (idx, negate)
+                    if len(sample) < sample_size:
+                        sample[feature] = idx
+                idx, negate = col
+                indices.append(idx)
+                values.append(-featval if negate else featval)
+            indptr.append(len(indices))
+
+        X = sp.csr_matrix((_as_ndarray(values, self.dtype),
+                           _as_ndarray(indices, np.intc),
+                           _as_ndarray(indptr, np.intc)),
+                          shape=(len(indptr) - 1, n_features))
+        # colliding features in the same row
+        X.sum_duplicates()
+        return X
 
     def _count_vocab(self, vectors, fixed_vocab=False):
         """Create sparse feature matrix and vocabulary.
@@ -34,49 +135,64 @@ class KeyGroupVectorizer(object):
         vocabulary : dict(str, int)
             Mapping from features to integers.
 
-        X : list of list of tuple(int, float)
-            List of feature vectors.
+        X : scipy.sparse.csr_matrix
+            Feature matrix, one row per sample. Features appear in each
+            row in the order in which they were generated.
         """
+        # the matrix is built directly in CSR form: column indices and
+        # values for all rows, and a pointer to where each row begins
+        indices = array('i')
+        values = array(np.dtype(self.dtype).char)
+        indptr = array('i', [0])
+
+        # column of each feature code, so that we only build the name
+        # of a feature the first time we see it ; unknown features
+        # (fixed vocabulary) get column -1
+        code_cols = {}
+
         if fixed_vocab:
             vocabulary = self.vocabulary_
+            feature_idx = vocabulary.get
+            for vec in vectors:
+                for code, featval in vec.one_hot_codes_gen():
+                    idx = code_cols.get(code)
+                    if idx is None:
+                        idx = feature_idx(feature_name(code), -1)
+                        code_cols[code] = idx
+                    if idx >= 0:
+                        indices.append(idx)
+                        values.append(featval)
+                indptr.append(len(indices))
+            n_features = max(vocabulary.values()) + 1 if vocabulary else 0
         else:
             # every time a new value is encountered, add it to the vocabulary
             vocabulary = defaultdict()
             vocabulary.default_factory = vocabulary.__len__
-
-        # accumulate features from every vec
-        feature_acc = []
-        # thus we need to remember where each pair of EDUs and each document
-        # begins
-        row_ptr = []
-        row_ptr.append(0)
-
-        for vec in vectors:
-            for feature, featval in vec.one_hot_values_gen():
-                try:
-                    feature_idx = vocabulary[feature]
-                    feature_acc.append((feature_idx, featval))
-                except KeyError:
-                    # ignore unknown features if fixed vocab
-                    continue
-            row_ptr.append(len(feature_acc))
-
-        if not fixed_vocab:
+            for vec in vectors:
+                for code, featval in vec.one_hot_codes_gen():
+                    idx = code_cols.get(code)
+                    if idx is None:
+                        idx = vocabulary[feature_name(code)]
+                        code_cols[code] = idx
+                    indices.append(idx)
+                    values.append(featval)
+                indptr.append(len(indices))
             vocabulary = dict(vocabulary)
             if not vocabulary:
                 raise ValueError("empty vocabulary")
+            n_features = len(vocabulary)
 
-        # build a feature count matrix out of feature_acc and row_ptr
-        X = []
-        for i in xrange(len(row_ptr) - 1):
-            current_row, next_row = row_ptr[i], row_ptr[i + 1]
-            x = feature_acc[current_row:next_row]
-            X.append(x)
+        X = sp.csr_matrix((_as_ndarray(values, self.dtype),
+                           _as_ndarray(indices, np.intc),
+                           _as_ndarray(indptr, np.intc)),
+                          shape=(len(indptr) - 1, n_features))
         return vocabulary, X
 
     def fit_transform(self, vectors):
         """Learn the vocabulary dictionary and return instances
         """
+        if self.n_features is not None:
+            return self._hash_vectors(vectors)
         vocabulary, X = self._count_vocab(vectors, fixed_vocab=False)
         self.vocabulary_ = vocabulary
         return X
@@ -87,5 +203,7 @@ class KeyGroupVectorizer(object):
         Extract features out of documents using the vocabulary
         fitted with fit.
         """
+        if self.n_features is not None:
+            return self._hash_vectors(vectors)
         _, X = self._count_vocab(vectors, fixed_vocab=True)
         return X
@@ -11,6 +11,8 @@ from __future__ import absolute_import
 
 import re
 
+import six
+
 
 # pylint: disable=too-few-public-methods
 class Substance(object):
@@ -108,15 +110,21 @@ class KeyGroup(dict):
     """
     NAME_WIDTH = 35
     DEBUG = True
+    SUBVECTORS = ()
+    """Attributes that hold nested feature vectors, as (attribute,
+    suffix) pairs: their one-hot values follow those of the group,
+    with the suffix added to their feature names"""
 
     def __init__(self, description, keys):
         self.description = description
         self.keys = keys
         self.keynames = [key.name for key in keys]
+        self._keyset = frozenset(self.keynames)
+        self._schema = None
         super(KeyGroup, self).__init__()
 
     def __setitem__(self, key, val):
-        if self.DEBUG and key not in self.keynames:
+        if self.DEBUG and key not in self._keyset:
             raise KeyError(key)
         else:
             super(KeyGroup, self).__setitem__(key, val)
@@ -126,30 +134,208 @@ class KeyGroup(dict):
 
         suffix is added to the feature name
         """
-        for key in self.keys:
-            subst = key.substance
-            kname = key.name
-            fval = self[kname]
-            if fval is None:
-                continue
+        for code, fval in self.one_hot_codes_gen(suffix=suffix):
+            yield (feature_name(code), fval)
+
+    def one_hot_codes_gen(self, suffix=''):
+        """Same as `one_hot_values_gen`, but with feature codes instead
+        of feature names, see `feature_name`
+        """
+        names = self.compile().feature_names(suffix)
+        values = (self[kname] for kname in self.keynames)
+        for pair in _one_hot_codes_gen(self.keys, names, values, suffix):
+            yield pair
+        for attr, sub_suffix in self.SUBVECTORS:
+            for pair in getattr(self, attr).one_hot_codes_gen(
+                    suffix=sub_suffix):
+                yield pair
+
+    def compile(self):
+        """Precompiled schema for this group, see `KeySchema`.
+
+        The schema is computed once per group, so the idea is to build
+        a group once (as a template) and use its schema for every
+        instance.
+        """
+        if self._schema is None:
+            self._schema = KeySchema(self.keys,
+                                     subvectors=self.SUBVECTORS)
+        return self._schema
+
+
+_BASKET = object()
+"marker for the feature codes of basket items"
 
-            if subst is Substance.DISCRETE:
-                if fval is False:
-                    continue
-                feature = u'{}{}={}'.format(kname, suffix, fval)
-                yield (feature, 1)
-            elif subst is Substance.CONTINUOUS:
-                feature = u'{}{}'.format(kname, suffix)
-                yield (feature, fval)
-            elif subst is Substance.STRING:
-                feature = u'{}{}={}'.format(kname, suffix, fval)
-                yield (feature, 1)
-            elif subst is Substance.BASKET:
-                for bkey, bval in fval.items():
-                    feature = u'{}{}'.format(bkey, suffix)
-                    yield (feature, bval)
+_CODED_TYPES = frozenset((six.text_type, six.binary_type, float, bool) +
+                         six.integer_types)
+"""types of the discrete values that go as is in feature codes (others
+are formatted into the feature name right away)"""
+
+
+def feature_name(code):
+    """Feature name for a feature code.
+
+    Feature codes are what `one_hot_codes_gen` generates: hashable
+    values that identify a feature without building its name, which
+    saves formatting a string for every feature of every vector.
+    Each code stands for one name:
+
+        * continuous features: their name
+        * discrete and string features: `(name, type(value), value)`,
+          for `name=value` (or directly the name, for values of other
+          types than strings and numbers)
+        * basket items: `(_BASKET, item, suffix)`, for `itemsuffix`
+    """
+    if not isinstance(code, tuple):
+        return code
+    if code[0] is _BASKET:
+        return u'{}{}'.format(code[1], code[2])
+    return u'{}={}'.format(code[0], code[2])
+
+
+def _one_hot_codes_gen(keys, names, values, suffix):
+    """Generate the one-hot encoded (feature code, value) pairs
+
+    Parameters
+    ----------
+    keys : list of Key
+        Keys
+    names : list of string
+        Feature name for each key (with the suffix)
+    values : iterable
+        Value for each key
+    suffix : string
+        Suffix added to the feature names
+    """
+    for key, name, fval in six.moves.zip(keys, names, values):
+        if fval is None:
+            continue
+        subst = key.substance
+        if subst is Substance.DISCRETE or subst is Substance.STRING:
+            if fval is False and subst is Substance.DISCRETE:
+                continue
+            if type(fval) in _CODED_TYPES:
+                yield ((name, type(fval), fval), 1)
             else:
-                raise ValueError('Unknown substance for {}'.format(subst))
+                yield (u'{}={}'.format(name, fval), 1)
+        elif subst is Substance.CONTINUOUS:
+            yield (name, fval)
+        elif subst is Substance.BASKET:
+            for bkey, bval in fval.items():
+                yield ((_BASKET, bkey, suffix), bval)
+        else:
+            raise ValueError('Unknown substance for {}'.format(subst))
+
+
+class KeySchema(object):
+    """
+    Precompiled layout of a KeyGroup: key order and the column
+    offset of each key.
+
+    Use `vector()` to create instances of the group, which store their
+    values in a flat list rather than in a dictionary. Filling these
+    out (with the `fill` method of a KeyGroup, using the vector as
+    target) and generating their one-hot values is cheaper than
+    building and filling a fresh KeyGroup (and its subgroups) per
+    instance.
+    """
+    def __init__(self, keys, subvectors=()):
+        """
+        Parameters
+        ----------
+        keys : list of Key
+            Keys, in order
+        subvectors : list of (string, string)
+            Attributes of the instances that hold nested feature vectors
+            (with the suffix to add to their feature names), see
+            `KeyGroup.SUBVECTORS`
+        """
+        self.keys = keys
+        self.keynames = [key.name for key in keys]
+        self.offsets = {kname: i for i, kname in enumerate(self.keynames)}
+        self.subvectors = subvectors
+        self._names = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def feature_names(self, suffix=''):
+        """Feature name for each key, with the given suffix
+
+        These are computed once per suffix.
+        """
+        names = self._names.get(suffix)
+        if names is None:
+            names = [u'{}{}'.format(kname, suffix)
+                     for kname in self.keynames]
+            self._names[suffix] = names
+        return names
+
+    def vector(self):
+        """Fresh, empty instance of the group"""
+        return KeyVector(self)
+
+
+_UNSET = object()
+"marker for values that have not been filled out"
+
+
+class KeyVector(object):
+    """
+    Instance of a KeyGroup in compiled mode, see `KeySchema`.
+
+    It can be used as the target of a KeyGroup `fill()`, and provides
+    the same `one_hot_values_gen`.
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        self.values = [_UNSET] * len(schema)
+
+    def __getitem__(self, key):
+        val = self.values[self.schema.offsets[key]]
+        if val is _UNSET:
+            raise KeyError(key)
+        return val
+
+    def __setitem__(self, key, val):
+        self.values[self.schema.offsets[key]] = val
+
+    def __contains__(self, key):
+        offset = self.schema.offsets.get(key)
+        return offset is not None and self.values[offset] is not _UNSET
+
+    def get(self, key, default=None):
+        "value for key if it is set, else default"
+        return self[key] if key in self else default
+
+    def _values_gen(self):
+        "values, in key order"
+        for kname, val in zip(self.schema.keynames, self.values):
+            if val is _UNSET:
+                raise KeyError(kname)
+            yield val
+
+    def one_hot_values_gen(self, suffix=''):
+        """Get a one-hot encoded version of this vector as a generator
+
+        suffix is added to the feature name
+        """
+        for code, fval in self.one_hot_codes_gen(suffix=suffix):
+            yield (feature_name(code), fval)
+
+    def one_hot_codes_gen(self, suffix=''):
+        """Same as `one_hot_values_gen`, but with feature codes instead
+        of feature names, see `feature_name`
+        """
+        schema = self.schema
+        for pair in _one_hot_codes_gen(schema.keys,
+                                       schema.feature_names(suffix),
+                                       self._values_gen(), suffix):
+            yield pair
+        for attr, sub_suffix in schema.subvectors:
+            for pair in getattr(self, attr).one_hot_codes_gen(
+                    suffix=sub_suffix):
+                yield pair
 
 
 class MergedKeyGroup(KeyGroup):
@@ -8,8 +8,28 @@ from __future__ import absolute_import
 import itertools
 
 
+def _csr_rows(X):
+    """Generate the rows of a CSR matrix as lists of (index, value).
+
+    Integral values are converted to `int`, so that they are written
+    as eg. `1` rather than `1.0`.
+    """
+    indptr = X.indptr
+    indices = X.indices
+    data = X.data
+    for i in range(X.shape[0]):
+        start, end = indptr[i], indptr[i + 1]
+        yield [(feat_id, int(feat_val) if float(feat_val).is_integer()
+                else feat_val)
+               for feat_id, feat_val in zip(indices[start:end].tolist(),
+                                            data[start:end])]
+
+
 def _dump_svmlight(X_gen, y_gen, f, comment):
     """Actually do dump"""
+    if hasattr(X_gen, 'indptr'):
+        X_gen = _csr_rows(X_gen)
+
     if comment:
         f.write('# {}\n'.format(comment))
 
@@ -37,6 +57,9 @@ def _dump_svmlight(X_gen, y_gen, f, comment):
 def dump_svmlight_file(X_gen, y_gen, f, zero_based=True, comment=None,
                        query_id=None):
     """Dump the dataset in svmlight file format.
+
+    X_gen is either a scipy.sparse.csr_matrix, or an iterable of
+    feature vectors as lists of (feature index, value).
     """
     with open(f, 'wb') as f:
         _dump_svmlight(X_gen, y_gen, f, comment)
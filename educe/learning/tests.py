@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for educe.learning
+"""
+
+from __future__ import print_function
+
+import unittest
+
+import numpy as np
+
+from educe.learning.keygroup_vectorizer import KeyGroupVectorizer
+from educe.learning.keys import Key, KeyGroup
+
+
+KEYS = [Key.discrete('word', 'some word'),
+        Key.continuous('length', 'some length')]
+
+
+def mk_group(word, length):
+    "key group with the given values"
+    group = KeyGroup('test group', KEYS)
+    group['word'] = word
+    group['length'] = length
+    return group
+
+
+class KeyGroupVectorizerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.vecs = [mk_group('hello', 0.5),
+                     mk_group('world', 3),
+                     mk_group('hello', None)]
+
+    def test_fit_transform(self):
+        vzer = KeyGroupVectorizer(dtype=np.float32)
+        X = vzer.fit_transform(self.vecs)
+        self.assertEqual(vzer.vocabulary_,
+                         {'word=hello': 0, 'length': 1, 'word=world': 2})
+        self.assertEqual(X.dtype, np.float32)
+        self.assertEqual(X.toarray().tolist(),
+                         [[1, 0.5, 0], [0, 3, 1], [1, 0, 0]])
+
+    def test_transform(self):
+        vzer = KeyGroupVectorizer()
+        vzer.fit_transform(self.vecs)
+        X = vzer.transform([mk_group('goodbye', 2)])
+        self.assertEqual(X.shape, (1, 3))
+        self.assertEqual(X.toarray().tolist(), [[0, 2, 0]])
+
+    def test_hashing(self):
+        vzer = KeyGroupVectorizer(n_features=16, hash_sample_size=2)
+        X = vzer.fit_transform(self.vecs)
+        self.assertIsNone(vzer.vocabulary_)
+        self.assertEqual(X.shape, (3, 16))
+        self.assertEqual(len(vzer.hash_sample_), 2)
+        # rows 0 and 2 share the same hashed word feature
+        col = vzer.hash_sample_['word=hello']
+        self.assertEqual(abs(X[0, col]), 1)
+        self.assertEqual(X[0, col], X[2, col])
+        # no sign flipping
+        vzer = KeyGroupVectorizer(n_features=16, alternate_sign=False)
+        X = vzer.transform(self.vecs)
+        self.assertTrue((X.data > 0).all())
+
+    def test_value_types(self):
+        "features are told apart by name, whatever the type of the value"
+        vecs = [mk_group(1, None), mk_group(True, None),
+                mk_group(u'1', None), mk_group([1], None)]
+        vzer = KeyGroupVectorizer()
+        X = vzer.fit_transform(vecs)
+        self.assertEqual(vzer.vocabulary_,
+                         {'word=1': 0, 'word=True': 1, 'word=[1]': 2})
+        self.assertEqual(X.toarray().tolist(),
+                         [[1, 0, 0], [0, 1, 0], [1, 0, 0], [0, 0, 1]])
+        X = vzer.transform(vecs[::-1])
+        self.assertEqual(X.toarray().tolist(),
+                         [[0, 0, 1], [1, 0, 0], [0, 1, 0], [1, 0, 0]])
+
+
+class SubKeyGroup(KeyGroup):
+    SUBVECTORS = (('sub', '_SUB'),)
+
+    def __init__(self):
+        super(SubKeyGroup, self).__init__('with subgroup', KEYS)
+
+
+class KeySchemaTest(unittest.TestCase):
+
+    def test_same_values(self):
+        group = mk_group('hello', 0.5)
+        vec = group.compile().vector()
+        vec['word'] = 'hello'
+        vec['length'] = 0.5
+        self.assertEqual(list(vec.one_hot_values_gen(suffix='_x')),
+                         list(group.one_hot_values_gen(suffix='_x')))
+
+    def test_unknown_and_unset(self):
+        vec = KeyGroup('test group', KEYS).compile().vector()
+        self.assertRaises(KeyError, vec.__setitem__, 'nope', 1)
+        vec['word'] = 'hello'
+        self.assertEqual(vec.get('word'), 'hello')
+        self.assertEqual(vec.get('length', 0), 0)
+        self.assertRaises(KeyError, list, vec.one_hot_values_gen())
+
+    def test_subvectors(self):
+        group = SubKeyGroup()
+        group['word'] = 'a'
+        group['length'] = 2
+        group.sub = mk_group('b', None)
+        vec = group.compile().vector()
+        vec['word'] = 'a'
+        vec['length'] = 2
+        vec.sub = mk_group('b', None).compile().vector()
+        vec.sub['word'] = 'b'
+        vec.sub['length'] = None
+        expected = [(u'word=a', 1), (u'length', 2), (u'word_SUB=b', 1)]
+        self.assertEqual(list(group.one_hot_values_gen()), expected)
+        self.assertEqual(list(vec.one_hot_values_gen()), expected)
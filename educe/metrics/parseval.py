@@ -17,6 +17,167 @@ from educe.metrics.scores_structured import (precision_recall_fscore_support,
                                              unique_labels)
 
 
+# nuclearity and relation labels, interned so that span tables from
+# different trees share the same label ids
+_LABEL_IDS = {}
+_LABELS = []
+
+
+def _label_id(label):
+    """Get the (shared) integer id of a nuclearity or relation label"""
+    try:
+        return _LABEL_IDS[label]
+    except KeyError:
+        _LABEL_IDS[label] = len(_LABELS)
+        _LABELS.append(label)
+        return _LABEL_IDS[label]
+
+
+class SpanTable(object):
+    """Spans of a constituency tree, stored as an integer array.
+
+    Extracting the spans of a tree walks all its subtrees, so we do it
+    once per tree and reuse the table across comparisons and metrics.
+
+    Parameters
+    ----------
+    spans : list of tuple((int, int), str, str, int)
+        Description of each span, as returned by `get_spans`.
+
+    extraction : tuple(function, boolean, str)
+        The (subtree_filter, exclude_root, span_type) used to extract
+        the spans.
+
+    Attributes
+    ----------
+    table : array of int, shape (n_spans, 5)
+        One row (start, end, nuclearity id, relation id, head) per span,
+        the head being -1 when missing.
+    """
+
+    def __init__(self, spans, extraction=(None, False, 'edus')):
+        self.table = np.array(
+            [(sp[0][0], sp[0][1], _label_id(sp[1]), _label_id(sp[2]),
+              -1 if sp[3] is None else sp[3])
+             for sp in spans], dtype=np.int64).reshape(-1, 5)
+        self.extraction = extraction
+        self._labelled = {}
+        self._trivial = None
+
+    @classmethod
+    def from_ctree(cls, ctree, subtree_filter=None, exclude_root=False,
+                   span_type='edus'):
+        """Extract the span table of an RSTTree or SimpleRSTTree.
+
+        See `RSTTree.get_spans` for the parameters.
+        """
+        spans = ctree.get_spans(subtree_filter=subtree_filter,
+                                exclude_root=exclude_root,
+                                span_type=span_type)
+        return cls(spans, (subtree_filter, exclude_root, span_type))
+
+    def __len__(self):
+        return len(self.table)
+
+    def spans(self):
+        """Get the description of each span, as in `get_spans`."""
+        return [((start, end), _LABELS[nuc], _LABELS[rel],
+                 None if head < 0 else head)
+                for start, end, nuc, rel, head in self.table.tolist()]
+
+    def with_trivial_spans(self):
+        """Get a copy of this table with the trivial spans of Li et al.
+
+        Spans 0-0 and 0-n are added, and the nuclearity of all spans
+        whose relation is not "span" is changed to Satellite.
+        """
+        if self._trivial is None:
+            last_end = self.table[-1, 1]
+            root = [_label_id("Root"), _label_id('---'), 0]
+            table = np.vstack([self.table,
+                               [0, 0] + root,
+                               [0, last_end] + root])
+            # if label != span, change nuclearity to Satellite
+            rel_ids = np.unique(table[:, 3])
+            not_span = rel_ids[[_LABELS[x].lower() != "span"
+                                for x in rel_ids.tolist()]]
+            table[np.isin(table[:, 3], not_span), 2] = _label_id("Satellite")
+            res = SpanTable([], self.extraction)
+            res.table = table
+            self._trivial = res
+        return self._trivial
+
+    def labelled_spans(self, lbl_fn=None):
+        """Get the list of labelled spans for a metric.
+
+        Parameters
+        ----------
+        lbl_fn : function, optional
+            Function to relabel spans ; if None, span descriptions are
+            returned as is.
+
+        Returns
+        -------
+        spans : list of tuple
+            Pairs (span, label) if `lbl_fn` is given, span descriptions
+            otherwise. They are computed once per `lbl_fn`, and shared
+            between calls.
+        """
+        if lbl_fn not in self._labelled:
+            if lbl_fn is None:
+                self._labelled[None] = self.spans()
+            else:
+                self._labelled[lbl_fn] = [(span[0], lbl_fn(span))
+                                          for span
+                                          in self.labelled_spans(None)]
+        return self._labelled[lbl_fn]
+
+
+def span_tables(ctrees, subtree_filter=None, exclude_root=False,
+                span_type='edus'):
+    """Get the span table of each constituency tree.
+
+    Parameters
+    ----------
+    ctrees : list of (RSTTree or SimpleRSTTree or SpanTable)
+        Constituency trees, one per document. Span tables that have
+        already been extracted are kept as they are, so they can be
+        reused from one call to the next.
+
+    subtree_filter : function, optional
+        Function to filter all local trees.
+
+    exclude_root : boolean, defaults to False
+        If True, exclude the root node of the ctrees.
+
+    span_type : one of {'edus', 'chars'}
+        Whether each span is expressed on EDU or character indices.
+
+    Returns
+    -------
+    tables : list of SpanTable
+        Span table of each ctree.
+
+    Raises
+    ------
+    ValueError
+        If a precomputed span table was extracted with other parameters.
+    """
+    extraction = (subtree_filter, exclude_root, span_type)
+    tables = []
+    for ctree in ctrees:
+        if isinstance(ctree, SpanTable):
+            if ctree.extraction != extraction:
+                raise ValueError('Span table was extracted with {}, not {}'
+                                 ''.format(ctree.extraction, extraction))
+            tables.append(ctree)
+        else:
+            tables.append(SpanTable.from_ctree(
+                ctree, subtree_filter=subtree_filter,
+                exclude_root=exclude_root, span_type=span_type))
+    return tables
+
+
 def parseval_scores(ctree_true, ctree_pred, subtree_filter=None,
                     exclude_root=False, lbl_fn=None, labels=None,
                     span_type='edus',
@@ -27,10 +188,12 @@ def parseval_scores(ctree_true, ctree_pred, subtree_filter=None,
     Parameters
     ----------
     ctree_true : list of list of RSTTree or SimpleRstTree
-        List of reference RST trees, one per document.
+        List of reference RST trees, one per document ; precomputed
+        `SpanTable`s can be passed instead, see `span_tables`.
 
     ctree_pred : list of list of RSTTree or SimpleRstTree
-        List of predicted RST trees, one per document.
+        List of predicted RST trees, one per document ; precomputed
+        `SpanTable`s can be passed instead, see `span_tables`.
 
     subtree_filter : function, optional
         Function to filter all local trees.
@@ -79,41 +242,26 @@ def parseval_scores(ctree_true, ctree_pred, subtree_filter=None,
         # force inclusion of root span 1-n
         exclude_root = False
 
-    # extract descriptions of spans from the true and pred trees
-    spans_true = [ct.get_spans(subtree_filter=subtree_filter,
-                               exclude_root=exclude_root,
-                               span_type=span_type)
-                  for ct in ctree_true]
-    spans_pred = [ct.get_spans(subtree_filter=subtree_filter,
-                               exclude_root=exclude_root,
-                               span_type=span_type)
-                  for ct in ctree_pred]
+    # extract descriptions of spans from the true and pred trees,
+    # unless they have already been extracted
+    tables_true = span_tables(ctree_true, subtree_filter=subtree_filter,
+                              exclude_root=exclude_root,
+                              span_type=span_type)
+    tables_pred = span_tables(ctree_pred, subtree_filter=subtree_filter,
+                              exclude_root=exclude_root,
+                              span_type=span_type)
 
     # WIP replicate eval in Li et al.'s dep parser
     if add_trivial_spans:
         # add trivial spans for 0-0 and 0-n
-        # this assumes n-n is the last span so we can get "n" as
-        # sp_list[-1][0][1]
-        spans_true = [sp_list + [((0, 0), "Root", '---', 0),
-                                 ((0, sp_list[-1][0][1]), "Root", '---', 0)]
-                      for sp_list in spans_true]
-        spans_pred = [sp_list + [((0, 0), "Root", '---', 0),
-                                 ((0, sp_list[-1][0][1]), "Root", '---', 0)]
-                      for sp_list in spans_pred]
+        # this assumes n-n is the last span so we can get "n" from it
         # if label != span, change nuclearity to Satellite
-        spans_true = [[(x[0], "Satellite" if x[2].lower() != "span" else x[1],
-                        x[2], x[3]) for x in sp_list]
-                      for sp_list in spans_true]
-        spans_pred = [[(x[0], "Satellite" if x[2].lower() != "span" else x[1],
-                        x[2], x[3]) for x in sp_list]
-                      for sp_list in spans_pred]
+        tables_true = [x.with_trivial_spans() for x in tables_true]
+        tables_pred = [x.with_trivial_spans() for x in tables_pred]
     # end WIP
     # use lbl_fn to define labels
-    if lbl_fn is not None:
-        spans_true = [[(span[0], lbl_fn(span)) for span in spans]
-                      for spans in spans_true]
-        spans_pred = [[(span[0], lbl_fn(span)) for span in spans]
-                      for spans in spans_pred]
+    spans_true = [x.labelled_spans(lbl_fn) for x in tables_true]
+    spans_pred = [x.labelled_spans(lbl_fn) for x in tables_pred]
 
     # NEW gather present labels
     present_labels = unique_labels(spans_true, spans_pred)
@@ -218,6 +366,14 @@ def parseval_compact_report(parser_true, parser_preds,
     if percent:
         digits = digits - 2
 
+    # extract the spans of each parser once, for all metrics
+    parser_preds = [
+        (parser_name,
+         span_tables(ctree_pred, subtree_filter=subtree_filter,
+                     exclude_root=(exclude_root and not add_trivial_spans),
+                     span_type=span_type))
+        for parser_name, ctree_pred in parser_preds]
+
     # find _true
     for parser_name, ctree_pred in parser_preds:
         if parser_name == parser_true:
@@ -359,6 +515,14 @@ def parseval_similarity(parser_preds,
     if percent:
         digits = digits - 2
 
+    # extract the spans of each parser once, for all pairs of parsers
+    parser_preds = [
+        (parser_name,
+         span_tables(ctree_pred, subtree_filter=subtree_filter,
+                     exclude_root=(exclude_root and not add_trivial_spans),
+                     span_type=span_type))
+        for parser_name, ctree_pred in parser_preds]
+
     for parser_true, ctree_true in parser_preds:
         values = [parser_true]
         for parser_name, ctree_pred in parser_preds:
@@ -452,6 +616,13 @@ def parseval_report(ctree_true, ctree_pred, exclude_root=False,
     if percent:
         digits = digits - 2
 
+    # extract the spans once, for all metrics
+    ctree_true, ctree_pred = [
+        span_tables(ctrees, subtree_filter=subtree_filter,
+                    exclude_root=(exclude_root and not add_trivial_spans),
+                    span_type=span_type)
+        for ctrees in (ctree_true, ctree_pred)]
+
     # compute scores
     metric_scores = dict()
     for metric_type, lbl_fn in lbl_fns:
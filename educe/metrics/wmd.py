@@ -21,9 +21,13 @@ TODO
 from __future__ import print_function
 
 import os
+import shutil
 import sys
+import tempfile
 
 import numpy as np
+import scipy.sparse as sp
+from joblib import Parallel, delayed
 
 from pyemd import emd
 
@@ -35,42 +39,170 @@ else:
     from io import open
 
 
-def create_cache(filepath="data"):
-    if ((not os.path.exists(filepath+"/"+"embed.dat") or
-         not os.path.exists(filepath+"/"+"embed.vocab"))):
+# Embedding stores
+# ----------------
+# An embedding store `<name>` is made of two files:
+# * `<name>.npy` is the matrix of word embeddings, one row per word, in
+# the .npy format ; its header records the shape and dtype of the matrix,
+# so it can be memory-mapped whatever its size,
+# * `<name>.vocab` is the vocabulary, one word per line, in the order of
+# the rows.
+# Legacy caches (`<name>.dat`, raw np.double without header) are still
+# read, their shape being inferred from the size of the vocabulary.
+
+
+def _store_paths(mapfile, data_dir):
+    """Paths to the matrix, legacy matrix and vocabulary of a store"""
+    prefix = os.path.join(data_dir, mapfile)
+    return prefix + '.npy', prefix + '.dat', prefix + '.vocab'
+
+
+def save_embedding(mapfile, words, vectors, data_dir='data',
+                   dtype=np.float32):
+    """Save word embeddings to an embedding store.
+
+    Parameters
+    ----------
+    mapfile : str
+        Name of the store.
+    words : list of str
+        Vocabulary, one word per row of `vectors`.
+    vectors : 2-dimensional array
+        Word embeddings ; can be a memmap, it is copied row block by
+        row block.
+    data_dir : str, defaults to 'data'
+        Directory of the store.
+    dtype : numpy dtype, defaults to np.float32
+        Type of the stored values, typically np.float16 or np.float32
+        to save disk space and RAM.
+    """
+    if len(words) != vectors.shape[0]:
+        raise ValueError('{} words for {} vectors'.format(
+            len(words), vectors.shape[0]))
+    mat_path, _, vocab_path = _store_paths(mapfile, data_dir)
+    fp = np.lib.format.open_memmap(mat_path, mode='w+', dtype=dtype,
+                                   shape=vectors.shape)
+    block = 100000
+    for beg in range(0, vectors.shape[0], block):
+        fp[beg:beg + block] = vectors[beg:beg + block]
+    fp.flush()
+    del fp
+    with open(vocab_path, "w", encoding="utf8") as f:
+        for w in words:
+            print(w, file=f)
+
+
+def create_cache(filepath="data", mapfile="embed", dtype=np.float32):
+    """Create an embedding store from the GoogleNews word2vec model.
+
+    Parameters
+    ----------
+    filepath : str, defaults to 'data'
+        Directory that contains "GoogleNews-vectors-negative300.bin.gz"
+        and where the store is created.
+    mapfile : str, defaults to 'embed'
+        Name of the store.
+    dtype : numpy dtype, defaults to np.float32
+        Type of the stored values.
+    """
+    mat_path, _, vocab_path = _store_paths(mapfile, filepath)
+    if not os.path.exists(mat_path) or not os.path.exists(vocab_path):
         print("Cache of word embeddings...",
               file=sys.stderr)
         from gensim.models.word2vec import Word2Vec
         wv = Word2Vec.load_word2vec_format(
-            filepath+"/"+"GoogleNews-vectors-negative300.bin.gz",
+            os.path.join(filepath, "GoogleNews-vectors-negative300.bin.gz"),
             binary=True)
-        fp = np.memmap(filepath+"/"+"embed.dat", dtype=np.double, mode='w+',
-                       shape=wv.syn0.shape)
-        fp[:] = wv.syn0[:]
-        with open(filepath+"/"+"embed.vocab", "w", encoding="utf8") as f:
-            for _, w in sorted((voc.index, word) for word, voc
-                               in wv.vocab.items()):
-                print(w, file=f)
-        del fp, wv
+        words = [w for _, w in sorted((voc.index, word) for word, voc
+                                      in wv.vocab.items())]
+        save_embedding(mapfile, words, wv.syn0, data_dir=filepath,
+                       dtype=dtype)
+        del wv
         print('done', file=sys.stderr)
 
 
-def load_embedding(mapfile="embed"):
+def load_embedding(mapfile="embed", data_dir='data', vocab=None,
+                   dtype=None):
+    """Load word embeddings from an embedding store.
+
+    Parameters
+    ----------
+    mapfile : str, defaults to 'embed'
+        Name of the store ; it is created from the GoogleNews model if
+        it does not exist.
+    data_dir : str, defaults to 'data'
+        Directory of the store.
+    vocab : iterable of str, optional
+        If given, only the embeddings of these words are loaded (in
+        memory), typically the vocabulary of the corpus at hand.
+        Otherwise, the whole matrix is memory-mapped.
+    dtype : numpy dtype, optional
+        If given, convert the embeddings to this type.
+
+    Returns
+    -------
+    vocab_dict : dict(str, int)
+        Row of each word in W.
+    W : 2-dimensional array
+        Word embeddings.
+    """
+    mat_path, legacy_path, vocab_path = _store_paths(mapfile, data_dir)
     # create cache file if necessary
-    if ((not os.path.exists('data/%s.dat' % mapfile) or
-         not os.path.exists('data/%s.vocab' % mapfile))):
-        create_cache(filepath='data')
+    if (not os.path.exists(vocab_path) or
+            not (os.path.exists(mat_path) or os.path.exists(legacy_path))):
+        create_cache(filepath=data_dir, mapfile=mapfile)
     print('Loading embedding...', file=sys.stderr)
-    # memmap the cache file
-    W = np.memmap("data/%s.dat" % mapfile, dtype=np.double, mode="r",
-                  shape=(3000000, 300))
-    with open("data/%s.vocab" % mapfile) as f:
+    with open(vocab_path, encoding="utf8") as f:
         vocab_list = [x.strip() for x in f.readlines()]
+    # memmap the cache file
+    if os.path.exists(mat_path):
+        W = np.load(mat_path, mmap_mode='r')
+    else:
+        # legacy cache: raw np.double, shape inferred from the vocabulary
+        nb_vals = os.path.getsize(legacy_path) // np.dtype(np.double).itemsize
+        W = np.memmap(legacy_path, dtype=np.double, mode="r",
+                      shape=(len(vocab_list), nb_vals // len(vocab_list)))
+    if W.shape[0] != len(vocab_list):
+        raise ValueError('Embedding store {}: {} words for {} vectors'.format(
+            mapfile, len(vocab_list), W.shape[0]))
     vocab_dict = {w: k for k, w in enumerate(vocab_list)}
+    if vocab is not None:
+        # subset of the vocabulary, in the original order of the rows
+        # so the memmap is read sequentially
+        rows = sorted(set(vocab_dict[w] for w in vocab if w in vocab_dict))
+        vocab_dict = {vocab_list[row]: k for k, row in enumerate(rows)}
+        W = W[rows]
+    if dtype is not None:
+        W = W.astype(dtype, copy=False)
     print('done', file=sys.stderr)
     return vocab_dict, W
 
 
+def subset_embedding(mapfile, sub_mapfile, vocab, data_dir='data',
+                     dtype=np.float32):
+    """Save the embeddings of a subset of the vocabulary to a new store.
+
+    This is useful to restrict a huge store to the vocabulary of a
+    corpus, once and for all.
+
+    Parameters
+    ----------
+    mapfile : str
+        Name of the source store.
+    sub_mapfile : str
+        Name of the new store.
+    vocab : iterable of str
+        Words to keep.
+    data_dir : str, defaults to 'data'
+        Directory of both stores.
+    dtype : numpy dtype, defaults to np.float32
+        Type of the stored values.
+    """
+    vocab_dict, W = load_embedding(mapfile, data_dir=data_dir, vocab=vocab)
+    words = sorted(vocab_dict, key=vocab_dict.get)
+    save_embedding(sub_mapfile, words, W, data_dir=data_dir, dtype=dtype)
+
+
 def wmd(edu_vecs, i, j, D_embed):
     """Compute the Word Mover's Distance between two EDUs.
 
@@ -92,23 +224,154 @@ def wmd(edu_vecs, i, j, D_embed):
 
     Notes
     -----
-    This function is an example implementation to compute the WMD
-    on a pair of EDUs.
-    You are however discouraged to use it as is if speed and memory matter.
-    The recommended way is then to copy this function into your script,
-    remove the parameters `edu_vecs` and `D_embed` from the signature of
-    this function and have them point to variables from a wider scope
-    (e.g. global variables from the module, even if they are defined in a
-    conditional block such as `if __name__ == "__main__"`).
-    This way, joblib.Parallel does not have to pickle parameters.
-    An alternative course would be to memmap parameters as in the
-    joblib.Parallel documentation, but it still runs an order of magnitude
-    slower.
+    This function computes the WMD on a single pair of EDUs.
+    To compute it on many pairs, possibly in parallel, use
+    `pairwise_wmd` which shares `D_embed` between workers and does not
+    compute twice the distance between the same bags of words.
     """
-    v_1 = edu_vecs[i].toarray().ravel()
-    v_2 = edu_vecs[j].toarray().ravel()
+    # EMD is extremely sensitive on the number of dimensions it has to
+    # work with ; keep only the dimensions where at least one of the
+    # two vectors is != 0
+    union_idx = np.union1d(edu_vecs[i].indices, edu_vecs[j].indices)
+    # EMD segfaults on incorrect parameters: if both vectors are all
+    # zeros, return 0.0 (consider they are the same)
+    if len(union_idx) == 0:
+        return 0.0
+    v_1 = edu_vecs[i, union_idx].toarray().ravel().astype(np.double)
+    v_2 = edu_vecs[j, union_idx].toarray().ravel().astype(np.double)
+    D_minimal = np.ascontiguousarray(D_embed[np.ix_(union_idx, union_idx)],
+                                     dtype=np.double)
     # NB: emd() has an additional named parameter: extra_mass_penalty
     # pyemd by default sets it to -1, i.e. the max value in the distance
     # matrix
-    s = emd(v_1, v_2, D_embed)
+    s = emd(v_1, v_2, D_minimal)
     return s
+
+
+def _wmd_batch(edu_vecs, pairs, D_embed):
+    """Compute the WMD for a batch of pairs of EDUs.
+
+    Parameters
+    ----------
+    edu_vecs : csr_matrix
+        One row per EDU of the batch, with sorted indices and no
+        duplicates.
+    pairs : array of int, shape (n_pairs, 2)
+        Row indices of the EDUs of each pair.
+    D_embed : dense matrix of np.double
+        Distance matrix between each pair of word embeddings ; in
+        workers, a read-only memmap.
+
+    Returns
+    -------
+    dists : list of np.double
+        WMD of each pair.
+
+    Notes
+    -----
+    This is `wmd` working directly on the CSR arrays, as indexing
+    sparse matrices row by row is slow.
+    """
+    indptr, indices = edu_vecs.indptr, edu_vecs.indices
+    data = edu_vecs.data.astype(np.double)
+    dists = []
+    for i, j in pairs.tolist():
+        idx_i = indices[indptr[i]:indptr[i + 1]]
+        idx_j = indices[indptr[j]:indptr[j + 1]]
+        union_idx = np.union1d(idx_i, idx_j)
+        if len(union_idx) == 0:
+            dists.append(0.0)
+            continue
+        v_1 = np.zeros(len(union_idx), dtype=np.double)
+        v_1[np.searchsorted(union_idx, idx_i)] = data[indptr[i]:indptr[i + 1]]
+        v_2 = np.zeros(len(union_idx), dtype=np.double)
+        v_2[np.searchsorted(union_idx, idx_j)] = data[indptr[j]:indptr[j + 1]]
+        D_minimal = np.ascontiguousarray(
+            D_embed[np.ix_(union_idx, union_idx)], dtype=np.double)
+        dists.append(emd(v_1, v_2, D_minimal))
+    return dists
+
+
+def pairwise_wmd(edu_vecs, pairs, D_embed, n_jobs=1, verbose=0,
+                 batch_size=1000, temp_folder=None):
+    """Compute the Word Mover's Distance between many pairs of EDUs.
+
+    EDUs with the same bag of words are grouped, so that the EMD is
+    computed once for each distinct (unordered) pair of bags of words.
+    Pairs are then sent to workers in batches, along with only the
+    rows of `edu_vecs` they need. The distance matrix is shared
+    read-only between workers through a memmap, instead of being
+    copied into each of them.
+
+    Parameters
+    ----------
+    edu_vecs : sparse matrix
+        One row per EDU.
+    pairs : list of (int, int)
+        Indices of the EDUs of each pair.
+    D_embed : dense matrix of np.double
+        Distance matrix between each pair of word embeddings ; it
+        must be symmetric, as WMD(a, b) is assumed to equal WMD(b, a).
+        If it is not already a memmap, it is dumped to a temporary
+        file when `n_jobs != 1`.
+    n_jobs : int, defaults to 1
+        Number of concurrently running jobs, see `joblib.Parallel`.
+    verbose : int, defaults to 0
+        Verbosity level of `joblib.Parallel`.
+    batch_size : int, defaults to 1000
+        Number of pairs per job.
+    temp_folder : str, optional
+        Folder for the memmapped distance matrix ; defaults to a new
+        temporary folder, deleted afterwards.
+
+    Returns
+    -------
+    dists : array of np.double, shape (n_pairs,)
+        WMD of each pair.
+    """
+    pairs = np.asarray(pairs, dtype=np.intp).reshape(-1, 2)
+    if len(pairs) == 0:
+        return np.zeros(0, dtype=np.double)
+    edu_vecs = sp.csr_matrix(edu_vecs, copy=True)
+    edu_vecs.sum_duplicates()  # also sorts indices
+    # group EDUs with the same bag of words
+    bow_ids = {}
+    edu_bows = np.zeros(edu_vecs.shape[0], dtype=np.intp)
+    bow_reps = []  # representative EDU for each bag of words
+    indptr, indices, data = edu_vecs.indptr, edu_vecs.indices, edu_vecs.data
+    for i in np.unique(pairs).tolist():
+        beg, end = indptr[i], indptr[i + 1]
+        key = (indices[beg:end].tobytes(), data[beg:end].tobytes())
+        if key not in bow_ids:
+            bow_ids[key] = len(bow_reps)
+            bow_reps.append(i)
+        edu_bows[i] = bow_ids[key]
+    # distinct unordered pairs of bags of words
+    bow_pairs = np.sort(edu_bows[pairs], axis=1)
+    uniq_pairs, pair_idx = np.unique(bow_pairs, axis=0, return_inverse=True)
+    uniq_pairs = np.asarray(bow_reps, dtype=np.intp)[uniq_pairs]
+    # batches of pairs, each with the rows of edu_vecs it needs
+    batches = []
+    for beg in range(0, len(uniq_pairs), batch_size):
+        batch = uniq_pairs[beg:beg + batch_size]
+        rows = np.unique(batch)
+        batches.append((edu_vecs[rows], np.searchsorted(rows, batch)))
+
+    tmp_dir = None
+    try:
+        if n_jobs != 1 and not isinstance(D_embed, np.memmap):
+            # share the distance matrix through a memmap
+            tmp_dir = tempfile.mkdtemp(prefix='educe-wmd-', dir=temp_folder)
+            mmap_path = os.path.join(tmp_dir, 'D_embed.npy')
+            np.save(mmap_path, np.asarray(D_embed, dtype=np.double))
+            D_embed = np.load(mmap_path, mmap_mode='r')
+        batch_dists = Parallel(n_jobs=n_jobs, verbose=verbose)(
+            delayed(_wmd_batch)(batch_vecs, batch_pairs, D_embed)
+            for batch_vecs, batch_pairs in batches)
+    finally:
+        if tmp_dir is not None:
+            del D_embed
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    uniq_dists = np.array([d for dists in batch_dists for d in dists],
+                          dtype=np.double)
+    return uniq_dists[pair_idx.ravel()]
@@ -4,7 +4,7 @@ Feature extraction library functions for PDTB corpus
 
 from collections import namedtuple
 
-from educe.learning.keys import KeyGroup, MergedKeyGroup
+from educe.learning.keys import Key, KeyGroup, MergedKeyGroup, Substance
 
 # pylint: disable=too-many-public-methods
 
@@ -102,7 +102,12 @@ class RelSubGroup_Core(RelSubgroup):
 
     def __init__(self):
         desc = self.__doc__.strip()
-        keys = []
+        keys = [
+            Key(Substance.STRING, "document",
+                "document the relation belongs to"),
+            Key(Substance.STRING, "id",
+                "identifier of the relation, from its spans")
+        ]
         super(RelSubGroup_Core, self).__init__(desc, keys)
 
     def fill(self, current, rel, target=None):
@@ -124,10 +129,18 @@ class RelKeys(MergedKeyGroup):
                                       groups)
 
     def fill(self, current, rel, target=None):
-        "See `RelSubgroup`"
+        """
+        See `RelSubgroup`
+
+        If the target is not this group, eg. a vector from
+        `self.compile()`, it gets fresh vectors for its arguments
+        """
         vec = self if target is None else target
-        vec.arg1.fill(current, rel.arg1)
-        vec.arg2.fill(current, rel.arg2)
+        if vec is not self:
+            vec.arg1 = self.arg1.compile().vector()
+            vec.arg2 = self.arg2.compile().vector()
+        self.arg1.fill(current, rel.arg1, vec.arg1)
+        self.arg2.fill(current, rel.arg2, vec.arg2)
         for group in self.groups:
             group.fill(current, rel, vec)
 
@@ -152,9 +165,10 @@ def extract_rel_features(inputs):
     Return a pair of dictionaries, one for attachments
     and one for relations
     """
+    keys = RelKeys(inputs)
     for k in inputs.corpus:
         current = mk_current(inputs, k)
         for rel in current.doc:
-            vec = RelKeys(inputs)
-            vec.fill(current, rel)
+            vec = keys.compile().vector()
+            keys.fill(current, rel, vec)
             yield vec
@@ -5,9 +5,13 @@
 from __future__ import print_function
 
 from collections import Counter
+import hashlib
 import itertools
 import os
+import pickle
+import sys
 
+from joblib import Parallel, delayed
 from nltk import Tree
 from nltk.corpus.reader import BracketParseCorpusReader
 import pandas as pd
@@ -23,6 +27,7 @@ from educe.rst_dt.corpus import (Reader as RstReader,
                                  RstRelationConverter,
                                  RELMAP_112_18_FILE)
 from educe.rst_dt.document_plus import align_edus_with_paragraphs
+from educe.rst_dt.parse import read_annotation_file
 from educe.rst_dt.ptb import (_guess_ptb_name, _tweak_token,
                               is_empty_category, generic_token_spans,
                               _mk_token, align_edus_with_sentences)
@@ -39,6 +44,30 @@ CD_TRAIN = os.path.join(CORPUS_DIR, 'TRAINING')
 CD_TEST = os.path.join(CORPUS_DIR, 'TEST')
 # relation converter (fine- to coarse-grained labels)
 REL_CONV = RstRelationConverter(RELMAP_112_18_FILE).convert_tree
+# cache for the diagnostic frames, see `_cached` ;
+# bump CACHE_FORMAT whenever the content of the frames changes for a
+# reason that `_fingerprint` does not see
+CACHE_DIR = os.path.join(os.path.dirname(__file__),
+                         '..', '..',
+                         'data',
+                         'cache', 'corpus_diagnostics')
+CACHE_FORMAT = 1
+# modules that build the diagnostic frames: their source goes into the
+# fingerprint of the cached frames, see `_fingerprint`
+FINGERPRINT_MODULES = [
+    __name__,
+    'educe.annotation',
+    'educe.external.parser',
+    'educe.external.postag',
+    'educe.ptb.annotation',
+    'educe.ptb.head_finder',
+    'educe.rst_dt.annotation',
+    'educe.rst_dt.corpus',
+    'educe.rst_dt.document_plus',
+    'educe.rst_dt.parse',
+    'educe.rst_dt.ptb',
+    'educe.rst_dt.text',
+]
 
 
 def is_internal_node(node):
@@ -49,7 +78,152 @@ def is_internal_node(node):
     return isinstance(node, RSTTree) and len(node) > 1
 
 
-def load_corpus_as_dataframe(selection='train'):
+def _selection_files(selection):
+    """Get the files of a section of the RST-WSJ corpus"""
+    if selection == 'train':
+        rst_reader = RstReader(CD_TRAIN)
+    elif selection == 'test':
+        rst_reader = RstReader(CD_TEST)
+    else:
+        raise ValueError('Unknown selection {}'.format(selection))
+    return rst_reader.files()
+
+
+def _read_doc(doc_id, doc_files):
+    """Read the RST tree of a document, as `RstReader.slurp` does"""
+    rtree = read_annotation_file(*doc_files)
+    rtree.set_origin(doc_id)
+    return rtree
+
+
+def _fingerprint(name, params, anno_files, with_ptb=False):
+    """Fingerprint of the inputs of a diagnostic frame.
+
+    It covers the parameters, the source of the modules that build the
+    frames (`FINGERPRINT_MODULES`) and the relation mapping, the
+    version of pandas and the file stamps (name, size, modification
+    time) of the RST files and, if required, the PTB files.
+    Changes that do not show in these, e.g. in a third-party
+    dependency, need a bump of `CACHE_FORMAT`.
+    """
+    sha = hashlib.sha1()
+    sha.update(repr((CACHE_FORMAT, name, params,
+                     pd.__version__)).encode('utf-8'))
+    src_paths = [os.path.splitext(sys.modules[mod_name].__file__)[0] + '.py'
+                 for mod_name in FINGERPRINT_MODULES]
+    src_paths.append(RELMAP_112_18_FILE)
+    for src_path in src_paths:
+        with open(src_path, 'rb') as src_file:
+            sha.update(src_file.read())
+    paths = sorted(path for doc_files in anno_files.values()
+                   for path in doc_files)
+    if with_ptb:
+        ptb_names = (_guess_ptb_name(doc_id) for doc_id in anno_files)
+        paths.extend(sorted(os.path.join(PTB_DIR, ptb_name)
+                            for ptb_name in ptb_names
+                            if ptb_name is not None))
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamp = (os.path.basename(path), stat.st_size,
+                     int(stat.st_mtime))
+        except OSError:
+            stamp = (os.path.basename(path), None)
+        sha.update(repr(stamp).encode('utf-8'))
+    return sha.hexdigest()
+
+
+def _cached(cache_dir, name, fingerprint):
+    """Get a value from the cache, or None if missing or stale"""
+    if cache_dir is None:
+        return None
+    path = os.path.join(cache_dir, name + '.pkl')
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as cache_file:
+            entry = pickle.load(cache_file)
+    except Exception:  # unreadable, e.g. written by another pandas
+        return None
+    if entry.get('fingerprint') != fingerprint:
+        return None
+    return entry['value']
+
+
+def _cache(cache_dir, name, fingerprint, value):
+    """Store a value in the cache (no-op if cache_dir is None)"""
+    if cache_dir is None:
+        return
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    path = os.path.join(cache_dir, name + '.pkl')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as cache_file:
+        pickle.dump({'fingerprint': fingerprint, 'value': value},
+                    cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.rename(tmp_path, path)
+
+
+def _load_doc_phrases(doc_id, doc_files):
+    """Load the relation instances of one document.
+
+    This is the per-document part of `load_corpus_as_dataframe`.
+
+    Parameters
+    ----------
+    doc_id : FileId
+        Identifier of the document.
+
+    doc_files : (str, str)
+        Paths to the .dis file and text file of the document.
+
+    Returns
+    -------
+    rst_phrases : list(dict)
+        One row per relation instance.
+    """
+    rst_phrases = []  # list of rows, each represented as a dict
+    rtree_ref = _read_doc(doc_id, doc_files)
+    # convert labels to coarse
+    coarse_rtree_ref = REL_CONV(rtree_ref)
+    # store "same-unit" subtrees
+    heterogeneous_nodes = []
+    for su_subtree in coarse_rtree_ref.subtrees(filter=is_internal_node):
+        # get each kid's relation
+        kid_rels = tuple(treenode(kid).rel for kid in su_subtree)
+        # filter out nodes whose kids have different relations
+        rels = [r for r in set(kid_rels) if r != 'span']
+        if len(rels) > 1:
+            heterogeneous_nodes.append(kid_rels)
+            continue
+
+        # process homogeneous nodes
+        res = dict()
+        rel = rels[0]
+        res['rel'] = rel
+        # arity
+        res['arity'] = len(su_subtree)  # number of kids
+        # nuclearity signature
+        kid_nucs = tuple(treenode(kid).nuclearity for kid in su_subtree)
+        nuc_sig = ''.join('S' if kid_nuc == 'Satellite' else 'N'
+                          for kid_nuc in kid_nucs)
+        res['nuc_sig'] = (nuc_sig if nuc_sig in frozenset(['SN', 'NS'])
+                          else 'NN')
+        # TODO len(kid_rels) - 1 is the nb of bin rels
+
+        # height
+        rel_hgt = su_subtree.height()
+        res['height'] = rel_hgt
+
+        # TODO disc relations of the grandchildren
+        #
+
+        rst_phrases.append(res)
+    return rst_phrases
+
+
+def load_corpus_as_dataframe(selection='train', n_jobs=1, verbose=0,
+                             cache_dir=CACHE_DIR):
     """Load training section of the RST-WSJ corpus as a pandas.DataFrame.
 
     Parameters
@@ -57,58 +231,35 @@ def load_corpus_as_dataframe(selection='train'):
     selection : one of {'train', 'test'}  TODO: add 'both'
         Select the part of the corpus to load.
 
+    n_jobs : int, defaults to 1
+        Number of documents processed in parallel, see
+        `joblib.Parallel`.
+
+    verbose : int, defaults to 0
+        Verbosity level of `joblib.Parallel`.
+
+    cache_dir : str or None, defaults to CACHE_DIR
+        Directory where the DataFrame is cached, and reused as long as
+        the corpus files and this module are unchanged ; if None, the
+        cache is not used.
+
     Returns
     -------
     df: pandas.DataFrame
         DataFrame of all instances of relations in the training section.
         Interesting columns are 'rel', 'nuc_sig', 'arity'
     """
-    rst_phrases = []  # list of rows, each represented as a dict
-
-    if selection == 'train':
-        rst_reader = RstReader(CD_TRAIN)
-    elif selection == 'test':
-        rst_reader = RstReader(CD_TEST)
-    else:
-        raise ValueError('Unknown selection {}'.format(selection))
-
-    rst_corpus = rst_reader.slurp()
-    for doc_id, rtree_ref in sorted(rst_corpus.items()):
-        # convert labels to coarse
-        coarse_rtree_ref = REL_CONV(rtree_ref)
-        # store "same-unit" subtrees
-        heterogeneous_nodes = []
-        for su_subtree in coarse_rtree_ref.subtrees(filter=is_internal_node):
-            # get each kid's relation
-            kid_rels = tuple(treenode(kid).rel for kid in su_subtree)
-            # filter out nodes whose kids have different relations
-            rels = [r for r in set(kid_rels) if r != 'span']
-            if len(rels) > 1:
-                heterogeneous_nodes.append(kid_rels)
-                continue
-
-            # process homogeneous nodes
-            res = dict()
-            rel = rels[0]
-            res['rel'] = rel
-            # arity
-            res['arity'] = len(su_subtree)  # number of kids
-            # nuclearity signature
-            kid_nucs = tuple(treenode(kid).nuclearity for kid in su_subtree)
-            nuc_sig = ''.join('S' if kid_nuc == 'Satellite' else 'N'
-                              for kid_nuc in kid_nucs)
-            res['nuc_sig'] = (nuc_sig if nuc_sig in frozenset(['SN', 'NS'])
-                              else 'NN')
-            # TODO len(kid_rels) - 1 is the nb of bin rels
-
-            # height
-            rel_hgt = su_subtree.height()
-            res['height'] = rel_hgt
-
-            # TODO disc relations of the grandchildren
-            #
-
-            rst_phrases.append(res)
+    anno_files = _selection_files(selection)
+    cache_name = 'phrases-{}'.format(selection)
+    fingerprint = _fingerprint(cache_name, (), anno_files)
+    df = _cached(cache_dir, cache_name, fingerprint)
+    if df is not None:
+        return df
+
+    doc_phrases = Parallel(n_jobs=n_jobs, verbose=verbose)(
+        delayed(_load_doc_phrases)(doc_id, doc_files)
+        for doc_id, doc_files in sorted(anno_files.items()))
+    rst_phrases = list(itertools.chain.from_iterable(doc_phrases))
 
     # turn into a DataFrame
     df = pd.DataFrame(rst_phrases)
@@ -117,6 +268,7 @@ def load_corpus_as_dataframe(selection='train'):
     df['unuc_sig'] = df['nuc_sig'].map(
         lambda nuc_sig: ('NS' if nuc_sig in ['NS', 'SN']
                          else 'NN'))
+    _cache(cache_dir, cache_name, fingerprint, df)
     return df
 
 
@@ -378,8 +530,402 @@ def load_spans(coarse_rtree_ref):
     return doc_span_rows
 
 
+def _load_doc_rows_new(doc_id, doc_files, binarize=False, verbose=0):
+    """Load the rows of the diagnostic frames for one document.
+
+    This is the per-document part of `load_corpus_as_dataframe_new`.
+
+    Parameters
+    ----------
+    doc_id : FileId
+        Identifier of the document.
+
+    doc_files : (str, str)
+        Paths to the .dis file and text file of the document.
+
+    binarize : boolean, default: False
+        If True, apply right-heavy binarization on RST trees.
+
+    verbose : int, defaults to 0
+        Print details on leaky sentences.
+
+    Returns
+    -------
+    doc_rows : tuple of list(dict)
+        Rows of the document for the relation, EDU, sentence,
+        paragraph and straddling relation frames.
+    """
+    rtree_ref = _read_doc(doc_id, doc_files)
+    doc_strad_rels_rows = []
+
+    doc_ctx = rtree_ref.label().context
+    doc_text = doc_ctx.text()
+    doc_edus = rtree_ref.leaves()
+
+    # 0. collect EDUs
+    doc_edu_rows = load_edus(doc_edus)
+
+    # 1. collect spans (constituency nodes) from the gold RST trees
+    #
+    # transform the original RST tree: convert labels to their
+    # coarse equivalent, binarize if required
+    coarse_rtree_ref = REL_CONV(rtree_ref)
+    if binarize:
+        coarse_rtree_ref = _binarize(coarse_rtree_ref)
+    # collect spans
+    doc_span_rows = load_spans(coarse_rtree_ref)
+
+    # prepare this info to find "leaky" substructures:
+    # sentences and paragraphs
+    # dict of EDU spans to constituent node from the RST tree
+    rst_tree_node_spans = {
+        (row['edu_start'], row['edu_end']): row['treepos']
+        for row in doc_span_rows
+    }
+    # list of EDU spans of constituent nodes, sorted by length of span
+    # then start
+    rst_tree_node_spans_by_len = list(sorted(
+        rst_tree_node_spans, key=lambda x: (x[1] - x[0], x[0])))
+
+    # 2. Collect sentences
+    doc_sent_rows = []
+    # use dirty PTB tokenizer + parser
+    # NB: the two following lines eat up 67% of total time
+    doc_tkd_toks = tokenize_doc_ptb(doc_id, doc_text)
+    doc_tkd_trees = parse_doc_ptb(doc_id, doc_tkd_toks)
+
+    # sentence <-> EDU mapping and the information that depends on this
+    # mapping might be more appropriate as a separate DataFrame
+    # align EDUs with sentences
+    edu2sent = align_edus_with_sentences(doc_edus, doc_tkd_trees,
+                                         strict=False)
+    # get the codomain of edu2sent
+    # if we want to be strict, we can assert that the codomain is
+    # a gapless interval
+    # assert sent_idc == list(range(len(doc_tkd_trees)))
+    # this assertion is currently known to fail on:
+    # * RST-WSJ/TRAINING/wsj_0678.out: wrong sentence segmentation in PTB
+    #     (1 sentence is split in 2)
+    edu2sent_codom = set([sent_idx for sent_idx in edu2sent
+                          if sent_idx is not None])
+
+    # find the index of the first and last EDU of each sentence
+    # indices in both lists are offset by 1 to map to real EDU
+    # numbering (which is 1-based)
+    sent_edu_starts = [(edu2sent.index(i) + 1 if i in edu2sent_codom
+                        else None)
+                       for i in range(len(doc_tkd_trees))]
+    sent_edu_ends = [(len(edu2sent) - 1 - edu2sent[::-1].index(i) + 1
+                      if i in edu2sent_codom
+                      else None)
+                     for i in range(len(doc_tkd_trees))]
+    # sentences that don't have their own RST subtree are 'leaky'
+
+    # WIP propagate sentence-EDU mapping to RST tree spans
+    for row in doc_span_rows:
+        # offset by -1 because edu2sent is 0-based
+        row['sent_start'] = edu2sent[row['edu_start'] - 1]
+        row['sent_end'] = edu2sent[row['edu_end'] - 1]
+        # inferred columns
+        # special cases because edu2sent is None for EDUs whose text
+        # is missing from PTB
+        if ((row['sent_start'] is not None and
+             row['sent_end'] is not None)):
+            row['sent_len'] = row['sent_end'] - row['sent_start'] + 1
+            row['intra_sent'] = (row['sent_start'] == row['sent_end'])
+            row['strad_sent'] = (
+                not row['intra_sent'] and
+                (not row['edu_start'] in sent_edu_starts or
+                 not row['edu_end'] in sent_edu_ends)
+            )
+        else:
+            row['sent_len'] = None
+            row['intra_sent'] = None
+            row['strad_sent'] = None
+    # end WIP propagate
+
+    # end of sentence <-> EDU mapping et al.
+
+    # iterate over syntactic trees as proxy for sentences
+    for sent_idx, tkd_tree in enumerate(doc_tkd_trees):
+        row = {
+            # data directly from the sentence segmenter
+            'sent_id': '{}_sent{}'.format(doc_id.doc, sent_idx),
+            'char_start': tkd_tree.span.char_start,
+            'char_end': tkd_tree.span.char_end,
+        }
+        # sentence <-> EDU mapping dependent data
+        # should probably have its own dataframe
+        # to better handle disagreement between sentence and EDU
+        # segmentation, that translates in the following entries
+        # as None for missing data
+        if sent_idx in edu2sent_codom:
+            row.update({
+                'edu_start': sent_edu_starts[sent_idx],
+                'edu_end': sent_edu_ends[sent_idx],
+                # computed column
+                'edu_len': (sent_edu_ends[sent_idx] -
+                            sent_edu_starts[sent_idx]) + 1,
+            })
+
+            # use alignment: sentence <-> RST tree spans (via EDUs)
+            # leaky sentences: complex (2+ EDUs) sentences that don't
+            # have a corresponding span in the RST tree
+            leaky = (row['edu_len'] > 1 and
+                     ((sent_edu_starts[sent_idx],
+                       sent_edu_ends[sent_idx])
+                      not in rst_tree_node_spans))
+            row.update({
+                'leaky': leaky,
+            })
+            # find for each leaky sentence the smallest RST subtree
+            # that covers it
+            if row['leaky']:
+                sent_edu_first = sent_edu_starts[sent_idx]
+                sent_edu_last = sent_edu_ends[sent_idx]
+                # find parent span and straddling spans ;
+                # straddling spans exist for type 3 and 4
+                strad_spans = []
+                for edu_span in rst_tree_node_spans_by_len:
+                    # parent span
+                    if ((edu_span[0] <= sent_edu_first and
+                         sent_edu_last <= edu_span[1])):
+                        parent_span = edu_span
+                        break
+                    # straddling spans
+                    if ((edu_span[0] < sent_edu_first and
+                         sent_edu_first <= edu_span[1]) or
+                        (edu_span[0] <= sent_edu_last and
+                         sent_edu_last < edu_span[1])):
+                        strad_spans.append(edu_span)
+                else:
+                    raise ValueError(
+                        'No minimal spanning node for {}'.format(row))
+                # leaky types {1, 2} vs {3, 4}:
+                # for types 1 and 2, members of the parent
+                # constituent are "pure" wrt sentence span:
+                # each member is either fully inside or fully
+                # outside the sentence ;
+                # no member straddles either of the sentence
+                # boundaries
+                leaky_type_12 = not strad_spans
+                # DEBUG
+                if verbose:
+                    print(doc_id.doc)
+                    print(parent_span, strad_spans if strad_spans else '')
+                # end DEBUG
+
+                # leaky types {1, 3} vs {2, 4}
+                # {1, 3} have at least one coordinative (aka multinuclear)
+                # relation in the chain of spans between the parent span
+                # and the EDU(s) of the leaky sentence ;
+                # {2, 4} have only subordinative (aka mononuclear)
+                # relations
+                leaky_coord = False
+                # first, check the kids of the parent span
+                parent_tpos = rst_tree_node_spans[parent_span]
+                parent_subtree = coarse_rtree_ref[parent_tpos]
+                if all(kid.label().nuclearity == 'Nucleus'
+                       for kid in parent_subtree):
+                    leaky_coord = True
+
+                # then, check the kids of all straddling spans
+                strad_rels = []  # TEMPORARY
+                for strad_span in strad_spans:
+                    strad_tpos = rst_tree_node_spans[strad_span]
+                    strad_subtree = coarse_rtree_ref[strad_tpos]
+                    if all(kid.label().nuclearity == 'Nucleus'
+                           for kid in strad_subtree):
+                        leaky_coord = True
+                    # TEMPORARY: store straddling relations (from kids)
+                    kid_rels = [kid.label().rel
+                                for kid in strad_subtree
+                                if kid.label().rel != 'span']
+                    # if all kids bear the same relation label, store
+                    # only this value
+                    if len(set(kid_rels)) == 1:
+                        kid_rels = kid_rels[0]
+                    else:
+                        kid_rels = '+'.join(kid_rels)
+                    strad_rels.append(kid_rels)
+                    # WIP list of straddling relations
+                    doc_strad_rels_rows.append({
+                        'node_id': '{}_const{}'.format(
+                            strad_subtree.origin.doc,
+                            '-'.join(str(x) for x in strad_tpos)),
+                        'sent_id': '{}_sent{}'.format(
+                            doc_id.doc, sent_idx),
+                        'kid_rels': kid_rels,
+                    })
+                    # end WIP running counter
+                # determine type of leaky (ugly)
+                if leaky_type_12:
+                    if leaky_coord:
+                        leaky_type = 1
+                    else:
+                        leaky_type = 2
+                else:
+                    if leaky_coord:
+                        leaky_type = 3
+                    else:
+                        leaky_type = 4
+                # display type of leaky
+                if verbose:
+                    print('Type {} ({}-level {} structure)\t{}'.format(
+                        leaky_type,
+                        'Same' if leaky_type_12 else 'Multi',
+                        'coordination' if leaky_coord else 'subordination',
+                        '; '.join(strad_rels)))
+                    print()
+                # end WIP nuclearity of straddling spans
+
+                # add info to row
+                row.update({
+                    # parent span, in EDUs
+                    'parent_edu_start': parent_span[0],
+                    'parent_edu_end': parent_span[1],
+                    # length of parent span, in sentences
+                    'parent_sent_len': (
+                        edu2sent[parent_span[1] - 1] -
+                        edu2sent[parent_span[0] - 1] + 1),
+                    # distance between the current sentence and the most
+                    # remote sentence covered by the parent span,
+                    # in sentences
+                    'parent_sent_dist': (
+                        max([(edu2sent[parent_span[1] - 1] - sent_idx),
+                             (sent_idx - edu2sent[parent_span[0] - 1])])),
+                    # types of leaky, in the taxonomy of
+                    # (van der Vliet et al. 2011)
+                    'leaky_type': leaky_type,
+                })
+            else:
+                row.update({
+                    'parent_span_start': row['edu_start'],
+                    'parent_span_end': row['edu_end'],
+                    # default value for leaky_type, provides a mean for
+                    # easy comparison on complex sentences, between
+                    # non-leaky and the various types of leaky
+                    'leaky_type': 0,
+                })
+            # end WIP
+        doc_sent_rows.append(row)
+
+    # 3. collect paragraphs
+    doc_para_rows = []
+    doc_paras = doc_ctx.paragraphs
+    doc_text = doc_ctx.text()
+    # doc_paras is None when the original text has no explicit marking
+    # for paragraphs ; this is true for 'fileX' documents in the RST-WSJ
+    # corpus
+    if doc_paras is not None:
+        # EDU to paragraph mapping
+        edu2para = align_edus_with_paragraphs(doc_edus, doc_paras,
+                                              doc_text, strict=False)
+        edu2para_codom = set([para_idx for para_idx in edu2para
+                              if para_idx is not None])
+        # index of the first and last EDU of each paragraph
+        para_edu_starts = [(edu2para.index(i) + 1 if i in edu2para_codom
+                            else None)
+                           for i in range(len(doc_paras))]
+        para_edu_ends = [(len(edu2para) - 1 - edu2para[::-1].index(i) + 1
+                          if i in edu2para_codom
+                          else None)
+                         for i in range(len(doc_paras))]
+        # paragraphs that don't have their own RST subtree are "leaky" ;
+        # end of paragraph <-> EDU mapping et al.
+
+        # iterate over paragraphs
+        for para_idx, para in enumerate(doc_paras):
+            # dirty, educe.rst_dt.text.Paragraph should have a span
+            para_span = Span(para.sentences[0].span.char_start,
+                             para.sentences[-1].span.char_end)
+            # end dirty
+            row = {
+                # data directly from the paragraph segmenter
+                'para_id': '{}_para{}'.format(doc_id.doc, para_idx),
+                'char_start': para_span.char_start,
+                'char_end': para_span.char_end,
+            }
+            # paragraph <-> EDU mapping dependent data
+            # should probably have its own dataframe etc.
+            if para_idx in edu2para_codom:
+                row.update({
+                    'edu_start': para_edu_starts[para_idx],
+                    'edu_end': para_edu_ends[para_idx],
+                    # computed column
+                    'edu_len': (para_edu_ends[para_idx] -
+                                para_edu_starts[para_idx]) + 1,
+                })
+                # use paragraph <-> RST tree alignment
+                if row['edu_len'] > 1:  # complex paragraphs only
+                    row.update({
+                        'leaky': ((para_edu_starts[para_idx],
+                                   para_edu_ends[para_idx])
+                                  not in rst_tree_node_spans),
+                    })
+                else:
+                    row.update({'leaky': False})
+                # WIP find for each leaky paragraph the smallest RST
+                # subtree that covers it
+                if row['leaky']:
+                    for edu_span in rst_tree_node_spans_by_len:
+                        if ((edu_span[0] <= para_edu_starts[para_idx] and
+                             para_edu_ends[para_idx] <= edu_span[1])):
+                            parent_span = edu_span
+                            break
+                    else:
+                        raise ValueError(
+                            'No minimal spanning node for {}'.format(row))
+                    # add info to row
+                    row.update({
+                        # parent span, on EDUs
+                        'parent_edu_start': parent_span[0],
+                        'parent_edu_end': parent_span[1]
+                    })
+                    # length of parent span, in paragraphs
+                    if ((edu2para[parent_span[1] - 1] is not None and
+                         edu2para[parent_span[0] - 1] is not None)):
+                        row.update({
+                            'parent_para_len': (
+                                edu2para[parent_span[1] - 1] -
+                                edu2para[parent_span[0] - 1] + 1),
+                            # distance between the current paragraph and
+                            # the most remote paragraph covered by the
+                            # parent span, in paragraphs
+                            'parent_para_dist': (
+                                max([(edu2para[parent_span[1] - 1] -
+                                      para_idx),
+                                     (para_idx -
+                                      edu2para[parent_span[0] - 1])])),
+                        })
+                else:
+                    row.update({
+                        'parent_edu_start': row['edu_start'],
+                        'parent_edu_end': row['edu_end'],
+                    })
+                # end WIP
+            doc_para_rows.append(row)
+
+    # NB: these are leaky sentences wrt the original constituency
+    # trees ; leaky sentences wrt the binarized constituency trees
+    # might be different (TODO), similarly for the dependency trees
+    # (TODO too) ;
+    # I should count them, see if the ~5% Joty mentions are on the
+    # original or binarized ctrees, and compare with the number of
+    # leaky for deptrees ; I suspect the latter will be much lower...
+    # HYPOTHESIS: (some or all?) leaky sentences in ctrees correspond
+    # to cases where nodes that are not the head of their sentence
+    # have dependents in other sentences
+    # this would capture the set (or a subset) of edges that fall
+    # outside of the search space for the "iheads" intra/inter
+    # strategy
+
+    return (doc_span_rows, doc_edu_rows, doc_sent_rows, doc_para_rows,
+            doc_strad_rels_rows)
+
+
 def load_corpus_as_dataframe_new(selection='train', binarize=False,
-                                 verbose=0):
+                                 verbose=0, n_jobs=1, cache_dir=CACHE_DIR):
     """Load training section of the RST-WSJ corpus as a pandas.DataFrame.
 
     Parameters
@@ -390,6 +936,18 @@ def load_corpus_as_dataframe_new(selection='train', binarize=False,
     binarize : boolean, default: False
         If True, apply right-heavy binarization on RST trees.
 
+    verbose : int, defaults to 0
+        Verbosity level, for leaky sentences and `joblib.Parallel`.
+
+    n_jobs : int, defaults to 1
+        Number of documents processed in parallel, see
+        `joblib.Parallel`.
+
+    cache_dir : str or None, defaults to CACHE_DIR
+        Directory where the DataFrames are cached, and reused as long as
+        the RST and PTB files and this module are unchanged ; if None,
+        the cache is not used.
+
     Returns
     -------
     node_df: pandas.DataFrame
@@ -414,6 +972,17 @@ def load_corpus_as_dataframe_new(selection='train', binarize=False,
     both_df = train_df.append(test_df)
     ```
     """
+    anno_files = _selection_files(selection)
+    cache_name = 'frames-{}{}'.format(selection,
+                                      '-binarized' if binarize else '')
+    fingerprint = _fingerprint(cache_name, (binarize,), anno_files,
+                               with_ptb=True)
+    cached = _cached(cache_dir, cache_name, fingerprint)
+    if cached is not None:
+        dfs, cached_strad_rels_rows = cached
+        strad_rels_rows.extend(cached_strad_rels_rows)
+        return dfs
+
     node_rows = []  # list of dicts, one dict per node
     rel_rows = []  # list of dicts, one dict per relation
     # edu_rows contains pre-EDUs rather than EDUs themselves, but maybe
@@ -421,384 +990,21 @@ def load_corpus_as_dataframe_new(selection='train', binarize=False,
     edu_rows = []  # list of dicts, one dict per EDU
     sent_rows = []  # ibid
     para_rows = []  # ibid
-
-    if selection == 'train':
-        rst_reader = RstReader(CD_TRAIN)
-    elif selection == 'test':
-        rst_reader = RstReader(CD_TEST)
-    else:
-        raise ValueError('Unknown selection {}'.format(selection))
-
-    rst_corpus = rst_reader.slurp()
-
-    for doc_id, rtree_ref in sorted(rst_corpus.items()):
-        doc_ctx = rtree_ref.label().context
-        doc_text = doc_ctx.text()
-        doc_edus = rtree_ref.leaves()
-
-        # 0. collect EDUs
-        doc_edu_rows = load_edus(doc_edus)
-
-        # 1. collect spans (constituency nodes) from the gold RST trees
-        #
-        # transform the original RST tree: convert labels to their
-        # coarse equivalent, binarize if required
-        coarse_rtree_ref = REL_CONV(rtree_ref)
-        if binarize:
-            coarse_rtree_ref = _binarize(coarse_rtree_ref)
-        # collect spans
-        doc_span_rows = load_spans(coarse_rtree_ref)
-
-        # prepare this info to find "leaky" substructures:
-        # sentences and paragraphs
-        # dict of EDU spans to constituent node from the RST tree
-        rst_tree_node_spans = {
-            (row['edu_start'], row['edu_end']): row['treepos']
-            for row in doc_span_rows
-        }
-        # list of EDU spans of constituent nodes, sorted by length of span
-        # then start
-        rst_tree_node_spans_by_len = list(sorted(
-            rst_tree_node_spans, key=lambda x: (x[1] - x[0], x[0])))
-
-        # 2. Collect sentences
-        doc_sent_rows = []
-        # use dirty PTB tokenizer + parser
-        # NB: the two following lines eat up 67% of total time
-        doc_tkd_toks = tokenize_doc_ptb(doc_id, doc_text)
-        doc_tkd_trees = parse_doc_ptb(doc_id, doc_tkd_toks)
-
-        # sentence <-> EDU mapping and the information that depends on this
-        # mapping might be more appropriate as a separate DataFrame
-        # align EDUs with sentences
-        edu2sent = align_edus_with_sentences(doc_edus, doc_tkd_trees,
-                                             strict=False)
-        # get the codomain of edu2sent
-        # if we want to be strict, we can assert that the codomain is
-        # a gapless interval
-        # assert sent_idc == list(range(len(doc_tkd_trees)))
-        # this assertion is currently known to fail on:
-        # * RST-WSJ/TRAINING/wsj_0678.out: wrong sentence segmentation in PTB
-        #     (1 sentence is split in 2)
-        edu2sent_codom = set([sent_idx for sent_idx in edu2sent
-                              if sent_idx is not None])
-
-        # find the index of the first and last EDU of each sentence
-        # indices in both lists are offset by 1 to map to real EDU
-        # numbering (which is 1-based)
-        sent_edu_starts = [(edu2sent.index(i) + 1 if i in edu2sent_codom
-                            else None)
-                           for i in range(len(doc_tkd_trees))]
-        sent_edu_ends = [(len(edu2sent) - 1 - edu2sent[::-1].index(i) + 1
-                          if i in edu2sent_codom
-                          else None)
-                         for i in range(len(doc_tkd_trees))]
-        # sentences that don't have their own RST subtree are 'leaky'
-
-        # WIP propagate sentence-EDU mapping to RST tree spans
-        for row in doc_span_rows:
-            # offset by -1 because edu2sent is 0-based
-            row['sent_start'] = edu2sent[row['edu_start'] - 1]
-            row['sent_end'] = edu2sent[row['edu_end'] - 1]
-            # inferred columns
-            # special cases because edu2sent is None for EDUs whose text
-            # is missing from PTB
-            if ((row['sent_start'] is not None and
-                 row['sent_end'] is not None)):
-                row['sent_len'] = row['sent_end'] - row['sent_start'] + 1
-                row['intra_sent'] = (row['sent_start'] == row['sent_end'])
-                row['strad_sent'] = (
-                    not row['intra_sent'] and
-                    (not row['edu_start'] in sent_edu_starts or
-                     not row['edu_end'] in sent_edu_ends)
-                )
-            else:
-                row['sent_len'] = None
-                row['intra_sent'] = None
-                row['strad_sent'] = None
-        # end WIP propagate
-
-        # end of sentence <-> EDU mapping et al.
-
-        # iterate over syntactic trees as proxy for sentences
-        for sent_idx, tkd_tree in enumerate(doc_tkd_trees):
-            row = {
-                # data directly from the sentence segmenter
-                'sent_id': '{}_sent{}'.format(doc_id.doc, sent_idx),
-                'char_start': tkd_tree.span.char_start,
-                'char_end': tkd_tree.span.char_end,
-            }
-            # sentence <-> EDU mapping dependent data
-            # should probably have its own dataframe
-            # to better handle disagreement between sentence and EDU
-            # segmentation, that translates in the following entries
-            # as None for missing data
-            if sent_idx in edu2sent_codom:
-                row.update({
-                    'edu_start': sent_edu_starts[sent_idx],
-                    'edu_end': sent_edu_ends[sent_idx],
-                    # computed column
-                    'edu_len': (sent_edu_ends[sent_idx] -
-                                sent_edu_starts[sent_idx]) + 1,
-                })
-
-                # use alignment: sentence <-> RST tree spans (via EDUs)
-                # leaky sentences: complex (2+ EDUs) sentences that don't
-                # have a corresponding span in the RST tree
-                leaky = (row['edu_len'] > 1 and
-                         ((sent_edu_starts[sent_idx],
-                           sent_edu_ends[sent_idx])
-                          not in rst_tree_node_spans))
-                row.update({
-                    'leaky': leaky,
-                })
-                # find for each leaky sentence the smallest RST subtree
-                # that covers it
-                if row['leaky']:
-                    sent_edu_first = sent_edu_starts[sent_idx]
-                    sent_edu_last = sent_edu_ends[sent_idx]
-                    # find parent span and straddling spans ;
-                    # straddling spans exist for type 3 and 4
-                    strad_spans = []
-                    for edu_span in rst_tree_node_spans_by_len:
-                        # parent span
-                        if ((edu_span[0] <= sent_edu_first and
-                             sent_edu_last <= edu_span[1])):
-                            parent_span = edu_span
-                            break
-                        # straddling spans
-                        if ((edu_span[0] < sent_edu_first and
-                             sent_edu_first <= edu_span[1]) or
-                            (edu_span[0] <= sent_edu_last and
-                             sent_edu_last < edu_span[1])):
-                            strad_spans.append(edu_span)
-                    else:
-                        raise ValueError(
-                            'No minimal spanning node for {}'.format(row))
-                    # leaky types {1, 2} vs {3, 4}:
-                    # for types 1 and 2, members of the parent
-                    # constituent are "pure" wrt sentence span:
-                    # each member is either fully inside or fully
-                    # outside the sentence ;
-                    # no member straddles either of the sentence
-                    # boundaries
-                    leaky_type_12 = not strad_spans
-                    # DEBUG
-                    if verbose:
-                        print(doc_id.doc)
-                        print(parent_span, strad_spans if strad_spans else '')
-                    # end DEBUG
-
-                    # leaky types {1, 3} vs {2, 4}
-                    # {1, 3} have at least one coordinative (aka multinuclear)
-                    # relation in the chain of spans between the parent span
-                    # and the EDU(s) of the leaky sentence ;
-                    # {2, 4} have only subordinative (aka mononuclear)
-                    # relations
-                    leaky_coord = False
-                    # first, check the kids of the parent span
-                    parent_tpos = rst_tree_node_spans[parent_span]
-                    parent_subtree = coarse_rtree_ref[parent_tpos]
-                    if all(kid.label().nuclearity == 'Nucleus'
-                           for kid in parent_subtree):
-                        leaky_coord = True
-
-                    # then, check the kids of all straddling spans
-                    strad_rels = []  # TEMPORARY
-                    for strad_span in strad_spans:
-                        strad_tpos = rst_tree_node_spans[strad_span]
-                        strad_subtree = coarse_rtree_ref[strad_tpos]
-                        if all(kid.label().nuclearity == 'Nucleus'
-                               for kid in strad_subtree):
-                            leaky_coord = True
-                        # TEMPORARY: store straddling relations (from kids)
-                        kid_rels = [kid.label().rel
-                                    for kid in strad_subtree
-                                    if kid.label().rel != 'span']
-                        # if all kids bear the same relation label, store
-                        # only this value
-                        if len(set(kid_rels)) == 1:
-                            kid_rels = kid_rels[0]
-                        else:
-                            kid_rels = '+'.join(kid_rels)
-                        strad_rels.append(kid_rels)
-                        # WIP list of straddling relations
-                        strad_rels_rows.append({
-                            'node_id': '{}_const{}'.format(
-                                strad_subtree.origin.doc,
-                                '-'.join(str(x) for x in strad_tpos)),
-                            'sent_id': '{}_sent{}'.format(
-                                doc_id.doc, sent_idx),
-                            'kid_rels': kid_rels,
-                        })
-                        # end WIP running counter
-                    # determine type of leaky (ugly)
-                    if leaky_type_12:
-                        if leaky_coord:
-                            leaky_type = 1
-                        else:
-                            leaky_type = 2
-                    else:
-                        if leaky_coord:
-                            leaky_type = 3
-                        else:
-                            leaky_type = 4
-                    # display type of leaky
-                    if verbose:
-                        print('Type {} ({}-level {} structure)\t{}'.format(
-                            leaky_type,
-                            'Same' if leaky_type_12 else 'Multi',
-                            'coordination' if leaky_coord else 'subordination',
-                            '; '.join(strad_rels)))
-                        print()
-                    # end WIP nuclearity of straddling spans
-
-                    # add info to row
-                    row.update({
-                        # parent span, in EDUs
-                        'parent_edu_start': parent_span[0],
-                        'parent_edu_end': parent_span[1],
-                        # length of parent span, in sentences
-                        'parent_sent_len': (
-                            edu2sent[parent_span[1] - 1] -
-                            edu2sent[parent_span[0] - 1] + 1),
-                        # distance between the current sentence and the most
-                        # remote sentence covered by the parent span,
-                        # in sentences
-                        'parent_sent_dist': (
-                            max([(edu2sent[parent_span[1] - 1] - sent_idx),
-                                 (sent_idx - edu2sent[parent_span[0] - 1])])),
-                        # types of leaky, in the taxonomy of
-                        # (van der Vliet et al. 2011)
-                        'leaky_type': leaky_type,
-                    })
-                else:
-                    row.update({
-                        'parent_span_start': row['edu_start'],
-                        'parent_span_end': row['edu_end'],
-                        # default value for leaky_type, provides a mean for
-                        # easy comparison on complex sentences, between
-                        # non-leaky and the various types of leaky
-                        'leaky_type': 0,
-                    })
-                # end WIP
-            doc_sent_rows.append(row)
-
-        # 3. collect paragraphs
-        doc_para_rows = []
-        doc_paras = doc_ctx.paragraphs
-        doc_text = doc_ctx.text()
-        # doc_paras is None when the original text has no explicit marking
-        # for paragraphs ; this is true for 'fileX' documents in the RST-WSJ
-        # corpus
-        if doc_paras is not None:
-            # EDU to paragraph mapping
-            edu2para = align_edus_with_paragraphs(doc_edus, doc_paras,
-                                                  doc_text, strict=False)
-            edu2para_codom = set([para_idx for para_idx in edu2para
-                                  if para_idx is not None])
-            # index of the first and last EDU of each paragraph
-            para_edu_starts = [(edu2para.index(i) + 1 if i in edu2para_codom
-                                else None)
-                               for i in range(len(doc_paras))]
-            para_edu_ends = [(len(edu2para) - 1 - edu2para[::-1].index(i) + 1
-                              if i in edu2para_codom
-                              else None)
-                             for i in range(len(doc_paras))]
-            # paragraphs that don't have their own RST subtree are "leaky" ;
-            # end of paragraph <-> EDU mapping et al.
-
-            # iterate over paragraphs
-            for para_idx, para in enumerate(doc_paras):
-                # dirty, educe.rst_dt.text.Paragraph should have a span
-                para_span = Span(para.sentences[0].span.char_start,
-                                 para.sentences[-1].span.char_end)
-                # end dirty
-                row = {
-                    # data directly from the paragraph segmenter
-                    'para_id': '{}_para{}'.format(doc_id.doc, para_idx),
-                    'char_start': para_span.char_start,
-                    'char_end': para_span.char_end,
-                }
-                # paragraph <-> EDU mapping dependent data
-                # should probably have its own dataframe etc.
-                if para_idx in edu2para_codom:
-                    row.update({
-                        'edu_start': para_edu_starts[para_idx],
-                        'edu_end': para_edu_ends[para_idx],
-                        # computed column
-                        'edu_len': (para_edu_ends[para_idx] -
-                                    para_edu_starts[para_idx]) + 1,
-                    })
-                    # use paragraph <-> RST tree alignment
-                    if row['edu_len'] > 1:  # complex paragraphs only
-                        row.update({
-                            'leaky': ((para_edu_starts[para_idx],
-                                       para_edu_ends[para_idx])
-                                      not in rst_tree_node_spans),
-                        })
-                    else:
-                        row.update({'leaky': False})
-                    # WIP find for each leaky paragraph the smallest RST
-                    # subtree that covers it
-                    if row['leaky']:
-                        for edu_span in rst_tree_node_spans_by_len:
-                            if ((edu_span[0] <= para_edu_starts[para_idx] and
-                                 para_edu_ends[para_idx] <= edu_span[1])):
-                                parent_span = edu_span
-                                break
-                        else:
-                            raise ValueError(
-                                'No minimal spanning node for {}'.format(row))
-                        # add info to row
-                        row.update({
-                            # parent span, on EDUs
-                            'parent_edu_start': parent_span[0],
-                            'parent_edu_end': parent_span[1]
-                        })
-                        # length of parent span, in paragraphs
-                        if ((edu2para[parent_span[1] - 1] is not None and
-                             edu2para[parent_span[0] - 1] is not None)):
-                            row.update({
-                                'parent_para_len': (
-                                    edu2para[parent_span[1] - 1] -
-                                    edu2para[parent_span[0] - 1] + 1),
-                                # distance between the current paragraph and
-                                # the most remote paragraph covered by the
-                                # parent span, in paragraphs
-                                'parent_para_dist': (
-                                    max([(edu2para[parent_span[1] - 1] -
-                                          para_idx),
-                                         (para_idx -
-                                          edu2para[parent_span[0] - 1])])),
-                            })
-                    else:
-                        row.update({
-                            'parent_edu_start': row['edu_start'],
-                            'parent_edu_end': row['edu_end'],
-                        })
-                    # end WIP
-                doc_para_rows.append(row)
-
-        # NB: these are leaky sentences wrt the original constituency
-        # trees ; leaky sentences wrt the binarized constituency trees
-        # might be different (TODO), similarly for the dependency trees
-        # (TODO too) ;
-        # I should count them, see if the ~5% Joty mentions are on the
-        # original or binarized ctrees, and compare with the number of
-        # leaky for deptrees ; I suspect the latter will be much lower...
-        # HYPOTHESIS: (some or all?) leaky sentences in ctrees correspond
-        # to cases where nodes that are not the head of their sentence
-        # have dependents in other sentences
-        # this would capture the set (or a subset) of edges that fall
-        # outside of the search space for the "iheads" intra/inter
-        # strategy
-
+    new_strad_rels_rows = []  # ibid
+
+    doc_rows = Parallel(n_jobs=n_jobs, verbose=verbose)(
+        delayed(_load_doc_rows_new)(doc_id, doc_files, binarize=binarize,
+                                    verbose=verbose)
+        for doc_id, doc_files in sorted(anno_files.items()))
+    for (doc_span_rows, doc_edu_rows, doc_sent_rows, doc_para_rows,
+         doc_strad_rels_rows) in doc_rows:
         # add doc entries to corpus entries
         para_rows.extend(doc_para_rows)
         sent_rows.extend(doc_sent_rows)
         rel_rows.extend(doc_span_rows)
         edu_rows.extend(doc_edu_rows)
+        new_strad_rels_rows.extend(doc_strad_rels_rows)
+    strad_rels_rows.extend(new_strad_rels_rows)
 
     # turn list into a DataFrame
     node_df = pd.DataFrame(node_rows)
@@ -807,8 +1013,10 @@ def load_corpus_as_dataframe_new(selection='train', binarize=False,
     sent_df = pd.DataFrame(sent_rows)
     para_df = pd.DataFrame(para_rows)
     # add calculated columns here? (leaky and complex sentences)
+    dfs = (node_df, rel_df, edu_df, sent_df, para_df)
+    _cache(cache_dir, cache_name, fingerprint, (dfs, new_strad_rels_rows))
 
-    return node_df, rel_df, edu_df, sent_df, para_df
+    return dfs
 
 
 def gather_leaky_stats():
@@ -11,6 +11,8 @@ TODO
 from collections import defaultdict, namedtuple
 import itertools
 
+import numpy as np
+
 from educe.annotation import Span
 from educe.internalutil import treenode
 from educe.rst_dt.annotation import (NUC_N, NUC_S, NUC_R, Node, RSTTree,
@@ -209,12 +211,15 @@ class InsideOutAttachmentRanker(object):
             # for each RstDepTree, the result will be an array of ranks
             ranks = [0 for hd in dtree.heads]  # initialize result
 
-            unique_heads = set(dtree.heads[1:])  # exclude head of fake root
-            for head in unique_heads:
+            # dependents of each head, in a single pass over the heads
+            # (exclude head of fake root)
+            targets_of = defaultdict(list)
+            for i, hd in enumerate(dtree.heads[1:], start=1):
+                targets_of[hd].append(i)
+
+            for head, targets in targets_of.items():
                 rank_idx = 1  # init rank
 
-                targets = [i for i, hd in enumerate(dtree.heads)
-                           if hd == head]
                 if self.prioritize_same_unit:
                     # gobble everything between the head and the rightmost
                     # "same-unit"
@@ -602,107 +607,198 @@ def deptree_to_simple_rst_tree(dtree, allow_forest=False):
           errors because SimpleRSTTrees are list-like, ie. tree[i]
           returns the i-th child of a tree node...
     """
-    def walk(ancestor, subtree):
-        """
-        The basic descent/ascent driver of our conversion algorithm.
-        Note that we are looking at three layers of the dependency
-        tree at the same time.
+    return _simple_rst_trees(dtree, _tree_ranked_dependents(dtree),
+                             allow_forest=allow_forest)
+
+
+def _tree_ranked_dependents(dtree):
+    """Get the ordered dependents of every EDU of a single dtree.
+
+    This is the per-tree counterpart of `_ranked_dependents`, and it
+    does not go through numpy.
+    """
+    return [dtree.deps(i) for i in range(len(dtree.heads))]
+
+
+def _ranked_dependents(dtrees):
+    """Get the ordered dependents of every EDU of a batch of dtrees.
+
+    The heads and ranks of all dtrees are concatenated into flat
+    arrays, so that the dependents of every EDU in the batch are
+    grouped and ordered by a single sort.
+
+    Parameters
+    ----------
+    dtrees : list of RstDepTree
+        RST dependency trees.
+
+    Returns
+    -------
+    ranked_deps : list of list of list of int
+        For each dtree, the list of dependents of each EDU, ordered
+        as in `RstDepTree.deps` (by rank, then by position).
+    """
+    if not dtrees:
+        return []
+    sizes = np.array([len(dtree.heads) for dtree in dtrees], dtype=np.intp)
+    offsets = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.intp)
+    nb_nodes = int(sizes.sum())
+    # global index of each dependent, ie. all EDUs but the fake roots
+    dep_offsets = np.repeat(offsets, sizes - 1)
+    is_dep = np.ones(nb_nodes, dtype=bool)
+    is_dep[offsets] = False
+    deps = np.arange(nb_nodes)[is_dep]
+    heads = np.concatenate(
+        [np.asarray(dtree.heads[1:], dtype=np.intp) for dtree in dtrees]
+    ) + dep_offsets
+    ranks = np.concatenate([np.asarray(dtree.ranks[1:]) for dtree in dtrees])
+    # group by head, then order by rank and position
+    order = np.lexsort((deps, ranks, heads))
+    bounds = np.concatenate(
+        ([0], np.cumsum(np.bincount(heads, minlength=nb_nodes)))).tolist()
+    # back to local indices
+    local_deps = (deps - dep_offsets)[order].tolist()
+    ranked_deps = []
+    for off, size in zip(offsets.tolist(), sizes.tolist()):
+        ranked_deps.append([local_deps[bounds[i]:bounds[i + 1]]
+                            for i in range(off, off + size)])
+    return ranked_deps
+
+
+def _simple_leaf(dtree, idx):
+    """Create the SimpleRSTTree leaf for an EDU of a dtree"""
+    edu = dtree.edus[idx]
+    return SimpleRSTTree(
+        Node("leaf", (edu.num, edu.num), edu.text_span(), "leaf"),
+        [edu])
+
+
+def _connect_simple(dtree, ancestor, subtree, src):
+    """Connect the SimpleRSTTree of an ancestor with that of a subtree.
+
+    This is the ascent step of the conversion described in
+    `deptree_to_simple_rst_tree`.
+
+    Parameters
+    ----------
+    dtree : RstDepTree
+        RST dependency tree.
+
+    ancestor : SimpleRSTTree
+        SimpleRSTTree of the ancestor (built so far).
 
+    subtree : int
+        Index of the head of the subtree.
+
+    src : SimpleRSTTree
+        Full SimpleRSTTree of the subtree.
+
+    Returns
+    -------
+    res : SimpleRSTTree
+        SimpleRSTTree covering ancestor and subtree.
+    """
+    n_anc = treenode(ancestor)
+    n_src = treenode(src)
+    rel = dtree.labels[subtree]
+    nuc = dtree.nucs[subtree]
+    #
+    if n_anc.span.overlaps(n_src.span):
+        raise RstDtException("Span %s overlaps with %s " %
+                             (n_anc.span, n_src.span))
+    else:
+        # nuc in SimpleRSTTree is the concatenation of the initial
+        # letter of each kid's nuclearity for the relation,
+        # eg. {NS, SN, NN}
+        if n_anc.span <= n_src.span:
+            left, n_left = ancestor, n_anc
+            right, n_right = src, n_src
+            nuc = NUC_N[0] + nuc[0]
+        else:
+            left, n_left = src, n_src
+            right, n_right = ancestor, n_anc
+            nuc = nuc[0] + NUC_N[0]
+    # compute EDU span of the parent node from the kids'
+    l_edu_span = n_left.edu_span
+    r_edu_span = n_right.edu_span
+    edu_span = (min(l_edu_span[0], r_edu_span[0]),
+                max(l_edu_span[1], r_edu_span[1]))
+    txt_span = n_anc.span.merge(n_src.span)
+    res = SimpleRSTTree(
+        Node(nuc, edu_span, txt_span, rel),
+        [left, right])
+    return res
+
+
+def _fold_simple(dtree, ranked_deps, real_root):
+    """Build the SimpleRSTTree under a real root of a dtree.
+
+    This is the descent/ascent driver of the conversion described in
+    `deptree_to_simple_rst_tree`, with an explicit stack so that deep
+    dtrees do not hit the recursion limit. Each frame on the stack
+    looks at three layers of the dependency tree at the same time ::
 
                      r0       r1
             ancestor --> src +--> tgt1
-                             |
-                             |r2
-                             +--> tgt2
                              |
                              ..
-                             |
                              |rN
                              +--> tgtN
 
-        The base case is if src is a leaf node (no children),
-        whereupon we return a tiny tree connecting the two.
+    We fold `src` with each of its targets in turn, then connect
+    the result with its ancestor, which replaces the `src` of the
+    frame below.
 
-        If we do have children, we have to first obtain the
-        full RST tree for src (through the folding process
-        described in the docstring for the main function)
-        before connecting it to its ancestor.
+    Parameters
+    ----------
+    dtree : RstDepTree
+        RST dependency tree.
 
-        Parameters
-        ----------
-        ancestor : SimpleRSTTree
-            SimpleRSTTree of the ancestor
+    ranked_deps : list of list of int
+        Ordered dependents of each EDU of the dtree.
 
-        subtree : int
-            Index of the head of the subtree
+    real_root : int
+        Index of the real root.
 
-        Returns
-        -------
-        res : SimpleRSTTree
-            SimpleRSTTree covering ancestor and subtree.
-        """
-        # create tree leaf for src
-        edu_src = dtree.edus[subtree]
-        src = SimpleRSTTree(
-            Node("leaf", (edu_src.num, edu_src.num), edu_src.text_span(),
-                 "leaf"),
-            [edu_src])
-
-        # descend into each child, but note that we are folding
-        # rather than mapping, ie. we threading along a nested
-        # RST tree as go from sibling to sibling
-        ranked_targets = dtree.deps(subtree)
-        for tgt in ranked_targets:
-            src = walk(src, tgt)
-        if not ancestor:
-            # first call: ancestor is None, subtree is the index of the
-            # (presumably unique) real root
+    Returns
+    -------
+    srtree : SimpleRSTTree
+        SimpleRSTTree for the real root and its descendants.
+    """
+    # frame: [ancestor, subtree, src, remaining targets]
+    stack = [[None, real_root, _simple_leaf(dtree, real_root),
+              iter(ranked_deps[real_root])]]
+    while True:
+        frame = stack[-1]
+        tgt = next(frame[3], None)
+        if tgt is not None:
+            # descend into the next target, with the current state of
+            # src as its ancestor
+            stack.append([frame[2], tgt, _simple_leaf(dtree, tgt),
+                          iter(ranked_deps[tgt])])
+            continue
+        stack.pop()
+        ancestor, subtree, src, _ = frame
+        if ancestor is None:
+            # real root
             return src
+        stack[-1][2] = _connect_simple(dtree, ancestor, subtree, src)
 
-        # connect ancestor with src
-        n_anc = treenode(ancestor)
-        n_src = treenode(src)
-        rel = dtree.labels[subtree]
-        nuc = dtree.nucs[subtree]
-        #
-        if n_anc.span.overlaps(n_src.span):
-            raise RstDtException("Span %s overlaps with %s " %
-                                 (n_anc.span, n_src.span))
-        else:
-            if n_anc.span <= n_src.span:
-                left = ancestor
-                right = src
-                nuc_kids = [NUC_N, nuc]
-            else:
-                left = src
-                right = ancestor
-                nuc_kids = [nuc, NUC_N]
-            # nuc in SimpleRSTTree is the concatenation of the initial
-            # letter of each kid's nuclearity for the relation,
-            # eg. {NS, SN, NN}
-            nuc = ''.join(x[0] for x in nuc_kids)
-        # compute EDU span of the parent node from the kids'
-        l_edu_span = treenode(left).edu_span
-        r_edu_span = treenode(right).edu_span
-        edu_span = (min(l_edu_span[0], r_edu_span[0]),
-                    max(l_edu_span[1], r_edu_span[1]))
-        txt_span = n_anc.span.merge(n_src.span)
-        res = SimpleRSTTree(
-            Node(nuc, edu_span, txt_span, rel),
-            [left, right])
-        return res
-
-    roots = dtree.real_roots_idx()
+
+def _simple_rst_trees(dtree, ranked_deps, allow_forest=False):
+    """Build the SimpleRSTTree (or forest) of a dtree, given the
+    ranked deps of its EDUs.
+
+    See `deptree_to_simple_rst_tree`.
+    """
+    roots = ranked_deps[0]
     if not allow_forest and len(roots) > 1:
         msg = ('Cannot convert RstDepTree to SimpleRSTTree, '
                'multiple roots: {}\t{}'.format(roots, dtree.__dict__))
         raise RstDtException(msg)
 
-    srtrees = []
-    for real_root in roots:
-        srtree = walk(None, real_root)
-        srtrees.append(srtree)
-
+    srtrees = [_fold_simple(dtree, ranked_deps, real_root)
+               for real_root in roots]
     # for the most common case, return the tree
     if not allow_forest:
         return srtrees[0]
@@ -712,6 +808,34 @@ def deptree_to_simple_rst_tree(dtree, allow_forest=False):
     return srtrees
 
 
+def deptrees_to_simple_rst_trees(dtrees, allow_forest=False):
+    """Convert a batch of RstDepTrees to SimpleRSTTrees.
+
+    This gives the same results as calling
+    `deptree_to_simple_rst_tree` on each dtree, but the dependents of
+    all dtrees are ranked in one go on their concatenated heads and
+    ranks.
+
+    Parameters
+    ----------
+    dtrees : list of RstDepTree
+        RST dependency trees, with attachment ranking and nuclearity.
+
+    allow_forest : boolean, defaults to False
+        If True, return a list of SimpleRSTTree for each dtree
+        (one per real root) ; otherwise, raise an RstDtException for
+        dtrees with more than one real root.
+
+    Returns
+    -------
+    srtrees : list of (SimpleRSTTree or list of SimpleRSTTree)
+        Converted tree (or forest if `allow_forest`) for each dtree.
+    """
+    return [_simple_rst_trees(dtree, ranked_deps, allow_forest=allow_forest)
+            for dtree, ranked_deps
+            in zip(dtrees, _ranked_dependents(dtrees))]
+
+
 def deptree_to_rst_tree(dtree):
     """Create an RSTTree from an RstDepTree.
 
@@ -725,32 +849,19 @@ def deptree_to_rst_tree(dtree):
     ctree: RSTTree
         RST constituency tree that corresponds to the dtree.
     """
-    heads = dtree.heads
-    ranks = dtree.ranks
-    origin = dtree.origin
+    return _project_rst_tree(dtree, _tree_ranked_dependents(dtree))
+
+
+def _project_rst_tree(dtree, ranked_deps):
+    """Build the RSTTree of a dtree, given the ranked deps of its EDUs.
 
-    # gov -> (rank -> [deps])
-    ranked_deps = defaultdict(lambda: defaultdict(list))
-    for dep, (gov, rnk) in enumerate(zip(heads[1:], ranks[1:]), start=1):
-        ranked_deps[gov][rnk].append(dep)
+    See `deptree_to_rst_tree`.
+    """
+    origin = dtree.origin
 
     # store pointers to substructures as they are built
     subtrees = [None for x in dtree.edus]
 
-    # compute height of each governor in the dtree
-    heights = [0 for x in dtree.edus]
-    while True:
-        old_heights = tuple(heights)
-        for i, hd in enumerate(dtree.heads[1:], start=1):
-            heights[hd] = max(heights[hd], heights[i] + 1)
-        if tuple(heights) == old_heights:
-            # fixpoint reached
-            break
-    # group nodes by their height in the dtree
-    govs_by_height = defaultdict(list)
-    for i, height in enumerate(heights):
-        govs_by_height[height].append(i)
-
     # bottom-up traversal of the dtree: create sub-ctrees
     # * create leaves of the RST ctree: initialize them with the
     # label and nuclearity from the dtree
@@ -763,62 +874,17 @@ def deptree_to_rst_tree(dtree):
     # * create internal nodes: for each governor, create one projection
     # per rank of dependents ; each time a projection node is created,
     # we use the set of dependencies to overwrite the nuc and label of
-    # its children
-    for height in range(1, max(heights)):  # leave fake root out, see below
-        nodes = govs_by_height[height]
-        for gov in nodes:
-            # max_rnk = max(ranked_deps[gov].keys())
-            for rnk, deps in sorted(ranked_deps[gov].items()):
-                # overwrite the nuc and lbl of the head node, using the
-                # dependencies of this rank
-                dep_nucs = [dtree.nucs[x] for x in deps]
-                dep_lbls = [dtree.labels[x] for x in deps]
-                if all(x == NUC_N for x in dep_nucs):
-                    # all nuclei must have the same label, to denote
-                    # a unique multinuclear relation
-                    assert len(set(dep_lbls)) == 1
-                    gov_lbl = dep_lbls[0]
-                elif all(x == NUC_S for x in dep_nucs):
-                    gov_lbl = 'span'
-                else:
-                    raise ValueError('Deps have different nuclearities')
-                gov_node = subtrees[gov].label()
-                gov_node.nuclearity = NUC_N
-                gov_node.rel = gov_lbl
-                # create one projection node for the head + the dependencies
-                # of this rank
-                proj_lbl = dtree.labels[gov]
-                proj_nuc = dtree.nucs[gov]
-                proj_children = [subtrees[x] for x in sorted([gov] + deps)]
-                proj_edu_span = (proj_children[0].label().edu_span[0],
-                                 proj_children[-1].label().edu_span[1])
-                proj_txt_span = Span(proj_children[0].label().span.char_start,
-                                     proj_children[-1].label().span.char_end)
-                proj_node = Node(proj_nuc, proj_edu_span, proj_txt_span,
-                                 proj_lbl, context=None)  # TODO context?
-                subtrees[gov] = RSTTree(proj_node, proj_children,
-                                        origin=origin)
-    # create top node and whole tree
-    # this is where we handle the fake root
-    gov = 0
-    proj_lbl = '---'  # 2016-12-02: switch from "ROOT" to "---" so that
-    # _pred and _true have the same labels for their root nodes
-    proj_nuc = NUC_R
-    if (ranked_deps[gov].keys() == [1]
-        and len(ranked_deps[gov][1]) == 1):
-        # unique real root => use its projection as the root of the ctree
-        unique_real_root = ranked_deps[gov][1][0]
-        # proj = subtrees[unique_real_root].label()
-        proj_node.nuclearity = proj_nuc
-        proj_node.rel = proj_lbl
-        subtrees[0] = subtrees[unique_real_root]
-    else:
-        # > 1 real root: create projections until we span all
-        # 2016-09-14 disable support for >1 real root
-        raise ValueError("Fragile: RSTTree from dtree with >1 real root")
-        #
-        # max_rnk = max(ranked_deps[gov].keys())
-        for rnk, deps in sorted(ranked_deps[gov].items()):
+    # its children.
+    # Governors are visited in reverse breadth-first order, so that
+    # the subtrees of their dependents are complete when we get to
+    # them.
+    govs = [0]
+    for gov in govs:
+        govs.extend(ranked_deps[gov])
+    for gov in reversed(govs[1:]):  # leave fake root out, see below
+        for rnk, deps in itertools.groupby(ranked_deps[gov],
+                                           key=lambda x: dtree.ranks[x]):
+            deps = list(deps)  # already sorted by position
             # overwrite the nuc and lbl of the head node, using the
             # dependencies of this rank
             dep_nucs = [dtree.nucs[x] for x in deps]
@@ -848,6 +914,39 @@ def deptree_to_rst_tree(dtree):
                              proj_lbl, context=None)  # TODO context?
             subtrees[gov] = RSTTree(proj_node, proj_children,
                                     origin=origin)
-    # final RST ctree
-    rst_tree = subtrees[0]
-    return rst_tree
+    # create top node and whole tree
+    # this is where we handle the fake root
+    real_roots = ranked_deps[0]
+    if len(real_roots) == 1 and dtree.ranks[real_roots[0]] == 1:
+        # unique real root => use its projection as the root of the ctree
+        proj_node = subtrees[real_roots[0]].label()
+        proj_node.nuclearity = NUC_R
+        # 2016-12-02: switch from "ROOT" to "---" so that
+        # _pred and _true have the same labels for their root nodes
+        proj_node.rel = '---'
+        return subtrees[real_roots[0]]
+    # > 1 real root: create projections until we span all
+    # 2016-09-14 disable support for >1 real root
+    raise ValueError("Fragile: RSTTree from dtree with >1 real root")
+
+
+def deptrees_to_rst_trees(dtrees):
+    """Convert a batch of RstDepTrees to RSTTrees.
+
+    This gives the same results as calling `deptree_to_rst_tree` on
+    each dtree, but the dependents of all dtrees are grouped by head
+    and rank in one go on their concatenated heads and ranks.
+
+    Parameters
+    ----------
+    dtrees : list of RstDepTree
+        RST dependency trees, i.e. ordered dtrees.
+
+    Returns
+    -------
+    ctrees : list of RSTTree
+        RST constituency tree for each dtree.
+    """
+    return [_project_rst_tree(dtree, ranked_deps)
+            for dtree, ranked_deps
+            in zip(dtrees, _ranked_dependents(dtrees))]
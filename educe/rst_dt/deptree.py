@@ -118,6 +118,13 @@ class RstDepTree(object):
         self.labels[0] = None
         self.nucs[0] = None
         self.ranks[0] = -1
+        # dependents of each head, and the highest rank among them,
+        # maintained incrementally by `_set_head`
+        self._deps = {-1: set([0])}
+        self._max_ranks = {-1: -1}
+        if nb_edus > 1:
+            self._deps[DEFAULT_HEAD] = set(range(1, nb_edus))
+            self._max_ranks[DEFAULT_HEAD] = DEFAULT_RANK
 
         # set fake root's origin and context to be the same as the first
         # real EDU's
@@ -138,6 +145,42 @@ class RstDepTree(object):
         self.labels.append(DEFAULT_LABEL)
         self.nucs.append(DEFAULT_NUC)
         self.ranks.append(DEFAULT_RANK)
+        self._attach(len(self.edus) - 1)
+
+    def _attach(self, idx):
+        """Register an EDU among the dependents of its head"""
+        head = self.heads[idx]
+        rank = self.ranks[idx]
+        self._deps.setdefault(head, set()).add(idx)
+        if head not in self._max_ranks or self._max_ranks[head] < rank:
+            self._max_ranks[head] = rank
+
+    def _detach(self, idx):
+        """Remove an EDU from the dependents of its head"""
+        head = self.heads[idx]
+        sisters = self._deps[head]
+        sisters.discard(idx)
+        if not sisters:
+            del self._deps[head]
+            del self._max_ranks[head]
+        elif self.ranks[idx] == self._max_ranks[head]:
+            self._max_ranks[head] = max(self.ranks[i] for i in sisters)
+
+    def _set_head(self, idx_dep, idx_gov, rank=None):
+        """Attach an EDU to a head, at a given rank.
+
+        If `rank` is None, use the first rank above those of the
+        dependents of the head, including the EDU itself.
+        """
+        self._detach(idx_dep)
+        if rank is None:
+            rank = self.ranks[idx_dep]
+            if idx_gov in self._max_ranks:
+                rank = max(rank, self._max_ranks[idx_gov])
+            rank += 1
+        self.heads[idx_dep] = idx_gov
+        self.ranks[idx_dep] = rank
+        self._attach(idx_dep)
 
     def add_dependency(self, gov_num, dep_num, label=None, nuc=NUC_S,
                        rank=None):
@@ -161,15 +204,10 @@ class RstDepTree(object):
         """
         _idx_gov = self.idx[gov_num]
         _idx_dep = self.idx[dep_num]
-        self.heads[_idx_dep] = _idx_gov
         self.labels[_idx_dep] = label
         self.nucs[_idx_dep] = nuc
-        if rank is None:  # assign first free rank
-            # was: rank = len(self.deps[_idx_gov])
-            sisters = [i for i, hd in enumerate(self.heads)
-                       if hd == _idx_gov]
-            rank = max(self.ranks[i] for i in sisters) + 1
-        self.ranks[_idx_dep] = rank
+        # if rank is None, assign first free rank
+        self._set_head(_idx_dep, _idx_gov, rank=rank)
 
     def add_dependencies(self, gov_num, dep_nums, labels=None, nucs=None,
                          rank=None):
@@ -198,13 +236,11 @@ class RstDepTree(object):
         # locate common governor, get common rank
         _idx_gov = self.idx[gov_num]
         if rank is None:  # assign first free rank
-            sisters = [i for i, hd in enumerate(self.heads)
-                       if hd == _idx_gov]
-            if not sisters:
+            if _idx_gov not in self._max_ranks:
                 # ranks are 1-based, so first set of dependents has rank 1
                 rank = 1
             else:
-                rank = max(self.ranks[i] for i in sisters) + 1
+                rank = self._max_ranks[_idx_gov] + 1
 
         # default values for labels and nucs, if necessary
         if labels is None:
@@ -215,11 +251,10 @@ class RstDepTree(object):
         # finally, add dependencies
         for dep_num, label, nuc in zip(dep_nums, labels, nucs):
             _idx_dep = self.idx[dep_num]
-            self.heads[_idx_dep] = _idx_gov
             self.labels[_idx_dep] = label
             self.nucs[_idx_dep] = nuc
             # common rank
-            self.ranks[_idx_dep] = rank
+            self._set_head(_idx_dep, _idx_gov, rank=rank)
 
     def get_dependencies(self, lbl_type='rel'):
         """Get the list of dependencies in this dependency tree.
@@ -258,20 +293,15 @@ class RstDepTree(object):
         _idx_fake_root = _ROOT_HEAD
         _idx_root = self.idx[root_num]
         _lbl_root = _ROOT_LABEL
-        self.heads[_idx_root] = _idx_fake_root
         self.labels[_idx_root] = _lbl_root
         self.nucs[_idx_root] = DEFAULT_NUC
         # calculate rank (for a unique root, should always be 0)
-        sisters = [i for i, hd in enumerate(self.heads)
-                   if hd == _idx_fake_root]
-        rank = max(self.ranks[i] for i in sisters) + 1
-        self.ranks[_idx_root] = rank
+        self._set_head(_idx_root, _idx_fake_root)
 
     def deps(self, gov_idx):
         """Get the ordered list of dependents of an EDU"""
-        # TODO a numpy version should be cleaner
-        ranked_deps = sorted((rk, i) for i, rk in enumerate(self.ranks)
-                             if self.heads[i] == gov_idx)
+        ranked_deps = sorted((self.ranks[i], i)
+                             for i in self._deps.get(gov_idx, []))
         sorted_deps = [i for rk, i in ranked_deps]
         return sorted_deps
 
@@ -321,8 +351,24 @@ class RstDepTree(object):
         span_end: array of int
             Index of the rightmost EDU dominated by an EDU.
         """
-        span_beg = np.array([i for i, e in enumerate(self.edus)])
-        span_end = np.array([i for i, e in enumerate(self.edus)])
+        nb_edus = len(self.edus)
+        span_beg = np.arange(nb_edus)
+        span_end = np.arange(nb_edus)
+        # levels of the tree, top-down from the fake root
+        levels = []
+        level = [0]
+        while level:
+            levels.append(level)
+            level = [i for hd in level for i in self._deps.get(hd, [])]
+        if sum(len(x) for x in levels) == nb_edus:
+            # propagate spans bottom-up, one level at a time
+            heads = np.array(self.heads)
+            for level in reversed(levels[1:]):
+                level = np.array(level)
+                np.minimum.at(span_beg, heads[level], span_beg[level])
+                np.maximum.at(span_end, heads[level], span_end[level])
+            return span_beg, span_end
+        # not a tree (eg. a cycle): find the spans by fixpoint
         while True:
             span_new_beg = np.copy(span_beg)
             span_new_end = np.copy(span_end)
@@ -12,7 +12,7 @@ from __future__ import absolute_import, print_function
 from educe.metrics.parseval import (parseval_scores, parseval_report,
                                     parseval_compact_report,
                                     parseval_detailed_report,
-                                    parseval_similarity)
+                                    parseval_similarity, span_tables)
 
 
 # label extraction functions
@@ -30,6 +30,88 @@ LBL_FNS = [
 ]
 
 
+# combined filters for SimpleRST ctrees, see `_span_selection`
+_NOT_LEAF_FILTERS = {}
+
+
+def _not_leaf(tree):
+    """True if a local tree is not a leaf"""
+    return tree.height() > 2  # TODO unit test!
+
+
+def _span_selection(ctree_type, subtree_filter=None):
+    """Select the spans to evaluate for a type of ctree.
+
+    Parameters
+    ----------
+    ctree_type : one of {'RST', 'SimpleRST'}
+        Type of ctrees, see `rst_parseval_report`.
+
+    subtree_filter : function, optional
+        Function to filter all local trees.
+
+    Returns
+    -------
+    exclude_root : boolean
+        Whether the root node is excluded.
+
+    subtree_filter : function or None
+        Function to filter all local trees, including leaves if needed.
+    """
+    if ctree_type not in ['RST', 'SimpleRST']:
+        raise ValueError("ctree_type should be one of {'RST', 'SimpleRST'}")
+    if ctree_type == 'RST':
+        # standard RST ctree: exclude root
+        return True, subtree_filter
+    # SimpleRST variant: keep root, exclude leaves
+    # TODO try exclude_root=True first, should get same as before
+    if subtree_filter is None:
+        return False, _not_leaf
+    # the combined filter is built once per user filter, so that span
+    # tables extracted with it can be reused
+    if subtree_filter not in _NOT_LEAF_FILTERS:
+        user_filter = subtree_filter
+        _NOT_LEAF_FILTERS[subtree_filter] = (
+            lambda t: _not_leaf(t) and user_filter(t))
+    return False, _NOT_LEAF_FILTERS[subtree_filter]
+
+
+def rst_span_tables(ctrees, ctree_type='RST', subtree_filter=None,
+                    span_type='edus'):
+    """Extract the span tables of RST ctrees, for reuse across reports.
+
+    The tables can be passed instead of the ctrees to any of the
+    `rst_parseval_*` functions called with the same `ctree_type` and
+    `span_type` (and without `add_trivial_spans`), so that the spans
+    of each ctree are extracted only once.
+
+    Parameters
+    ----------
+    ctrees : list of RSTTree or SimpleRSTTree
+        RST ctrees, one per document.
+
+    ctree_type : one of {'RST', 'SimpleRST'}, defaults to 'RST'
+        Type of ctrees considered in the evaluation procedure, see
+        `rst_parseval_report`.
+
+    subtree_filter : function, optional
+        Function to filter all local trees ; if given, the very same
+        function must be passed to the scoring functions.
+
+    span_type : one of {'edus', 'chars'}
+        Whether each span is expressed on EDU or character indices.
+
+    Returns
+    -------
+    tables : list of SpanTable
+        Span table of each ctree.
+    """
+    exclude_root, subtree_filter = _span_selection(ctree_type,
+                                                   subtree_filter)
+    return span_tables(ctrees, subtree_filter=subtree_filter,
+                       exclude_root=exclude_root, span_type=span_type)
+
+
 def rst_parseval_scores(ctree_true, ctree_pred, lbl_fn, subtree_filter=None,
                         labels=None, average=None):
     """Compute RST PARSEVAL scores for ctree_pred wrt ctree_true.
@@ -145,20 +227,8 @@ def rst_parseval_compact_report(parser_true, parser_preds,
         TODO
     """
     # filter root or leaves, depending on the type of ctree
-    if ctree_type not in ['RST', 'SimpleRST']:
-        raise ValueError("ctree_type should be one of {'RST', 'SimpleRST'}")
-    if ctree_type == 'RST':
-        # standard RST ctree: exclude root
-        exclude_root = True
-        subtree_filter = subtree_filter
-    elif ctree_type == 'SimpleRST':
-        # SimpleRST variant: keep root, exclude leaves
-        exclude_root = False  # TODO try True first, should get same as before
-        not_leaf = lambda t: t.height() > 2  # TODO unit test!
-        if subtree_filter is None:
-            subtree_filter = not_leaf
-        else:
-            subtree_filter = lambda t: not_leaf(t) and subtree_filter(t)
+    exclude_root, subtree_filter = _span_selection(ctree_type,
+                                                   subtree_filter)
 
     # select metrics and the corresponding functions
     if metric_types is None:
@@ -248,20 +318,8 @@ def rst_parseval_similarity(parser_preds,
         Output format.
     """
     # filter root or leaves, depending on the type of ctree
-    if ctree_type not in ['RST', 'SimpleRST']:
-        raise ValueError("ctree_type should be one of {'RST', 'SimpleRST'}")
-    if ctree_type == 'RST':
-        # standard RST ctree: exclude root
-        exclude_root = True
-        subtree_filter = subtree_filter
-    elif ctree_type == 'SimpleRST':
-        # SimpleRST variant: keep root, exclude leaves
-        exclude_root = False  # TODO try True first, should get same as before
-        not_leaf = lambda t: t.height() > 2  # TODO unit test!
-        if subtree_filter is None:
-            subtree_filter = not_leaf
-        else:
-            subtree_filter = lambda t: not_leaf(t) and subtree_filter(t)
+    exclude_root, subtree_filter = _span_selection(ctree_type,
+                                                   subtree_filter)
 
     # select metrics and the corresponding functions
     metric_types = ['S', 'N', 'R', 'F']
@@ -345,20 +403,8 @@ def rst_parseval_report(ctree_true, ctree_pred, ctree_type='RST',
         TODO
     """
     # filter root or leaves, depending on the type of ctree
-    if ctree_type not in ['RST', 'SimpleRST']:
-        raise ValueError("ctree_type should be one of {'RST', 'SimpleRST'}")
-    if ctree_type == 'RST':
-        # standard RST ctree: exclude root
-        exclude_root = True
-        subtree_filter = subtree_filter
-    elif ctree_type == 'SimpleRST':
-        # SimpleRST variant: keep root, exclude leaves
-        exclude_root = False  # TODO try True first, should get same as before
-        not_leaf = lambda t: t.height() > 2  # TODO unit test!
-        if subtree_filter is None:
-            subtree_filter = not_leaf
-        else:
-            subtree_filter = lambda t: not_leaf(t) and subtree_filter(t)
+    exclude_root, subtree_filter = _span_selection(ctree_type,
+                                                   subtree_filter)
 
     # select metrics and the corresponding functions
     if metric_types is None:
@@ -425,20 +471,8 @@ def rst_parseval_detailed_report(ctree_true, ctree_pred, ctree_type='RST',
 
     """
     # filter root or leaves, depending on the type of ctree
-    if ctree_type not in ['RST', 'SimpleRST']:
-        raise ValueError("ctree_type should be one of {'RST', 'SimpleRST'}")
-    if ctree_type == 'RST':
-        # standard RST ctree: exclude root
-        exclude_root = True
-        subtree_filter = subtree_filter
-    elif ctree_type == 'SimpleRST':
-        # SimpleRST variant: keep root, exclude leaves
-        exclude_root = False  # TODO try True first, should get same as before
-        not_leaf = lambda t: t.height() > 2  # TODO unit test!
-        if subtree_filter is None:
-            subtree_filter = not_leaf
-        else:
-            subtree_filter = lambda t: not_leaf(t) and subtree_filter(t)
+    exclude_root, subtree_filter = _span_selection(ctree_type,
+                                                   subtree_filter)
 
     # select metrics and the corresponding functions
     if metric_type not in set(x[0] for x in LBL_FNS):
@@ -26,54 +26,35 @@ from ..external.postag import generic_token_spans
 from ..internalutil import treenode
 
 
-# pre-processing leaves
-_TEXT_RE = re.compile(r"\(text (?P<text>.+(</EDU>|</s>|_!))\)")
-
-# pre-processing heads
-_TYPE_RE = r"\((?P<type>(Nucleus|Satellite))"
-_ROOT_TYPE_RE = r"\((?P<type>(Root))"
-_SPAN_RE = r"\((?P<span>(leaf [0-9]+|span [0-9]+ [0-9]+))\)"
-_REL_RE = r"\((?P<rel>rel2par [\-A-Za-z0-9:]+)\)"
+# tokens of the .dis format, each one preceded by optional whitespace:
+# closing bracket, EDU text, or head of a subtree (type, span, relation)
+_TOKEN_RE = re.compile(
+    r"\s*(?:(?P<close>\))"
+    r"|\(text (?P<text>.+(?:</EDU>|</s>|_!))\)"
+    r"|\(\s*(?P<type>Root|Nucleus|Satellite)\s+"
+    r"\(\s*(?:leaf\s+(?P<leaf>[0-9]+)|"
+    r"span\s+(?P<start>[0-9]+)\s+(?P<end>[0-9]+))\s*\)"
+    r"(?:\s*\(\s*rel2par\s+(?P<rel>[\-A-Za-z0-9:]+)\s*\))?)")
 _PARA_PATTERN = re.compile(r"<P>")
-_HEAD_PATTERN = re.compile("%s %s %s" % (_TYPE_RE, _SPAN_RE, _REL_RE))
-_ROOT_PATTERN = re.compile("%s %s" % (_ROOT_TYPE_RE, _SPAN_RE))
 
-# parsing
-_LEAF_PATTERN = r"\[[^\]]+\]"  # non-']' chars in square brackets
+# whitespace normalization in EDU text
+_SPACES_RE = re.compile(r"\(\s|\s\)|\s\s")
+_OPEN_SPACES_RE = re.compile(r"\(\s+")
+_SPACES_CLOSE_RE = re.compile(r"\s+\)")
+_MULTI_SPACES_RE = re.compile(r"\s\s+")
 
 
-def _process_text(matchobj):
+def _normalize_spaces(text):
     """
-    Helper function, ignore
+    Squeeze whitespace in the text of an EDU: runs of whitespace become
+    a single space, and whitespace after an opening or before a
+    closing bracket is dropped
     """
-    text = matchobj.group("text")
-    return "[%s]" % text
-    # .replace(" ","¤")
-
-
-def _process_head(matchobj):
-    """
-    Helper function, ignore
-    """
-    ntype = matchobj.group("type")
-    span = matchobj.group("span").replace(" ", "-")
-    rel = "---" if ntype == "Root" else matchobj.group("rel").split()[1]
-    return "(%s|%s|%s" % (ntype, span, rel)
-
-
-def _mark_leaves(tstr):
-    """
-    Helper function, ignore
-    """
-    return _TEXT_RE.sub(_process_text, tstr)
-
-
-def _mark_heads(tstr):
-    """
-    Helper function, ignore
-    """
-    hstr = _ROOT_PATTERN.sub(_process_head, tstr)
-    return _HEAD_PATTERN.sub(_process_head, hstr)
+    if _SPACES_RE.search(text) is None:
+        return text
+    text = _OPEN_SPACES_RE.sub("(", text)
+    text = _SPACES_CLOSE_RE.sub(")", text)
+    return _MULTI_SPACES_RE.sub(" ", text)
 
 
 def _parse_edu(descr, edu_start, start=0):
@@ -98,101 +79,113 @@ def _parse_edu(descr, edu_start, start=0):
     return EDU(edu_start, span, text)
 
 
-def _parse_node(descr, span):
-    """
-    Build a node from a piece of an RST DT tree
-    """
-    nuclearity, edu_span, rel = descr.split("|")
-    _edu_span = edu_span.split("-")[1:]
-    if len(_edu_span) == 1:
-        _edu_span.append(_edu_span[0])
-    edu_span = (int(_edu_span[0]),
-                int(_edu_span[1]))
-    return Node(nuclearity, edu_span, span, rel)
-
-
-def _preprocess(tstr):
+def _parse_node(ntype, leaf, start, end, rel):
     """
-    Helper function: Given a raw RST treebank string, return a massaged
-    representation for easier parsing, along with its first/last EDU number.
+    Build a node from the head of an RST DT subtree (its span is
+    filled in later, see `_set_spans`)
     """
-    res = tstr.strip()
-    res = _mark_leaves(res)
-    res = re.sub(r"\(\s+", "(", res)  # .replace("\n",""))
-    res = re.sub(r"\s+\)", ")", res)
-    res = re.sub(r"\s\s+", " ", res)
-    res = _mark_heads(res)
-    return res
-
-
-def _tree_span(tree):
-    """
-    Span for the current node or leaf in the tree
-    """
-    return (treenode(tree).span if isinstance(tree, Tree)
-            else tree.span)
+    if leaf is not None:
+        edu_span = (int(leaf), int(leaf))
+    else:
+        edu_span = (int(start), int(end))
+    if ntype == "Root":
+        rel = "---"
+    elif rel is None:
+        raise RSTTreeException("ERROR in rst tree format: "
+                               "no relation for %s %s" % (ntype, edu_span))
+    return Node(ntype, edu_span, None, rel)
 
 
-def _postprocess(tree, start=0, edu_start=1):
+def _read_dis(tstr):
     """
-    Helper function: Convert the NLTK-parsed representation of an RST tree
-    to one using educe-style Standoff objects
+    Build an RST tree from its RST DT string representation, in a
+    single pass over the string.
+
+    Returns
+    -------
+    tree : RSTTree
+        The tree, where the spans of nodes are not set yet
+    edus : list of EDU
+        Its leaves, from left to right
+    nodes : list of (Node, int, int)
+        Each node along with the index of its first and last EDU
+        in `edus`
     """
-    if isinstance(tree, Tree):
-        children = []
-        position = start - 1  # compensate for virtual whitespace added below
-        node = _parse_node(treenode(tree), Span(-1, -1))
-        edu_start2 = node.edu_span[0]
-
-        for child_ in tree:
+    edus = []
+    nodes = []
+    # open subtrees: node, children, index of first EDU
+    stack = []
+    tree = None
+    pos = 0
+    while tree is None:
+        match = _TOKEN_RE.match(tstr, pos)
+        if match is None:
+            if tstr[pos:].isspace() or pos == len(tstr):
+                raise RSTTreeException("ERROR in rst tree format: "
+                                       "incomplete tree")
+            raise RSTTreeException("ERROR in rst tree format at char "
+                                   "%d: %s" % (pos, tstr[pos:pos + 40]))
+        close, text, ntype, leaf, start, end, rel = match.groups()
+        if close is not None:
+            if not stack:
+                raise RSTTreeException("ERROR in rst tree format: "
+                                       "unbalanced bracket at char %d" % pos)
+            node, children, first = stack.pop()
+            if not children:
+                raise RSTTreeException("ERROR in rst tree format: "
+                                       "empty node %r" % node)
+            nodes.append((node, first, len(edus) - 1))
+            subtree = RSTTree(node, children)
+            if stack:
+                stack[-1][1].append(subtree)
+            else:
+                tree = subtree
+        elif text is not None:
+            if not stack:
+                raise RSTTreeException("ERROR in rst tree format for leaf "
+                                       "at char %d" % pos)
+            node, children, _ = stack[-1]
             # (NB: +1 to add virtual whitespace between EDUs)
-            child = _postprocess(child_, position + 1, edu_start2)
-            children.append(child)
-            # pylint: disable=E1101
-            child_sp = _tree_span(child)
-            # pylint: enable=E1101
-            position = child_sp.char_end
-
-        node.span = Span(start, position)
-        return RSTTree(node, children)
-    else:
-        if tree.startswith("["):
-            return _parse_edu(tree[1:-1], edu_start, start)
+            char_start = edus[-1].span.char_end + 1 if edus else 0
+            edu = _parse_edu(_normalize_spaces(text), node.edu_span[0],
+                             char_start)
+            edus.append(edu)
+            children.append(edu)
         else:
-            raise RSTTreeException("ERROR in rst tree format for leaf : ",
-                                   child)
+            node = _parse_node(ntype, leaf, start, end, rel)
+            stack.append((node, [], len(edus)))
+        pos = match.end()
+    if tstr[pos:].strip():
+        raise RSTTreeException("ERROR in rst tree format: trailing "
+                               "material after the root at char %d: %s"
+                               % (pos, tstr[pos:pos + 40].strip()))
+    return tree, edus, nodes
 
 
-def _recompute_spans(tree, context):
+def _set_spans(edus, nodes, context=None):
     """
-    Recalculate tree node spans from the bottom up
-    (helper for _align_with_context)
+    Set the span of each node to cover its EDUs, and point
+    everything to the context if there is one
     """
-    if isinstance(tree, Tree):
-        spans = []
-        for child in tree:
-            _recompute_spans(child, context)
-            spans.append(_tree_span(child))
-        treenode(tree).span = Span.merge_all(spans)
-        treenode(tree).context = context
+    for node, first, last in nodes:
+        node.span = Span(edus[first].span.char_start,
+                         edus[last].span.char_end)
+        if context is not None:
+            node.context = context
 
 
-def _align_with_context(tree, context):
+def _align_with_context(edus, context):
     """
-    Update a freshly parsed RST DT tree with proper standoff
-    annotations pointing to its base text
+    Update the EDUs of a freshly parsed RST DT tree with proper
+    standoff annotations pointing to its base text
     """
-    leaves = tree.leaves()
-
     leaf_tokens = [_PARA_PATTERN.sub("\n\n", l.raw_text.strip())
-                   for l in leaves]
+                   for l in edus]
     spans = generic_token_spans(context.text(),
                                 leaf_tokens)
-    for edu, span in zip(leaves, spans):
+    for edu, span in zip(edus, spans):
         edu.span = span
         edu.set_context(context)
-    _recompute_spans(tree, context)
-    return tree
 
 
 def parse_rst_dt_tree(tstr, context=None):
@@ -203,12 +196,13 @@ def parse_rst_dt_tree(tstr, context=None):
     None case is really intended for testing, or in cases where
     you don't have an original text)
     """
-    pstr = _preprocess(tstr)
-    tree_ = Tree.fromstring(pstr, leaf_pattern=_LEAF_PATTERN)
-    tree_ = _postprocess(tree_)
+    tree, edus, nodes = _read_dis(tstr)
     if context:
-        tree_ = _align_with_context(tree_, context)
-    return tree_
+        _align_with_context(edus, context)
+        _set_spans(edus, nodes, context)
+    else:
+        _set_spans(edus, nodes)
+    return tree
 
 
 def read_annotation_file(anno_filename, text_filename):
@@ -23,15 +23,12 @@ import os
 import sys
 
 import numpy as np
-from joblib import Parallel, delayed
 
 from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.metrics import euclidean_distances
 from sklearn.preprocessing import normalize
 
-from pyemd import emd
-
-from educe.metrics.wmd import load_embedding
+from educe.metrics.wmd import load_embedding, pairwise_wmd
 from educe.rst_dt.annotation import SimpleRSTTree
 from educe.rst_dt.corpus import Reader
 from educe.rst_dt.deptree import RstDepTree
@@ -52,45 +49,6 @@ RST_CORPUS = {
 }
 
 
-def wmd(i, j):
-    """Compute the Word Mover's Distance between two EDUs.
-
-    This presupposes the existence of two global variables:
-    * `edu_vecs` is a sparse 2-dimensional ndarray where each row
-    corresponds to the vector representation of an EDU,
-    * `D_common` is a dense 2-dimensional ndarray that contains
-    the euclidean distance between each pair of word embeddings.
-
-    Parameters
-    ----------
-    i : int
-        Index of the first EDU.
-    j : int
-        Index of the second EDU.
-
-    Returns
-    -------
-    s : np.double
-        Word Mover's Distance between EDUs i and j.
-    """
-    # EMD is extremely sensitive on the number of dimensions it has to
-    # work with ; keep only the dimensions where at least one of the
-    # two vectors is != 0
-    union_idx = np.union1d(edu_vecs[i].indices, edu_vecs[j].indices)
-    # EMD segfaults on incorrect parameters:
-    # * if both vectors (and thus the distance matrix) are all zeros,
-    # return 0.0 (consider they are the same)
-    if not np.any(union_idx):
-        return 0.0
-    D_minimal = D_common[np.ix_(union_idx, union_idx)]
-    bow_i = edu_vecs[i, union_idx].A.ravel()
-    bow_j = edu_vecs[j, union_idx].A.ravel()
-    # NB: emd() has an additional named parameter: extra_mass_penalty
-    # pyemd by default sets it to -1, i.e. the max value in the distance
-    # matrix
-    return emd(bow_i, bow_j, D_minimal)
-
-
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Study the RST corpus')
     parser.add_argument('outfile', nargs='?', type=argparse.FileType('wb'),
@@ -144,17 +102,15 @@ if __name__ == '__main__':
     rst_corpus = rst_reader.slurp(verbose=True)
     corpus_texts = [v.text() for k, v in sorted(rst_corpus.items())]
 
-    # MOVE ~ WMD.__init__()
-    # load word embeddings
-    vocab_dict, W = load_embedding("embed")
-    # end MOVE
-
     # MOVE ~ WMD.fit(corpus_texts?)
     # fit CountVectorizer to the vocabulary of the corpus
     vect = CountVectorizer(
         strip_accents=strip_accents, lowercase=lowercase,
         stop_words=stop_words
     ).fit(corpus_texts)
+    # load word embeddings, restricted to the vocabulary of the corpus
+    vocab_dict, W = load_embedding("embed",
+                                   vocab=vect.get_feature_names())
     # compute the vocabulary common to the embeddings and corpus, restrict
     # the word embeddings matrix and replace the vectorizer
     common = [word for word in vect.get_feature_names()
@@ -255,11 +211,12 @@ if __name__ == '__main__':
     edu_pairs = list(itertools.chain.from_iterable(edu_pairs))
     # WIP
     # compute the WMD between the pairs of EDUs
-    edu_pairs_wmd = Parallel(n_jobs=n_jobs, verbose=verbose)(
-        delayed(wmd)(gov_idx_abs, dep_idx_abs)
-        for doc_key, gov_idx, dep_idx, lbl, gov_idx_abs, dep_idx_abs
-        in edu_pairs
-    )
+    edu_pairs_wmd = pairwise_wmd(
+        edu_vecs,
+        [(gov_idx_abs, dep_idx_abs)
+         for doc_key, gov_idx, dep_idx, lbl, gov_idx_abs, dep_idx_abs
+         in edu_pairs],
+        D_common, n_jobs=n_jobs, verbose=verbose)
 
     wmd_strs = [
         ("%s::%s::%.5f::(%s)--(%s)" %
@@ -6,7 +6,8 @@ import unittest
 import copy
 
 from educe.rst_dt import annotation, parse, SimpleRSTTree
-from educe.rst_dt.dep2con import deptree_to_simple_rst_tree
+from educe.rst_dt.dep2con import (deptree_to_simple_rst_tree,
+                                  deptrees_to_simple_rst_trees)
 from educe.rst_dt.deptree import RstDepTree
 from educe.rst_dt.parse import (parse_lightweight_tree,
                                 parse_rst_dt_tree,
@@ -95,6 +96,15 @@ class RSTTest(unittest.TestCase):
         self.assertEqual(TEXT1, t_text)
         self.assertEqual(len(t_text), sp.char_end)
 
+    def test_malformed(self):
+        for tstr in [TSTR0.replace('(rel2par act:goal) ', '', 1),
+                     TSTR0.rstrip()[:-1],
+                     '',
+                     TSTR0 + TSTR0,
+                     TSTR0 + " junk (foo)"]:
+            self.assertRaises(annotation.RSTTreeException,
+                              parse_rst_dt_tree, tstr)
+
     def test_from_files(self):
         for i in glob.glob('tests/*.dis'):
             t = read_annotation_file(i, os.path.splitext(i)[0])
@@ -194,6 +204,32 @@ class RSTTest(unittest.TestCase):
             rst2c = deptree_to_simple_rst_tree(dep_c)
             # TODO assertion on rst2c?
 
+    def test_dt_to_rst_batched(self):
+        trees = self._test_trees()
+        names = sorted(trees)
+        deps = [RstDepTree.from_simple_rst_tree(
+            SimpleRSTTree.from_rst_tree(trees[name])) for name in names]
+        batched = deptrees_to_simple_rst_trees(deps)
+
+        def _nodes(tree):
+            "Span, nuclearity and relation of every node, by position"
+            return [(pos, tree[pos].label().span,
+                     tree[pos].label().nuclearity, tree[pos].label().rel)
+                    for pos in tree.treepositions()
+                    if hasattr(tree[pos], 'label')]
+
+        # the round-trip is not exact on edu spans of non-binary trees,
+        # so we compare the rest of each node, as in test_rst_to_dt
+        for name, rst2 in zip(names, batched):
+            rst1 = SimpleRSTTree.from_rst_tree(trees[name])
+            self.assertEqual(_nodes(rst1), _nodes(rst2),
+                             "batched conversion of " + name)
+            self.assertEqual(rst1.leaves(), rst2.leaves(),
+                             "batched leaves of " + name)
+            self.assertEqual(treenode(rst1).edu_span,
+                             treenode(rst2).edu_span,
+                             "batched edu span equality on " + name)
+
     def test_rst_to_dt_nuclearity_loss(self):
         """
         Test that we still get sane tree structure with
@@ -2,9 +2,11 @@
 Subcommands for the rst_dt utility
 """
 
-from . import deptree, draw, reltypes, text, tmp
+from . import bench_align, bench_dep2con, deptree, draw, reltypes, text, tmp
 
-SUBCOMMANDS = [deptree,
+SUBCOMMANDS = [bench_align,
+               bench_dep2con,
+               deptree,
                draw,
                reltypes,
                text,
@@ -0,0 +1,91 @@
+"""
+Benchmark the alignment of tokens (EDUs or words) with the text of
+the documents, on long documents made by concatenating the corpus
+"""
+
+from __future__ import print_function
+from itertools import islice
+import timeit
+
+from educe.annotation import Span
+from educe.external.postag import generic_token_spans
+from educe.internalutil import ifilterfalse
+
+from ..args import add_usual_input_args, read_corpus
+
+NAME = 'bench-align'
+
+
+def config_argparser(parser):
+    """
+    Subcommand flags.
+
+    You should create and pass in the subparser to which the flags
+    are to be added.
+    """
+    add_usual_input_args(parser)
+    parser.add_argument('--scale', type=int, default=1,
+                        help='number of copies of the corpus in the '
+                        'long document')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timed runs (best is kept)')
+    parser.set_defaults(func=main)
+
+
+def _charwise_token_spans(text, tokens):
+    """
+    Baseline: character by character alignment, as was done by
+    `generic_token_spans` before it looked tokens up in bulk
+    (without the details of errors)
+    """
+    txt_iter = ifilterfalse(lambda x: x[1].isspace(), enumerate(text))
+    last = 0
+    for token in tokens:
+        tok_chars = list(ifilterfalse(lambda x: x.isspace(), token))
+        if not tok_chars:
+            yield Span(last, last)
+            continue
+        prefix = list(islice(txt_iter, len(tok_chars)))
+        for (_, txt_char), tok_char in zip(prefix, tok_chars):
+            if txt_char != tok_char:
+                raise ValueError('token mismatch')
+        last = prefix[-1][0] + 1
+        yield Span(prefix[0][0], last)
+
+
+def _best_time(func, repeat):
+    "Best wall clock time over several runs of a function"
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main(args):
+    """
+    Subcommand main.
+
+    You shouldn't need to call this yourself if you're using
+    `config_argparser`
+    """
+    corpus = read_corpus(args, verbose=False)
+    texts = []
+    edus = []
+    for k in sorted(corpus):
+        tree = corpus[k]
+        texts.append(tree.label().context.text())
+        # paragraph markers are whitespace for the alignment
+        edus.extend(x.raw_text.replace('<P>', ' ') for x in tree.leaves())
+    text = '\n\n'.join(texts * args.scale)
+    edus = edus * args.scale
+    words = [w for x in edus for w in x.split()]
+    print('long document: {} chars, {} EDUs, {} words'.format(
+        len(text), len(edus), len(words)))
+
+    for name, tokens in [('EDUs', edus), ('words', words)]:
+        if (list(_charwise_token_spans(text, tokens)) !=
+                list(generic_token_spans(text, tokens))):
+            raise AssertionError('Alignments of {} differ'.format(name))
+        t_char = _best_time(
+            lambda: list(_charwise_token_spans(text, tokens)), args.repeat)
+        t_bulk = _best_time(
+            lambda: list(generic_token_spans(text, tokens)), args.repeat)
+        print('{:6} charwise: {:.4f}s\tbulk: {:.4f}s\t({:.2f}x)'.format(
+            name, t_char, t_bulk, t_char / t_bulk))
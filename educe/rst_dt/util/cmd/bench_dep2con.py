@@ -0,0 +1,131 @@
+"""
+Benchmark the conversion of dependency trees back to constituency
+trees: the recursive conversion used before batching, one document at
+a time and in a single batch
+"""
+
+from __future__ import print_function
+import timeit
+
+from educe.internalutil import treenode
+from educe.rst_dt.annotation import NUC_N, Node, SimpleRSTTree
+from educe.rst_dt.dep2con import (deptree_to_rst_tree,
+                                  deptree_to_simple_rst_tree,
+                                  deptrees_to_rst_trees,
+                                  deptrees_to_simple_rst_trees)
+from educe.rst_dt.deptree import RstDepTree, RstDtException
+
+from ..args import add_usual_input_args, read_corpus
+
+NAME = 'bench-dep2con'
+
+
+def config_argparser(parser):
+    """
+    Subcommand flags.
+
+    You should create and pass in the subparser to which the flags
+    are to be added.
+    """
+    add_usual_input_args(parser)
+    parser.add_argument('--scale', type=int, default=1,
+                        help='number of copies of the corpus in the '
+                        'batch')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of timed runs (best is kept)')
+    parser.set_defaults(func=main)
+
+
+def _recursive_simple_rst_tree(dtree):
+    """
+    Baseline: recursive descent/ascent conversion of a single-rooted
+    dtree, as was done by `deptree_to_simple_rst_tree` before batching
+    """
+    def walk(ancestor, subtree):
+        "Fold the dependents of subtree, then connect it to ancestor"
+        edu_src = dtree.edus[subtree]
+        src = SimpleRSTTree(
+            Node("leaf", (edu_src.num, edu_src.num), edu_src.text_span(),
+                 "leaf"),
+            [edu_src])
+        for tgt in dtree.deps(subtree):
+            src = walk(src, tgt)
+        if not ancestor:
+            return src
+
+        n_anc = treenode(ancestor)
+        n_src = treenode(src)
+        rel = dtree.labels[subtree]
+        nuc = dtree.nucs[subtree]
+        if n_anc.span.overlaps(n_src.span):
+            raise RstDtException("Span %s overlaps with %s " %
+                                 (n_anc.span, n_src.span))
+        if n_anc.span <= n_src.span:
+            left, right = ancestor, src
+            nuc_kids = [NUC_N, nuc]
+        else:
+            left, right = src, ancestor
+            nuc_kids = [nuc, NUC_N]
+        nuc = ''.join(x[0] for x in nuc_kids)
+        l_edu_span = treenode(left).edu_span
+        r_edu_span = treenode(right).edu_span
+        edu_span = (min(l_edu_span[0], r_edu_span[0]),
+                    max(l_edu_span[1], r_edu_span[1]))
+        txt_span = n_anc.span.merge(n_src.span)
+        return SimpleRSTTree(Node(nuc, edu_span, txt_span, rel),
+                             [left, right])
+
+    roots = dtree.real_roots_idx()
+    if len(roots) > 1:
+        raise RstDtException('multiple roots: {}'.format(roots))
+    return walk(None, roots[0])
+
+
+def _best_time(func, repeat):
+    "Best wall clock time over several runs of a function"
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main(args):
+    """
+    Subcommand main.
+
+    You shouldn't need to call this yourself if you're using
+    `config_argparser`
+    """
+    corpus = read_corpus(args, verbose=False)
+    dtrees = [RstDepTree.from_simple_rst_tree(
+        SimpleRSTTree.from_rst_tree(corpus[k])) for k in sorted(corpus)]
+    dtrees = dtrees * args.scale
+    nb_edus = sum(len(dtree.edus) - 1 for dtree in dtrees)
+    print('{} documents, {} EDUs'.format(len(dtrees), nb_edus))
+
+    # all paths must give the same trees as the recursive baseline
+    reference = [_recursive_simple_rst_tree(x) for x in dtrees]
+    if [deptree_to_simple_rst_tree(x) for x in dtrees] != reference:
+        raise AssertionError('Per doc SimpleRSTTrees differ')
+    if deptrees_to_simple_rst_trees(dtrees) != reference:
+        raise AssertionError('Batched SimpleRSTTrees differ')
+    if ([str(deptree_to_rst_tree(x)) for x in dtrees] !=
+            [str(x) for x in deptrees_to_rst_trees(dtrees)]):
+        raise AssertionError('Batched RSTTrees differ')
+
+    t_ref = _best_time(
+        lambda: [_recursive_simple_rst_tree(x) for x in dtrees],
+        args.repeat)
+    t_doc = _best_time(
+        lambda: [deptree_to_simple_rst_tree(x) for x in dtrees],
+        args.repeat)
+    t_batch = _best_time(
+        lambda: deptrees_to_simple_rst_trees(dtrees), args.repeat)
+    print('{:15} recursive: {:.4f}s\tper doc: {:.4f}s ({:.2f}x)'
+          '\tbatched: {:.4f}s ({:.2f}x)'.format(
+              'SimpleRSTTree', t_ref, t_doc, t_ref / t_doc,
+              t_batch, t_ref / t_batch))
+
+    t_doc = _best_time(
+        lambda: [deptree_to_rst_tree(x) for x in dtrees], args.repeat)
+    t_batch = _best_time(
+        lambda: deptrees_to_rst_trees(dtrees), args.repeat)
+    print('{:15} per doc: {:.4f}s\tbatched: {:.4f}s\t({:.2f}x)'.format(
+        'RSTTree', t_doc, t_batch, t_doc / t_batch))
@@ -29,6 +29,7 @@ extraction.
 # pylint: disable=too-few-public-methods
 
 from __future__ import print_function
+from collections import namedtuple
 import copy
 import itertools
 
@@ -55,8 +56,9 @@ class Dialogue(object):
             identifier is stored, currently.
         edus : list of educe.stac.annotation.Unit
             List of EDU annotations, sorted by their span.
-        relations : list of educe.stac.annotation.Relation
-            List of relations between EDUs from the dialogue.
+        relations : dict((EDU, EDU), string)
+            Relations between EDUs from the dialogue, as a mapping
+            from pairs of EDUs (source, target) to relation labels.
         """
         self.grouping = anno.identifier()
         self.edus = [FakeRootEDU] + edus
@@ -64,18 +66,60 @@ class Dialogue(object):
         # we start from 1 because 0 is for the fake root
         self.edu2sent = {i: e.subgrouping()
                          for i, e in enumerate(edus, start=1)}
+        # position of each EDU and of its turn in the dialogue ;
+        # EDUs are sorted by span, so turn ranks are increasing
+        self._edu2pos = {}
+        self._edu2turn = {}
+        turn_rank = 0
+        last_turn = None
+        for i, edu in enumerate(self.edus):
+            self._edu2pos[edu] = i
+            if i > 0 and edu.turn is not last_turn:
+                turn_rank += 1
+                last_turn = edu.turn
+            self._edu2turn[edu] = turn_rank
+
+    def edu_distance(self, edu1, edu2):
+        """Distance between two EDUs, in number of EDUs.
+
+        Adjacent EDUs are at distance 1. The fake root sits right before
+        the first EDU of the dialogue.
+        """
+        return abs(self._edu2pos[edu2] - self._edu2pos[edu1])
+
+    def turn_distance(self, edu1, edu2):
+        """Distance between the turns of two EDUs, in number of turns.
+
+        EDUs from the same turn are at distance 0. The fake root sits
+        in its own turn, right before the first turn of the dialogue.
+        """
+        return abs(self._edu2turn[edu2] - self._edu2turn[edu1])
 
-    def edu_pairs(self):
+    def edu_pairs(self, candidates=None):
         """Generate all EDU pairs within this dialogue.
 
         This includes pairs whose source is the left padding (fake root)
         EDU.
 
+        Parameters
+        ----------
+        candidates : function(Dialogue, EDU, EDU) -> boolean, optional
+            Candidate filter ; if given, only the pairs (source, target)
+            for which `candidates(self, source, target)` is True are
+            generated. See eg. `max_edu_distance`,
+            `max_turn_distance` and `same_speaker_or_adjacent_turn`.
+
         Yields
         ------
         (source, target) : tuple of educe.stac.annotation.Unit
             Next candidate edge, as a pair of EDUs (source, target).
         """
+        if candidates is not None:
+            for edu1, edu2 in self.edu_pairs():
+                if candidates(self, edu1, edu2):
+                    yield (edu1, edu2)
+            return
+
         i_edus = list(enumerate(self.edus))
         _, fakeroot = i_edus[0]
         i_edus = i_edus[1:]  # drop left padding EDU
@@ -94,6 +138,125 @@ class Dialogue(object):
                 yield (edu2, edu1)
 
 
+# ---------------------------------------------------------------------
+# candidate pairs
+# ---------------------------------------------------------------------
+
+# Candidate filters are functions (dialogue, source, target) -> boolean
+# that can be passed to `Dialogue.edu_pairs`. The ones defined here
+# always keep the pairs whose source is the fake root, as attachments
+# to the root are not bound by any notion of distance.
+
+def max_edu_distance(max_dist):
+    """Candidate filter: EDUs at most `max_dist` EDUs apart.
+
+    Parameters
+    ----------
+    max_dist : int
+        Maximal distance between the two EDUs, in number of EDUs
+        (adjacent EDUs are at distance 1).
+
+    Returns
+    -------
+    candidates : function(Dialogue, EDU, EDU) -> boolean
+        Candidate filter for `Dialogue.edu_pairs`.
+    """
+    def candidates(dia, edu1, edu2):
+        "True if the pair is within the window"
+        return (edu1.is_left_padding() or
+                dia.edu_distance(edu1, edu2) <= max_dist)
+    return candidates
+
+
+def max_turn_distance(max_dist):
+    """Candidate filter: EDUs from turns at most `max_dist` turns apart.
+
+    Parameters
+    ----------
+    max_dist : int
+        Maximal distance between the turns of the two EDUs (EDUs from
+        the same turn are at distance 0).
+
+    Returns
+    -------
+    candidates : function(Dialogue, EDU, EDU) -> boolean
+        Candidate filter for `Dialogue.edu_pairs`.
+    """
+    def candidates(dia, edu1, edu2):
+        "True if the pair is within the window"
+        return (edu1.is_left_padding() or
+                dia.turn_distance(edu1, edu2) <= max_dist)
+    return candidates
+
+
+def same_speaker_or_adjacent_turn(dia, edu1, edu2):
+    """Candidate filter: EDUs from the same speaker, or from the same
+    or adjacent turns.
+    """
+    return (edu1.is_left_padding() or
+            dia.turn_distance(edu1, edu2) <= 1 or
+            edu1.speaker() == edu2.speaker())
+
+
+def all_candidates(*filters):
+    """Conjunction of candidate filters.
+
+    Returns
+    -------
+    candidates : function(Dialogue, EDU, EDU) -> boolean
+        Candidate filter that keeps a pair iff all `filters` keep it.
+    """
+    def candidates(dia, edu1, edu2):
+        "True if all filters keep the pair"
+        return all(f(dia, edu1, edu2) for f in filters)
+    return candidates
+
+
+PruningStats = namedtuple('PruningStats',
+                          ['pairs', 'kept_pairs',
+                           'gold', 'dropped_gold'])
+"""Effect of a candidate filter on a set of dialogues.
+
+`pairs` and `kept_pairs` are the number of EDU pairs before and
+after filtering ; `gold` is the number of gold relations and
+`dropped_gold` the number of those whose pair is filtered out.
+"""
+
+
+def pruning_stats(dialogues, candidates):
+    """Measure what a candidate filter would drop on some dialogues.
+
+    Parameters
+    ----------
+    dialogues : iterable of Dialogue
+        Dialogues, with their gold relations.
+    candidates : function(Dialogue, EDU, EDU) -> boolean
+        Candidate filter, as for `Dialogue.edu_pairs`.
+
+    Returns
+    -------
+    stats : PruningStats
+        Number of pairs and gold relations, before and after
+        filtering.
+    """
+    pairs = 0
+    kept_pairs = 0
+    gold = 0
+    dropped_gold = 0
+    for dia in dialogues:
+        for edu1, edu2 in dia.edu_pairs():
+            pairs += 1
+            keep = candidates(dia, edu1, edu2)
+            if keep:
+                kept_pairs += 1
+            if (edu1, edu2) in dia.relations:
+                gold += 1
+                if not keep:
+                    dropped_gold += 1
+    return PruningStats(pairs=pairs, kept_pairs=kept_pairs,
+                        gold=gold, dropped_gold=dropped_gold)
+
+
 # pylint: disable=too-many-instance-attributes
 # we're trying to cover a lot of ground here
 class EDU(Unit):
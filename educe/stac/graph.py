@@ -39,9 +39,12 @@ class Graph(educe.graph.Graph):
 
     @classmethod
     def from_doc(cls, corpus, doc_key, pred=lambda x: True):
-        return super(Graph, cls).from_doc(corpus, doc_key,
+        grph = super(Graph, cls).from_doc(corpus, doc_key,
                                           could_include=stac.is_edu,
                                           pred=pred)
+        # most uses of a STAC graph walk the CDU hierarchy
+        grph._cdu_hierarchy()
+        return grph
 
     def is_cdu(self, x):
         return super(Graph, self).is_cdu(x) and\
@@ -96,20 +99,22 @@ class Graph(educe.graph.Graph):
             The head DU of this CDU ; it is None if no member of the CDU
             qualifies as a head (loop?).
         """
+        heads = self._index().heads
+        if (cdu, sloppy) not in heads:
+            heads[cdu, sloppy] = self._cdu_head(cdu, sloppy)
+        return heads[cdu, sloppy]
+
+    def _cdu_head(self, cdu, sloppy):
+        """Compute the head DU of a CDU, see `cdu_head`"""
         hyperedge = self.edgeform(cdu)
         members = self.cdu_members(cdu)
         candidates = []
         # pylint seems confused by our use of inheritence
         for mem in members:
-            def points_to_me(lnk):
-                """some other member of this CDU points to me
-                via this link"""
-                return (lnk != hyperedge and
-                        self.is_relation(lnk) and
-                        self.links(lnk)[1] == mem and
-                        self.links(lnk)[0] in members)
-
-            pointed_to = any(points_to_me(l) for l in self.links(mem))
+            # some other member of this CDU points to me
+            pointed_to = any(lnk != hyperedge and
+                             self.links(lnk)[0] in members
+                             for lnk in self.incoming_relations(mem))
             if not (self.is_relation(mem) or pointed_to):
                 candidates.append(mem)
 
@@ -135,6 +140,9 @@ class Graph(educe.graph.Graph):
         A dictionary mapping each CDU to its recursive CDU
         head (see `cdu_head`)
         """
+        memo = self._index().heads
+        if ('recursive_cdu_heads', sloppy) in memo:
+            return dict(memo['recursive_cdu_heads', sloppy])
         heads = {}
 
         def get_head(x_cdu):
@@ -149,19 +157,54 @@ class Graph(educe.graph.Graph):
 
         for x_cdu in self.cdus():
             get_head(x_cdu)
-        return heads
+        memo['recursive_cdu_heads', sloppy] = heads
+        return dict(heads)
 
     def without_cdus(self, sloppy=False, mode='head'):
         """
-        Return a deep copy of this graph with all CDUs removed.
+        Return a copy of this graph with all CDUs removed.
         Links involving these CDUs will point instead from/to
-        their deep heads
-
-        We'll probably deprecate this function, since you could
-        just as easily call deepcopy yourself
+        their deep heads (see `strip_cdus` for the other modes).
+
+        Neither this graph nor its document are modified.
+        The copy shares the annotations of this graph ; its document
+        is a shallow copy of ours, with its own lists of relations
+        (where relations involving CDUs are replaced with the new
+        relations) and schemas (without the CDUs).
+        Note that the copy still refers to our corpus.
         """
-        res = copy.deepcopy(self)
-        res.strip_cdus(sloppy=sloppy, mode=mode)
+        cdu_nodes = frozenset(self.mirror(x) for x in self.cdus())
+        replaced, added = self._stripped_relations(sloppy=sloppy, mode=mode)
+
+        res = self.__class__()
+        res.corpus = self.corpus
+        res.doc_key = self.doc_key
+        res.doc = copy.copy(self.doc)
+        old_annos = [self.annotation(x) for x in replaced]
+        res.doc.relations = [r for r in self.doc.relations
+                             if r not in old_annos]
+        res.doc.relations.extend(x[1]['annotation'] for x in added)
+        res.doc.schemas = [s for s in self.doc.schemas
+                           if not stac.is_cdu(s)]
+
+        for node in self.nodes():
+            if node not in cdu_nodes:
+                res.add_node(node)
+                for attr in self.node_attributes(node):
+                    res.add_node_attribute(node, attr)
+        dropped = frozenset(replaced) | self.cdus()
+        for edge in self.hyperedges():
+            if edge in dropped:
+                continue
+            res.add_edge(edge)
+            res.add_edge_attributes(edge, self.edge_attributes(edge))
+            for lnk in self.links(edge):
+                res.link(lnk, edge)
+        for new_edge, new_attrs, links in added:
+            res.add_edge(new_edge)
+            res.add_edge_attributes(new_edge, new_attrs.items())
+            for lnk in links:
+                res.link(lnk, new_edge)
         return res
 
     def strip_cdus(self, sloppy=False, mode='head'):
@@ -171,6 +214,9 @@ class Graph(educe.graph.Graph):
         CDU.
         Non-head modes may add new edges to the graph.
 
+        This modifies the graph and its document (relations and
+        schemas), see `without_cdus` for a non-destructive version.
+
         Parameters
         ----------
         sloppy : boolean, default=False
@@ -187,7 +233,44 @@ class Graph(educe.graph.Graph):
             `custom` (or any other string) will distribute or relocate on
             the head depending on the relation label.
         """
+        replaced, added = self._stripped_relations(sloppy=sloppy, mode=mode)
+        # Remove the old edges
+        old_annos = set()
+        for old_edge in replaced:
+            old_annos.add(id(self.annotation(old_edge)))
+            self.del_edge(old_edge)
+        self.doc.relations[:] = [x for x in self.doc.relations
+                                 if id(x) not in old_annos]
+        # Add the new ones
+        for new_edge, new_attrs, links in added:
+            self.doc.relations.append(new_attrs['annotation'])
+            self.add_edge(new_edge)
+            self.add_edge_attributes(new_edge, new_attrs.items())
+            for lnk in links:
+                self.link(lnk, new_edge)
+
+        # Now all the CDUs are edge-orphaned, remove them from the graph
+        for e_cdu in self.cdus():
+            self.del_node(self.mirror(e_cdu))
+            self.del_edge(e_cdu)
+        # Same for annotation-level CDUs
+        self.doc.schemas = [s for s in self.doc.schemas if not stac.is_cdu(s)]
+
+    def _stripped_relations(self, sloppy=False, mode='head'):
+        """Relation edges to replace when stripping CDUs off this graph.
 
+        See `strip_cdus` for the parameters.
+
+        Returns
+        -------
+        replaced : list of string
+            Relation edges that involve a CDU.
+
+        added : list of (string, dict, (string, string))
+            New relation edges, with their attributes (including a
+            new `Relation` annotation) and their source and target
+            nodes.
+        """
         # Set of labels for which the source node should be distributed
         LEFT_DIST = frozenset((
             'Acknowledgement',
@@ -247,6 +330,8 @@ class Graph(educe.graph.Graph):
             return [snode for snode in self.cdu_members(node, deep=True)
                     if self.is_edu(snode)]
 
+        replaced = []
+        added = []
         # Convert all edges in order
         for old_edge in self.relations():
             links = self.links(old_edge)
@@ -259,9 +344,7 @@ class Graph(educe.graph.Graph):
             old_attrs = self.edge_attributes(old_edge)
             old_anno = self.annotation(old_edge)
             src_nodes, tgt_nodes = distrib_candidates(links, old_anno.type)
-            # Remove the old edge
-            self.del_edge(old_edge)
-            self.doc.relations.remove(old_anno)
+            replaced.append(old_edge)
             # Build a new edge for all new combinations
             for i, (n_src, n_tgt) in enumerate(
                     itertools.product(src_nodes, tgt_nodes)):
@@ -283,22 +366,12 @@ class Graph(educe.graph.Graph):
                     dict())
                 new_anno.source = n_src_anno
                 new_anno.target = n_tgt_anno
-                self.doc.relations.append(new_anno)
                 # Second, build a new graph edge
                 new_edge = '{0}_{1}'.format(old_edge, i)
                 new_attrs = dict(old_attrs)
                 new_attrs['annotation'] = new_anno
-                self.add_edge(new_edge)
-                self.add_edge_attributes(new_edge, new_attrs.items())
-                self.link(n_src, new_edge)
-                self.link(n_tgt, new_edge)
-
-        # Now all the CDUs are edge-orphaned, remove them from the graph
-        for e_cdu in self.cdus():
-            self.del_node(self.mirror(e_cdu))
-            self.del_edge(e_cdu)
-        # Same for annotation-level CDUs
-        self.doc.schemas = [s for s in self.doc.schemas if not stac.is_cdu(s)]
+                added.append((new_edge, new_attrs, (n_src, n_tgt)))
+        return replaced, added
 
     # --------------------------------------------------
     # right frontier constraint
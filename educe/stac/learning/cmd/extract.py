@@ -26,6 +26,11 @@ import educe.stac
 from educe.stac.annotation import (DIALOGUE_ACTS,
                                    SUBORDINATING_RELATIONS,
                                    COORDINATING_RELATIONS)
+from educe.stac.fusion import (all_candidates,
+                               max_edu_distance,
+                               max_turn_distance,
+                               pruning_stats,
+                               same_speaker_or_adjacent_turn)
 from educe.stac.learning.doc_vectorizer import (
     DialogueActVectorizer, LabelVectorizer)
 from educe.stac.learning.features import (
@@ -67,14 +72,63 @@ def config_argparser(parser):
     parser.add_argument('--vocabulary',
                         metavar='FILE',
                         help='Vocabulary file (for --parsing mode)')
+    parser.add_argument('--hash-features', type=int, metavar='N',
+                        help=('Hash features into N columns instead of '
+                              'building a vocabulary'))
+    parser.add_argument('--hash-sample', type=int, metavar='N',
+                        default=0,
+                        help=('With --hash-features, dump the columns of '
+                              '(up to) N features as vocabulary, for '
+                              'debugging'))
     parser.add_argument('--ignore-cdus', action='store_true',
                         help='Avoid going into CDUs')
     parser.add_argument('--strip-mode',
                         choices=['head', 'broadcast', 'custom'],
                         default='head',
                         help='CDUs stripping method (if going into CDUs)')
+    parser.add_argument('--max-edu-dist', type=int, metavar='N',
+                        help='Only pair EDUs at most N EDUs apart')
+    parser.add_argument('--max-turn-dist', type=int, metavar='N',
+                        help='Only pair EDUs at most N turns apart')
+    parser.add_argument('--same-speaker-or-adjacent', action='store_true',
+                        help=('Only pair EDUs from the same speaker or '
+                              'from adjacent turns'))
     parser.set_defaults(func=main)
 
+
+def _candidates(args):
+    """Candidate filter for EDU pairs, from the command line flags.
+
+    Returns None if all pairs should be kept.
+    """
+    filters = []
+    if args.max_edu_dist is not None:
+        filters.append(max_edu_distance(args.max_edu_dist))
+    if args.max_turn_dist is not None:
+        filters.append(max_turn_distance(args.max_turn_dist))
+    if args.same_speaker_or_adjacent:
+        filters.append(same_speaker_or_adjacent_turn)
+    if not filters:
+        return None
+    return all_candidates(*filters)
+
+
+def _vectorizer(args):
+    """Feature vectorizer, from the command line flags."""
+    return KeyGroupVectorizer(n_features=args.hash_features,
+                              hash_sample_size=args.hash_sample)
+
+
+def _vocabulary(vzer):
+    """Vocabulary to dump for a fitted vectorizer.
+
+    In hashing mode, this is the (possibly empty) sample of hashed
+    features.
+    """
+    if vzer.n_features is not None:
+        return vzer.hash_sample_
+    return vzer.vocabulary_
+
 # ---------------------------------------------------------------------
 # main
 # ---------------------------------------------------------------------
@@ -90,7 +144,7 @@ def main_single(args):
     # pylint: disable=invalid-name
     # scikit-convention
     feats = extract_single_features(inputs, stage)
-    vzer = KeyGroupVectorizer()
+    vzer = _vectorizer(args)
     # TODO? just transform() if args.parsing or args.vocabulary?
     X_gen = vzer.fit_transform(feats)
     # pylint: enable=invalid-name
@@ -122,7 +176,7 @@ def main_single(args):
     vocab_file = fp.join(outdir,
                          '{corpus_name}.dialogue-acts.sparse.vocab'.format(
                              corpus_name=corpus_name))
-    dump_vocabulary(vzer.vocabulary_, vocab_file)
+    dump_vocabulary(_vocabulary(vzer), vocab_file)
 
 
 def main_pairs(args):
@@ -130,16 +184,23 @@ def main_pairs(args):
     inputs = read_corpus_inputs(args)
     stage = 'units' if args.parsing else 'discourse'
     dialogues = list(mk_high_level_dialogues(inputs, stage))
-    instance_generator = lambda x: x.edu_pairs()
+    candidates = _candidates(args)
+    instance_generator = lambda x: x.edu_pairs(candidates=candidates)
+    if candidates is not None and args.verbose and not args.parsing:
+        stats = pruning_stats(dialogues, candidates)
+        print('Kept {} of {} EDU pairs, dropping {} of {} gold relations'
+              ''.format(stats.kept_pairs, stats.pairs,
+                        stats.dropped_gold, stats.gold),
+              file=sys.stderr)
 
     labels = frozenset(SUBORDINATING_RELATIONS +
                        COORDINATING_RELATIONS)
 
     # pylint: disable=invalid-name
     # X, y follow the naming convention in sklearn
-    feats = extract_pair_features(inputs, stage)
-    vzer = KeyGroupVectorizer()
-    if args.parsing or args.vocabulary:
+    feats = extract_pair_features(inputs, stage, candidates=candidates)
+    vzer = _vectorizer(args)
+    if args.hash_features is None and (args.parsing or args.vocabulary):
         vzer.vocabulary_ = load_vocabulary(args.vocabulary)
         X_gen = vzer.transform(feats)
     else:
@@ -167,14 +228,15 @@ def main_pairs(args):
     vocab_file = fp.join(outdir,
                          '{corpus_name}.relations.sparse.vocab'.format(
                              corpus_name=corpus_name))
-    dump_vocabulary(vzer.vocabulary_, vocab_file)
+    dump_vocabulary(_vocabulary(vzer), vocab_file)
 
 
 def main(args):
     "main for feature extraction mode"
 
-    if args.parsing and not args.vocabulary:
-        sys.exit("Need --vocabulary if --parsing is enabled")
+    if args.parsing and not (args.vocabulary or args.hash_features):
+        sys.exit("Need --vocabulary or --hash-features if --parsing is "
+                 "enabled")
     if args.parsing and args.single:
         sys.exit("Can't mixing --parsing and --single")
     elif args.single:
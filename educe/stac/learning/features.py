@@ -7,6 +7,7 @@ to this library
 """
 
 from __future__ import absolute_import, print_function
+from bisect import bisect_left, bisect_right
 from collections import defaultdict, namedtuple, Sequence
 from functools import wraps
 import copy
@@ -23,7 +24,7 @@ from educe.external.parser import SearchableTree, ConstituencyTree
 from educe.learning.keys import MagicKey, Key, KeyGroup, MergedKeyGroup
 from educe.stac import postag, corenlp
 from educe.stac.annotation import speaker, addressees, is_relation_instance
-from educe.stac.context import enclosed, edus_in_span, turns_in_span
+from educe.stac.context import enclosed
 from educe.stac.corpus import twin_key
 from educe.stac.lexicon.inquirer import read_inquirer_lexicon
 from educe.learning.educe_csv_format import tune_for_csv
@@ -321,7 +322,7 @@ def enclosed_trees(span, trees):
 # or we can wrap the class, but eh...
 
 # feature extraction environment
-DocEnv = namedtuple("DocEnv", "inputs current sf_cache")
+DocEnv = namedtuple("DocEnv", "inputs current sf_cache pair_keys")
 
 # Global resources and settings used to extract feature vectors
 FeatureInput = namedtuple('FeatureInput',
@@ -608,9 +609,9 @@ def is_question_pairs(_, cache, edu):
 
 
 @tuple_feature(underscore)
-def dialogue_act_pairs(current, _, edu):
+def dialogue_act_pairs(current, cache, edu):
     "tuple of dialogue acts for both EDUs"
-    return clean_dialogue_act(real_dialogue_act(edu))
+    return cache.table.dialogue_act(edu)
 
 
 EduGap = namedtuple("EduGap", "sf_cache inner_edus turns_between")
@@ -1044,15 +1045,15 @@ class PairSubgroup_Gap(PairSubgroup):
 
     def fill(self, current, edu1, edu2, target=None):
         vec = self if target is None else target
-        doc = current.doc
+        table = self.sf_cache.table
         big_span = edu1.text_span().merge(edu2.text_span())
 
         # spans for the turns that come between the two edus
         turns_between_span = Span(edu1.turn.text_span().char_end,
                                   edu2.turn.text_span().char_start)
-        turns_between = turns_in_span(doc, turns_between_span)
+        turns_between = table.turns_in_span(turns_between_span)
 
-        inner_edus = edus_in_span(doc, big_span)
+        inner_edus = table.edus_in_span(big_span)
         if edu1.identifier() != ROOT:  # not present anyway
             inner_edus.remove(edu1)
         if edu2.identifier() != ROOT:
@@ -1070,6 +1071,8 @@ class PairKeys(MergedKeyGroup):
     """
     Features for pairs of EDUs
     """
+    SUBVECTORS = (('edu1', '_DU1'), ('edu2', '_DU2'))
+
     def __init__(self, inputs, sf_cache=None):
         self.sf_cache = sf_cache
         groups = [PairSubgroup_Gap(sf_cache),
@@ -1083,14 +1086,6 @@ class PairKeys(MergedKeyGroup):
 
         super(PairKeys, self).__init__("pair features", groups)
 
-    def one_hot_values_gen(self, suffix=''):
-        for pair in super(PairKeys, self).one_hot_values_gen():
-            yield pair
-        for pair in self.edu1.one_hot_values_gen(suffix='_DU1'):
-            yield pair
-        for pair in self.edu2.one_hot_values_gen(suffix='_DU2'):
-            yield pair
-
     def fill(self, current, edu1, edu2, target=None):
         "See `PairSubgroup`"
         vec = self if target is None else target
@@ -1103,25 +1098,106 @@ class PairKeys(MergedKeyGroup):
 # ---------------------------------------------------------------------
 # (single) feature cache
 # ---------------------------------------------------------------------
+class _SpanIndex(object):
+    """
+    Annotations sorted by span start, to find those enclosed in a
+    span by bisection rather than by scanning the whole document
+    """
+    def __init__(self, annos):
+        """
+        Parameters
+        ----------
+        annos : list of Annotation
+            Annotations, in document order ; results are returned
+            in this order
+        """
+        rows = sorted(((anno.text_span().char_start, i,
+                        anno.text_span().char_end, anno)
+                       for i, anno in enumerate(annos)),
+                      key=lambda x: x[:2])
+        self._starts = [x[0] for x in rows]
+        self._rows = [x[1:] for x in rows]
+
+    def enclosed(self, span):
+        """
+        Same as `educe.stac.context.enclosed(span, annos)`
+        """
+        lo = bisect_left(self._starts, span.char_start)
+        hi = bisect_right(self._starts, span.char_end)
+        return [anno for _, end, anno
+                in sorted(self._rows[lo:hi], key=lambda x: x[0])
+                if end <= span.char_end]
+
+
+class EduTable(object):
+    """
+    Per-EDU (and per-turn) values of a document that pair features
+    need, computed once and looked up for every pair.
+    """
+    def __init__(self, doc):
+        self._edus = _SpanIndex([x for x in doc.units
+                                 if educe.stac.is_edu(x)])
+        self._turns = _SpanIndex([x for x in doc.units
+                                  if educe.stac.is_turn(x)])
+        self._dialogue_acts = {}
+
+    def edus_in_span(self, span):
+        """
+        Same as `educe.stac.context.edus_in_span(doc, span)`
+        """
+        return self._edus.enclosed(span)
+
+    def turns_in_span(self, span):
+        """
+        Same as `educe.stac.context.turns_in_span(doc, span)`
+        """
+        return self._turns.enclosed(span)
+
+    def dialogue_act(self, edu):
+        """
+        Cleaned up dialogue act for an EDU, see `real_dialogue_act`
+        """
+        if edu not in self._dialogue_acts:
+            self._dialogue_acts[edu] =\
+                clean_dialogue_act(real_dialogue_act(edu))
+        return self._dialogue_acts[edu]
+
+
 class FeatureCache(dict):
     """
     Cache for single edu features.
     Retrieving an item from the cache lazily computes/memoises
     the single EDU features for it.
+
+    The features are stored as `KeyVector`s, filled out by a single
+    `SingleEduKeys` template.
     """
     def __init__(self, inputs, current):
         self.inputs = inputs
         self.current = current
+        self._keys = None
+        self._table = None
         super(FeatureCache, self).__init__()
 
+    @property
+    def table(self):
+        """
+        `EduTable` for the current document
+        """
+        if self._table is None:
+            self._table = EduTable(self.current.doc)
+        return self._table
+
     def __getitem__(self, edu):
         if edu.identifier() == ROOT:
             return KeyGroup('fake root group', [])
         elif edu in self:
             return super(FeatureCache, self).__getitem__(edu)
         else:
-            vec = SingleEduKeys(self.inputs)
-            vec.fill(self.current, edu)
+            if self._keys is None:
+                self._keys = SingleEduKeys(self.inputs)
+            vec = self._keys.compile().vector()
+            self._keys.fill(self.current, edu, vec)
             self[edu] = vec
             return vec
 
@@ -1167,9 +1243,11 @@ def mk_env(inputs, people, key):
                      players=people[key.doc],
                      parses=inputs.parses[key] if inputs.parses else None)
 
+    sf_cache = FeatureCache(inputs, current)
     return DocEnv(inputs=inputs,
                   current=current,
-                  sf_cache=FeatureCache(inputs, current))
+                  sf_cache=sf_cache,
+                  pair_keys=PairKeys(inputs, sf_cache=sf_cache))
 
 
 def get_players(inputs):
@@ -1227,8 +1305,8 @@ def _extract_pair(env, edu1, edu2):
     Extraction for a given pair of EDUs
     (directional, so would have to be called twice)
     """
-    vec = PairKeys(env.inputs, sf_cache=env.sf_cache)
-    vec.fill(env.current, edu1, edu2)
+    vec = env.pair_keys.compile().vector()
+    env.pair_keys.fill(env.current, edu1, edu2, vec)
     return vec
 
 
@@ -1290,14 +1368,17 @@ def mk_high_level_dialogues(inputs, stage):
             yield dia
 
 
-def extract_pair_features(inputs, stage):
+def extract_pair_features(inputs, stage, candidates=None):
     """
     Extraction for all relevant pairs in a document
     (generator)
+
+    If `candidates` is given, only the pairs it keeps are extracted
+    (see `educe.stac.fusion.Dialogue.edu_pairs`).
     """
     for env in mk_envs(inputs, stage):
         for dia in _mk_high_level_dialogues(env.current):
-            for edu1, edu2 in dia.edu_pairs():
+            for edu1, edu2 in dia.edu_pairs(candidates=candidates):
                 yield _extract_pair(env, edu1, edu2)
 
 
@@ -1314,9 +1395,10 @@ def extract_single_features(inputs, stage):
         if env.current.unitdoc is None:
             continue
         edus = [unit for unit in doc.units if educe.stac.is_edu(unit)]
+        keys = SingleEduKeys(env.inputs)
         for edu in edus:
-            vec = SingleEduKeys(env.inputs)
-            vec.fill(env.current, edu)
+            vec = keys.compile().vector()
+            keys.fill(env.current, edu, vec)
             yield vec
 
 
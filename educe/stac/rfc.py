@@ -91,10 +91,7 @@ class BasicRfc(object):
 
     def _is_incoming_to(self, node, lnk):
         'true if a given link has the given node as target'
-        graph = self._graph
-        nodes = graph.links(lnk)
-        return (graph.is_relation(lnk) and
-                len(nodes) == 2 and nodes[1] == node)
+        return lnk in self._graph.incoming_relations(node)
 
     def _frontier_points(self, nodes):
         """
@@ -150,9 +147,7 @@ class BasicRfc(object):
         violations = list()
         for i, new_node in enumerate(nodes):
             last_node = nodes[i-1] if i > 0 else None
-            for lnk in graph.links(new_node):
-                if not self._is_incoming_to(new_node, lnk):
-                    continue
+            for lnk in graph.incoming_relations(new_node):
                 src_node, _ = graph.rel_links(lnk)
                 if (last_node is None
                     or not self._is_on_frontier(last_node, src_node)):
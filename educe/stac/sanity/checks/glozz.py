@@ -4,7 +4,7 @@ Sanity checker: low-level Glozz errors
 
 from __future__ import print_function
 from collections import defaultdict
-import copy
+import heapq
 import sys
 
 from educe import stac
@@ -233,17 +233,25 @@ def overlapping(inputs, k, is_overlap):
     doc = inputs.corpus[k]
     contexts = inputs.contexts[k]
     annos = [x for x in doc.units if is_overlap(x)]
-    annos2 = copy.copy(annos)
-    all_overlaps = {}
-    for anno in sorted(annos, key=lambda x: x.text_span()):
-        overlaps = [anno2 for anno2 in annos2
-                    if anno2 is not anno
-                    and anno2.span.overlaps(anno.span)]
-        if overlaps:
-            annos2.remove(anno)
-            all_overlaps[anno] = overlaps
-    return [OverlapItem(doc, contexts, anno, olaps)
-            for anno, olaps in all_overlaps.items()]
+    # each annotation is reported with the annotations that overlap
+    # with it and come after it in span order
+    order = sorted(range(len(annos)), key=lambda i: annos[i].text_span())
+    all_overlaps = defaultdict(list)
+    # sweep line: an annotation can only overlap with the annotations
+    # before it that do not end before it starts (kept in a heap of
+    # their ends)
+    active = []
+    for pos, i in enumerate(order):
+        span = annos[i].span
+        while active and active[0][0] < span.char_start:
+            heapq.heappop(active)
+        for _, pos2 in active:
+            if annos[order[pos2]].span.overlaps(span):
+                all_overlaps[pos2].append(i)
+        heapq.heappush(active, (span.char_end, pos))
+    return [OverlapItem(doc, contexts, annos[order[pos]],
+                        [annos[i] for i in sorted(all_overlaps[pos])])
+            for pos in sorted(all_overlaps)]
 
 
 def overlapping_structs(inputs, k):
@@ -335,6 +343,18 @@ class IdMismatch(ContextItem):
         return parent
 
 
+def _units_by_span(units):
+    """
+    Dictionary from spans to the units with that span (in their
+    original order), so that we only pass units with the right span
+    to `filter_matches`
+    """
+    res = defaultdict(list)
+    for unit in units:
+        res[unit.span].append(unit)
+    return res
+
+
 def filter_matches(unit, other_units):
     """
     Return any unit-level annotations in `other_units` that look like
@@ -364,10 +384,11 @@ def check_unit_ids(inputs, key1, key2):
     doc1 = corpus[key1]
     doc2 = corpus[key2]
     contexts1 = inputs.contexts[key1]
+    units2 = _units_by_span(doc2.units)
     mismatches = []
     for unit1 in doc1.units:
         id1 = unit1.local_id()
-        matches = filter_matches(unit1, doc2.units)
+        matches = filter_matches(unit1, units2.get(unit1.span, []))
         if len(matches) > 1:
             print("WARNING: More than one match in check_unit_ids",
                   key1, key2, unit1.local_id(), file=sys.stderr)
@@ -390,12 +411,13 @@ def cross_check_units(inputs, key1, key2, status):
     doc2 = corpus[key2]
     contexts1 = inputs.contexts[key1]
     contexts2 = inputs.contexts[key2]
+    units2 = _units_by_span(doc2.units)
     missing = defaultdict(list)
     for unit in doc1.units:
         if stac.is_structure(unit) or stac.is_edu(unit):
-            if not filter_matches(unit, doc2.units):
+            approx = units2.get(unit.span, [])
+            if not filter_matches(unit, approx):
                 rtype = rough_type(unit)
-                approx = [x for x in doc2.units if x.span == unit.span]
                 missing[rtype].append(MissingItem(status, doc1, contexts1,
                                                   unit,
                                                   doc2, contexts2, approx))
@@ -4,7 +4,6 @@ Sanity checker: fancy graph-based errors
 
 from __future__ import print_function
 from collections import defaultdict
-import copy
 import itertools
 
 from educe import stac
@@ -552,42 +551,23 @@ def are_single_headed_cdus(inputs, k, gra):
     doc = inputs.corpus[k]
     contexts = inputs.contexts[k]
 
-    # compute the transitive closure of DUs embedded under each CDU
-    # * map each CDU to its member EDUs and CDUs, as two lists
+    # transitive closure of DUs embedded under each CDU: its member
+    # EDUs and CDUs, and recursively those of its nested CDUs ;
+    # deep membership is memoized by the graph, so that each nested
+    # CDU is only expanded once for the whole document
     # keys are edge ids eg. 'e_pilot01_07_jhunter_1487683021582',
     # values are node ids eg. 'n_pilot01_07_stac_1464335440'
-    cdu2mems = defaultdict(lambda: ([], []))
-    for cdu_id in gra.cdus():
-        cdu = gra.annotation(cdu_id)
-        cdu_members = set(gra.cdu_members(cdu_id))
-        cdu2mems[cdu_id] = (
-            [x for x in cdu_members if stac.is_edu(gra.annotation(x))],
-            [x for x in cdu_members if stac.is_cdu(gra.annotation(x))]
-        )
-    # * replace each nested CDU in the second list with its member DUs
-    # (to first list), and mark CDUs for exploration (to second list) ;
-    # repeat until fixpoint, ie. transitive closure complete for each CDU
-    while any(v[1] for k, v in cdu2mems.items()):
-        for cdu_id, (mem_edus, mem_cdus) in cdu2mems.items():
-            for mem_cdu in mem_cdus:
-                # switch between the edge and node representations of CDUs:
-                # gra.mirror()
-                nested_edus, nested_cdus = cdu2mems[gra.mirror(mem_cdu)]
-                # add the nested CDU and its EDU members
-                cdu2mems[cdu_id][0].append(mem_cdu)
-                cdu2mems[cdu_id][0].extend(nested_edus)
-                # store CDU members of the nested CDU for exploration
-                cdu2mems[cdu_id][1].extend(nested_cdus)
-                # delete current nested CDU from list of CDUs to be explored
-                cdu2mems[cdu_id][1].remove(mem_cdu)
-    # switch to simple dict, forget list of CDUs for exploration
-    cdu2mems = {k: v[0] for k, v in cdu2mems.items()}
+    du_nodes = frozenset(x for x in gra.nodes()
+                         if (stac.is_edu(gra.annotation(x)) or
+                             stac.is_cdu(gra.annotation(x))))
+    cdu2mems = {cdu_id: gra.cdu_members(cdu_id, deep=True) & du_nodes
+                for cdu_id in gra.cdus()}
     # end transitive closure
 
     for cdu_id in gra.cdus():
         cdu = gra.annotation(cdu_id)
         cdu_mems = set(gra.cdu_members(cdu_id))
-        cdu_rec_mems = set(cdu2mems[cdu_id])
+        cdu_rec_mems = cdu2mems[cdu_id]
         internal_head = dict()
         for cdu_mem in cdu_mems:
             for rel in gra.links(cdu_mem):
@@ -610,31 +590,6 @@ def are_single_headed_cdus(inputs, k, gra):
 # ---------------------------------------------------------------------
 
 
-def horrible_context_kludge(graph, simplified_graph, contexts):
-    """
-    Given a graph and its copy, and given a context dictionary,
-    return a copy of the context dictionary that corresponds to
-    the simplified graph.  Ugh
-    """
-    # FIXME: this is pretty horrible
-    #
-    # Problem is that simplified_graph is a deepcopy of
-    # the original (see implementation in educe without_cdus),
-    # which on the one hand is safer in some ways, but on the
-    # other hand means that we can't look up annotations in the
-    # original contexts dictionary.
-    #
-    # All this horribleness could be avoided if we had
-    # persistent data structures everywhere :-(
-    simplified_contexts = {}
-    for node in simplified_graph.edus():
-        s_anno = simplified_graph.annotation(node)
-        o_anno = graph.annotation(node)
-        if o_anno in contexts:
-            simplified_contexts[s_anno] = contexts[o_anno]
-    return simplified_contexts
-
-
 def run(inputs, k):
     """
     Add any graph errors to the current report
@@ -642,9 +597,7 @@ def run(inputs, k):
     if k.stage != 'discourse':
         return
 
-    doc = inputs.corpus[k]
     graph = egr.Graph.from_doc(inputs.corpus, k)
-    contexts = inputs.contexts[k]
 
     squawk = mk_microphone(inputs.report, k, 'GRAPH', Severity.error)
     quibble = mk_microphone(inputs.report, k, 'GRAPH', Severity.warning)
@@ -696,21 +649,16 @@ def run(inputs, k):
             rfc_violations(inputs, k, graph),
             noisy=True)
 
-    simplified_doc = copy.deepcopy(doc)
-    simplified_inputs = copy.copy(inputs)
-    simplified_inputs.corpus = {k: simplified_doc}
-    simplified_graph = egr.Graph.from_doc(simplified_inputs.corpus, k)
-    simplified_graph.strip_cdus(sloppy=True)
-    simplified_inputs.contexts =\
-        {k: horrible_context_kludge(graph, simplified_graph, contexts)}
+    # the simplified graph shares its EDU annotations with the
+    # original one, so we can report on it with the same inputs
+    simplified_graph = graph.without_cdus(sloppy=True)
 
     squawk('bizarre relation instance (causes loop after CDUs stripped)',
            search_graph_relations(inputs, k, simplified_graph,
                                   is_non2sided_rel))
 
     quibble('non dialogue-initial EDUs without incoming links',
-            search_graph_edus(simplified_inputs, k,
-                              simplified_graph, is_disconnected))
+            search_graph_edus(inputs, k, simplified_graph, is_disconnected))
 
     squawk('CDUs with more than one head',
            are_single_headed_cdus(inputs, k, graph))
@@ -16,7 +16,6 @@ import glob
 import itertools
 import os
 import shutil
-import subprocess
 import sys
 import tempfile
 
@@ -26,6 +25,7 @@ import educe.graph
 from educe.stac import graph as egr
 from educe.stac.corpus import (METAL_STR, twin_key)
 from educe.stac.util.args import STAC_GLOBS
+from educe.stac.util.output import render_dot_graphs
 from educe.stac.context import Context
 from educe.stac.corenlp import (parsed_file_name)
 import educe.util
@@ -37,6 +37,7 @@ import educe.stac.sanity.checks.type_err
 from . import html as h
 from .html import ET as ET
 from .report import (HtmlReport)
+from .state import (CheckState)
 
 
 def first_or_none(itrs):
@@ -105,9 +106,9 @@ def copy_parses(settings):
     "Copy relevant stanford parser outputs from corpus to report"
     output_dir = settings.output_dir
 
-    docs = set(k.doc for k in settings.corpus)
+    docs = set(k.doc for k in settings.anno_files)
     for doc in docs:
-        subdocs = set(k.subdoc for k in settings.corpus if k.doc == doc)
+        subdocs = set(k.subdoc for k in settings.anno_files if k.doc == doc)
         if subdocs:
             k = FileId(doc=doc,
                        subdoc=list(subdocs)[0],
@@ -138,12 +139,17 @@ def copy_parses(settings):
 def generate_graphs(settings):
     """
     Draw SVG graphs for each of the documents in the corpus
+
+    Dot files are only generated for the documents we have read
+    (in an incremental run, the others are restored from the saved
+    state), but they are all rendered
     """
-    discourse_only = [k for k in settings.corpus if k.stage == 'discourse']
     report = settings.report
 
     # generate dot files
-    for k in discourse_only:
+    for k in settings.corpus:
+        if k.stage != 'discourse':
+            continue
         try:
             gra = egr.DotGraph(egr.Graph.from_doc(settings.corpus, k))
             dot_file = report.subreport_path(k, '.dot')
@@ -156,16 +162,15 @@ def generate_graphs(settings):
                        "annotation ids") % dot_file
             print(warning, file=sys.stderr)
 
-    # attempt to graphviz them
+    # attempt to graphviz them (all at once, see render_dot_graphs)
+    if not settings.draw:
+        return
+    dot_files = [report.subreport_path(k, '.dot')
+                 for k in settings.anno_files if k.stage == 'discourse']
     try:
         print("Generating graphs... (you can safely ^-C here)",
               file=sys.stderr)
-        for k in discourse_only:
-            dot_file = report.subreport_path(k, '.dot')
-            svg_file = report.subreport_path(k, '.svg')
-            if fp.exists(dot_file) and settings.draw:
-                subprocess.call('dot -T svg -o %s %s' % (svg_file, dot_file),
-                                shell=True)
+        render_dot_graphs([x for x in dot_files if fp.exists(x)])
     except OSError as oops:
         print("Couldn't run graphviz. (%s)" % oops, file=sys.stderr)
         print("You should install it for easier sanity check debugging.",
@@ -228,7 +233,7 @@ def write_index(settings):
     """
     Write the report index
     """
-    corpus = settings.corpus
+    corpus = settings.anno_files
     htree = ET.Element('html')
 
     h.elem(htree, 'h2', text='general')
@@ -270,14 +275,18 @@ class SanityChecker(object):
         self.corpus_dir = args.corpus
         self.corpus = None
         self.contexts = None
-        self.__init_read_corpus(is_interesting, self.corpus_dir)
+        self.state = None
+        self.__init_read_corpus(is_interesting, self.corpus_dir, args.state)
         self.__init_set_output(args.output)
         self.report = HtmlReport(self.anno_files, self.output_dir)
         self.draw = args.draw
 
-    def __init_read_corpus(self, is_interesting, corpus_dir):
+    def __init_read_corpus(self, is_interesting, corpus_dir, state_dir):
         """
         Read the corpus specified in our args
+
+        If we have a state directory, only read the documents that
+        have changed since they were last checked
         """
         reader = stac.Reader(corpus_dir)
         all_files = reader.files()
@@ -287,7 +296,14 @@ class SanityChecker(object):
             ukey = twin_key(key, 'unannotated')
             if ukey in all_files:
                 self.anno_files[ukey] = all_files[ukey]
-        self.corpus = reader.slurp(self.anno_files, verbose=True)
+        to_read = self.anno_files
+        if state_dir:
+            self.state = CheckState(state_dir, self.anno_files)
+            to_read = reader.filter(self.anno_files, self.state.is_stale)
+            print("Reusing saved checks for %d of %d files" %
+                  (len(self.anno_files) - len(to_read), len(self.anno_files)),
+                  file=sys.stderr)
+        self.corpus = reader.slurp(to_read, verbose=True)
         self.contexts = {k: Context.for_edus(self.corpus[k])
                          for k in self.corpus}
 
@@ -317,13 +333,20 @@ class SanityChecker(object):
         """
         Perform sanity checks and write the output
         """
-        for k in sorted(self.corpus, key=sanity_check_order):
+        for k in sorted(self.anno_files, key=sanity_check_order):
+            if k not in self.corpus:
+                # unchanged since the last run
+                if self.state.restore(k, self.output_dir):
+                    self.report.set_has_errors(k)
+                continue
             run_checks(self, k)
             create_dirname(self.report.subreport_path(k))
             self.report.flush_subreport(k)
 
         copy_parses(self)
         generate_graphs(self)
+        if self.state is not None:
+            self.state.save(self.corpus, self.report, self.output_dir)
         write_index(self)
 
         output_dir = self.output_dir
@@ -413,6 +436,9 @@ def main():
     arg_parser.add_argument('--no-draw', action='store_true',
                             dest='draw', default=True,
                             help='Do not draw relations graph')
+    arg_parser.add_argument('--state', metavar='DIR',
+                            help='Keep per-document results in DIR and '
+                            'only recheck documents changed since')
     educe.util.add_corpus_filters(arg_parser)
     args = arg_parser.parse_args()
     try:
@@ -37,6 +37,13 @@ def snippet(txt, stop=50):
     else:
         return txt
 
+
+def _tostring(elem):
+    """
+    Serialise an HTML element to (utf-8) bytes
+    """
+    return ET.tostring(elem, encoding='utf-8')
+
 # ---------------------------------------------------------------------
 # severity
 # ---------------------------------------------------------------------
@@ -49,6 +56,14 @@ class Severity(Enum):
     warning = 1
     error = 2
 
+
+def _section_header(severity):
+    """
+    HTML header for the section of a report at the given severity
+    """
+    return h.elem(ET.Element('div'), 'h2',
+                  text=(severity.name + 's').upper())
+
 # ---------------------------------------------------------------------
 # report
 # ---------------------------------------------------------------------
@@ -94,11 +109,14 @@ function toggle_hidden(name) {
 """
 
     def __init__(self, anno_files, output_dir):
+        # per-document state for reports in progress; report blocks
+        # are serialised as soon as they are made, and the whole lot
+        # is dropped when the subreport is flushed to disk
         self.subreports = {}
         self.subreport_sections = {}
-        self.subreport_started = {}
         self.anno_files = anno_files
         self.output_dir = output_dir
+        # the only thing kept for the whole run
         self._has_errors = {}  # has non-warnings
 
     @classmethod
@@ -117,10 +135,23 @@ function toggle_hidden(name) {
         Write the subreport for a given key to the path.
         No-op if we don't have a sub-report for the given key
         """
-        if k in self.subreports:
-            htree = self.subreports[k]
-            with open(path, 'w') as fout:
-                print(ET.tostring(htree, encoding='utf-8'), file=fout)
+        if k not in self.subreports:
+            return
+        with open(path, 'wb') as fout:
+            fout.write(b'<html>')
+            for chunk in self.subreports[k]:
+                fout.write(chunk)
+            for sev in reversed(list(Severity)):
+                blocks = self.subreport_sections[k][sev]
+                if not blocks:
+                    fout.write(b'<div />')
+                    continue
+                fout.write(b'<div>')
+                fout.write(_tostring(_section_header(sev)))
+                for block in blocks:
+                    fout.write(block)
+                fout.write(b'</div>')
+            fout.write(b'</html>\n')
 
     def delete(self, k):
         """
@@ -152,15 +183,15 @@ function toggle_hidden(name) {
         subreports for each severity level below it
 
         If already cached, retrieve from cache
+
+        :rtype: [bytes]
+        :returns: the serialised preamble of the subreport (the
+            severity sections are held in `subreport_sections`)
         """
         if k in self.subreports:
             return self.subreports[k]
 
         htree = ET.Element('html')
-        self.subreports[k] = htree
-        self.subreport_sections[k] = {}
-        self.subreport_started[k] = {}
-
         hhead = h.elem(htree, 'head')
         h.elem(hhead, 'style', text=self.css,
                type='text/css')
@@ -175,13 +206,11 @@ function toggle_hidden(name) {
 
         h.elem(htree, 'hr')
 
-        # placeholder sections for each severity level,
-        # most severe first (ensure error comes before warnings)
-        for sev in reversed(list(Severity)):
-            self.subreport_sections[k][sev] = h.elem(htree, 'div')
-            self.subreport_started[k][sev] = False
-
-        return htree
+        self.subreports[k] = [_tostring(x) for x in htree]
+        # placeholder sections for each severity level (written most
+        # severe first, so that errors come before warnings)
+        self.subreport_sections[k] = {sev: [] for sev in Severity}
+        return self.subreports[k]
 
     def subreport_path(self, k, extension='.report.html'):
         """
@@ -192,11 +221,18 @@ function toggle_hidden(name) {
     def flush_subreport(self, k):
         """
         Write and delete (to save memory)
+
+        The report is written to a temporary file first and then moved
+        into place, so a reader never sees a half-written report while
+        a long run is in progress
         """
         html_path = self.subreport_path(k)
         if os.path.exists(html_path):
             os.remove(html_path)  # might be leftover from past check
-        self.write(k, html_path)
+        if k in self.subreports:
+            tmp_path = html_path + '.tmp'
+            self.write(k, tmp_path)
+            os.rename(tmp_path, html_path)
         self.delete(k)
 
     # pylint: disable=no-self-use
@@ -234,17 +270,8 @@ function toggle_hidden(name) {
             self.set_has_errors(k)
 
         self.mk_or_get_subreport(k)
-        subtree = self.subreport_sections[k][severity]
-        # emit a header if we haven't yet done so for this section
-        # (avoid showing headers unless we have content for this
-        # level of severity)
-        if not self.subreport_started[k][severity]:
-            sev_str = (severity.name + 's').upper()
-            h.elem(subtree, 'h2', text=sev_str)
-            self.subreport_started[k][severity] = True
-
+        subdiv = ET.Element("div")
         full_header = err_type + ' ' + severity.name.upper() + ': ' + header
-        subdiv = h.elem(subtree, "div")
         h.span(subdiv, text=full_header)
 
         if noisy:
@@ -264,6 +291,8 @@ function toggle_hidden(name) {
             if severity == Severity.error:
                 for anno in item.annotations():
                     anno.features["highlight"] = "red"
+        # serialise straight away: only the bytes are kept until flush
+        self.subreport_sections[k][severity].append(_tostring(subdiv))
     # pylint: enable=too-many-arguments
 
     def set_has_errors(self, k):
@@ -0,0 +1,196 @@
+"""
+Saved state for incremental runs of the sanity checker
+
+The checks for a document only ever look at the stages of that same
+document (cross-checks compare units against unannotated text, discourse
+against units, etc), so we fingerprint the .aa/.ac files of all the
+stages of a (doc, subdoc) together, along with their paths (which show
+up in the report headers) and the source of the checker and of the
+educe modules it relies on. If the fingerprint is unchanged since the
+last run, its reports and graph are copied out of the state
+directory instead of being checked all over again.
+"""
+
+from __future__ import print_function
+from os import path as fp
+import hashlib
+import importlib
+import json
+import os
+import shutil
+
+from .report import HtmlReport
+
+# bump this if the layout of the state directory changes
+STATE_FORMAT = 2
+
+# modules outside of the sanity package that the checks depend on;
+# changing their source invalidates all saved checks
+FINGERPRINT_MODULES = [
+    'educe.annotation',
+    'educe.corpus',
+    'educe.glozz',
+    'educe.graph',
+    'educe.stac.annotation',
+    'educe.stac.context',
+    'educe.stac.corpus',
+    'educe.stac.graph',
+    'educe.stac.rfc',
+    'educe.stac.util.annotate',
+    'educe.util',
+]
+
+# extensions of the per-document outputs we save
+SAVED_EXTENSIONS = ['.report.html', '.dot']
+
+
+def _group(k):
+    """
+    The unit of reuse that a key belongs to (all stages and
+    annotators of a subdocument)
+    """
+    return '%s/%s' % (k.doc, k.subdoc or '')
+
+
+def _key_to_list(k):
+    "json-friendly version of a FileId"
+    return [k.doc, k.subdoc, k.stage, k.annotator]
+
+
+def _checker_digest():
+    """
+    Digest of the sanity checker source and of the modules it
+    depends on, so that we recheck everything after either changes
+    """
+    src_paths = []
+    sanity_dir = fp.dirname(__file__)
+    for dirpath, dirnames, filenames in os.walk(sanity_dir):
+        dirnames.sort()
+        src_paths.extend(fp.join(dirpath, fname)
+                         for fname in sorted(filenames)
+                         if fname.endswith('.py'))
+    for mod_name in FINGERPRINT_MODULES:
+        mod = importlib.import_module(mod_name)
+        src_paths.append(fp.splitext(mod.__file__)[0] + '.py')
+    sha = hashlib.sha1()
+    for path in src_paths:
+        with open(path, 'rb') as fin:
+            sha.update(fin.read())
+    return sha.hexdigest()
+
+
+def fingerprints(anno_files):
+    """
+    Fingerprint for each subdocument in a corpus
+
+    Parameters
+    ----------
+    anno_files : dict(FileId, (string, string))
+        Files for each document, as returned by `Reader.files()`
+
+    Returns
+    -------
+    fingerprints : dict(string, string)
+        A hex digest for each (doc, subdoc) group
+    """
+    salt = '%d:%s' % (STATE_FORMAT, _checker_digest())
+    groups = {}
+    for k in anno_files:
+        groups.setdefault(_group(k), []).append(k)
+    res = {}
+    for group, keys in groups.items():
+        sha = hashlib.sha1(salt.encode('utf-8'))
+        for k in sorted(keys, key=lambda x: repr(_key_to_list(x))):
+            sha.update(repr(_key_to_list(k)).encode('utf-8'))
+            for path in anno_files[k]:
+                # the paths are printed in the report, so a moved
+                # corpus needs fresh reports too
+                sha.update(repr(path).encode('utf-8'))
+                if path is None or not fp.exists(path):
+                    sha.update(b'\0')
+                    continue
+                with open(path, 'rb') as fin:
+                    sha.update(fin.read())
+        res[group] = sha.hexdigest()
+    return res
+
+
+class CheckState(object):
+    """
+    Per-document check results from previous runs, kept in a
+    state directory ::
+
+        manifest.json      fingerprints and error flags
+        <doc>/<stage>/...  saved reports and dot files
+
+    Parameters
+    ----------
+    state_dir : string
+        Directory to keep the state in (created if need be)
+    anno_files : dict(FileId, (string, string))
+        Files for the documents we are about to check
+    """
+    def __init__(self, state_dir, anno_files):
+        self.state_dir = state_dir
+        self.manifest_path = fp.join(state_dir, 'manifest.json')
+        self._fingerprints = fingerprints(anno_files)
+        self._manifest = {}
+        if fp.exists(self.manifest_path):
+            with open(self.manifest_path) as fin:
+                self._manifest = json.load(fin)
+
+    def is_stale(self, k):
+        """
+        True if the document needs to be checked again
+        """
+        group = _group(k)
+        entry = self._manifest.get(group)
+        return (entry is None or
+                entry['fingerprint'] != self._fingerprints[group])
+
+    def restore(self, k, output_dir):
+        """
+        Copy the saved outputs for a (fresh) document to the output
+        directory, returning True if it had error-level reports
+        """
+        for ext in SAVED_EXTENSIONS:
+            saved = HtmlReport.mk_output_path(self.state_dir, k, ext)
+            out = HtmlReport.mk_output_path(output_dir, k, ext)
+            if fp.exists(saved):
+                if not fp.exists(fp.dirname(out)):
+                    os.makedirs(fp.dirname(out))
+                shutil.copyfile(saved, out)
+            elif fp.exists(out):
+                os.remove(out)  # might be leftover from past check
+        errors = self._manifest[_group(k)]['errors']
+        return _key_to_list(k) in errors
+
+    def save(self, keys, report, output_dir):
+        """
+        Save the outputs of the documents we have just checked
+        and write the manifest out
+        """
+        keys = list(keys)
+        for k in keys:
+            for ext in SAVED_EXTENSIONS:
+                out = HtmlReport.mk_output_path(output_dir, k, ext)
+                saved = HtmlReport.mk_output_path(self.state_dir, k, ext)
+                if fp.exists(out):
+                    if not fp.exists(fp.dirname(saved)):
+                        os.makedirs(fp.dirname(saved))
+                    shutil.copyfile(out, saved)
+                elif fp.exists(saved):
+                    os.remove(saved)
+        for group in set(_group(k) for k in keys):
+            self._manifest[group] = {
+                'fingerprint': self._fingerprints[group],
+                'errors': []}
+        for k in keys:
+            if report.has_errors(k):
+                self._manifest[_group(k)]['errors'].append(_key_to_list(k))
+        if not fp.exists(self.state_dir):
+            os.makedirs(self.state_dir)
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as fout:
+            json.dump(self._manifest, fout, indent=1, sort_keys=True)
+        os.rename(tmp_path, self.manifest_path)
@@ -4,10 +4,15 @@
 Tests for the STAC sanity checker
 """
 
+from os import path as fp
 import copy
+import shutil
+import sys
+import tempfile
 import unittest
 
 from educe import stac
+from educe.corpus import FileId
 from educe.stac.context import Context
 from educe.stac.tests import\
     FakeEDU, FakeCDU, FakeRelInst, FakeDocument, FakeKey,\
@@ -15,7 +20,10 @@ from educe.stac.tests import\
 import educe.stac.graph as egr
 
 from .checks.annotation import is_cross_dialogue
+from .checks.glozz import overlapping
 from .checks.graph import is_puncture
+from . import state
+from .state import CheckState, fingerprints
 
 
 class SanityCheckerTest(unittest.TestCase):
@@ -217,3 +225,104 @@ class DialogueBoundaryTest(SanityCheckerTest):
         contexts = Context.for_edus(doc)
         cp = doc.copies
         self.assertTrue(is_cross_dialogue(contexts)(cp[cdu]))
+
+
+class OverlapTest(unittest.TestCase):
+    """
+    Overlapping annotations
+    """
+    class Inputs(object):
+        "just the parts of the sanity checker inputs that we need"
+        def __init__(self, doc):
+            self.corpus = {'k': doc}
+            self.contexts = {'k': {}}
+
+    def test_overlapping(self):
+        "each EDU is reported with the EDUs that overlap it after it"
+        edus = [FakeEDU('a', span=(3, 6)),
+                FakeEDU('b', span=(5, 9)),
+                FakeEDU('c', span=(6, 6)),  # empty, enclosed in a and b
+                FakeEDU('d', span=(9, 12)),  # only touches b
+                FakeEDU('e', span=(0, 1))]
+        inputs = self.Inputs(FakeDocument(edus, [], []))
+        items = overlapping(inputs, 'k', stac.is_edu)
+        self.assertEqual([('a', ['b', 'c']), ('b', ['c'])],
+                         [(x.anno.local_id(),
+                           [y.local_id() for y in x.overlaps])
+                          for x in items])
+
+
+class FingerprintTest(unittest.TestCase):
+    """
+    Fingerprints for incremental checking
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.files = {}
+        for subdoc in ['01', '02']:
+            for stage in ['units', 'discourse']:
+                key = FileId(doc='d', subdoc=subdoc, stage=stage,
+                             annotator='a')
+                paths = tuple(fp.join(self.tmpdir, subdoc + stage + ext)
+                              for ext in ['.aa', '.ac'])
+                for path in paths:
+                    with open(path, 'w') as fout:
+                        fout.write(path)
+                self.files[key] = paths
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_fingerprints(self):
+        "changing one stage invalidates its subdocument only"
+        before = fingerprints(self.files)
+        self.assertEqual(['d/01', 'd/02'], sorted(before))
+        self.assertEqual(before, fingerprints(self.files))
+        with open(fp.join(self.tmpdir, '01units.aa'), 'a') as fout:
+            fout.write('changed')
+        after = fingerprints(self.files)
+        self.assertNotEqual(before['d/01'], after['d/01'])
+        self.assertEqual(before['d/02'], after['d/02'])
+
+    def test_moved_corpus(self):
+        "the same files at another path need new reports"
+        moved = dict((k, tuple(path + '.bak' for path in paths))
+                     for k, paths in self.files.items())
+        for paths, new_paths in zip(self.files.values(), moved.values()):
+            for path, new_path in zip(paths, new_paths):
+                shutil.copyfile(path, new_path)
+        before = fingerprints(self.files)
+        after = fingerprints(moved)
+        self.assertNotEqual(before['d/01'], after['d/01'])
+
+    def test_dependency_change(self):
+        "changing a module the checks rely on forces a recheck"
+        mod_name = 'fingerprint_test_dep'
+        mod_path = fp.join(self.tmpdir, mod_name + '.py')
+        with open(mod_path, 'w') as fout:
+            fout.write('X = 1\n')
+        old_modules = state.FINGERPRINT_MODULES
+        sys.path.insert(0, self.tmpdir)
+        try:
+            state.FINGERPRINT_MODULES = old_modules + [mod_name]
+            state_dir = fp.join(self.tmpdir, 'state')
+            before = CheckState(state_dir, self.files)
+            before.save(self.files, _NoErrors(), self.tmpdir)
+            fresh = CheckState(state_dir, self.files)
+            self.assertFalse(any(fresh.is_stale(k) for k in self.files))
+            with open(mod_path, 'w') as fout:
+                fout.write('X = 2\n')
+            after = CheckState(state_dir, self.files)
+            self.assertTrue(all(after.is_stale(k) for k in self.files))
+        finally:
+            state.FINGERPRINT_MODULES = old_modules
+            sys.path.remove(self.tmpdir)
+            sys.modules.pop(mod_name, None)
+
+
+class _NoErrors(object):
+    "stand-in for a report without any error-level entries"
+    @staticmethod
+    def has_errors(_):
+        "no errors here"
+        return False
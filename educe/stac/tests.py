@@ -18,6 +18,7 @@ import educe.stac.graph as stac_gr
 from educe import annotation, corpus, stac
 from educe.corpus import FileId
 from educe.stac import fake_graph
+from educe.stac import fusion
 from educe.stac.rfc import BasicRfc, ThreadedRfc
 from educe.stac.util.output import mk_parent_dirs
 
@@ -249,6 +250,40 @@ class CduHeadTest(unittest.TestCase):
         self.assertEqual(deep_heads[ids['c1']],
                          deep_heads[ids['c2']])
 
+    def test_without_cdus(self):
+        "cdu[e1 -> e2 -> e3] -> e4, with CDUs stripped off a copy"
+        doc = FakeDocument([edu1, edu2, edu3, edu4],
+                           [rel1, rel2, rel3],
+                           [cdu1])
+        k = FakeKey('cdu_head_test')
+        doc.fleshout(k)
+        gra = stac_gr.Graph.from_doc({k: doc}, k)
+        ids = graph_ids(gra)
+        gra2 = gra.without_cdus()
+        self.assertEqual(frozenset(), gra2.cdus())
+        rel3_0 = ids['r-c1-e4'] + '_0'
+        self.assertEqual([ids['e1'], ids['e4']], gra2.links(rel3_0))
+        # the EDUs are shared, the original graph and doc are untouched
+        self.assertIs(gra.annotation(ids['e1']), gra2.annotation(ids['e1']))
+        self.assertEqual(1, len(gra.cdus()))
+        self.assertEqual(3, len(doc.relations))
+        self.assertEqual(1, len(doc.schemas))
+        self.assertEqual([], gra2.doc.schemas)
+
+    def test_strip_cdus_in_place(self):
+        "strip_cdus edits the document's relation list in place"
+        doc = FakeDocument([edu1, edu2, edu3, edu4],
+                           [rel1, rel2, rel3],
+                           [cdu1])
+        k = FakeKey('cdu_head_test')
+        doc.fleshout(k)
+        gra = stac_gr.Graph.from_doc({k: doc}, k)
+        relations = doc.relations
+        gra.strip_cdus()
+        self.assertIs(relations, doc.relations)
+        self.assertEqual(['r-e1-e2', 'r-e2-e3', 'r-c1-e4_0'],
+                         [x.local_id() for x in relations])
+
 
 def test_first_outermost_dus_simple():
     edu1 = FakeEDU('e1', span=(1, 2))
@@ -414,3 +449,69 @@ class ThreadedRfcTest(BasicRfcTest):
         multi_violations = self.violations(graph)
         self.assertNotIn(lg.get_edge('b', 'c'), multi_violations)
         self.assertNotIn(lg.get_edge('a', 'c'), multi_violations)
+
+
+class FakeFusionEDU(FakeEDU):
+    def __init__(self, unit_id, turn, spk):
+        FakeEDU.__init__(self, unit_id)
+        self.turn = turn
+        self._speaker = spk
+
+    def speaker(self):
+        return self._speaker
+
+    def subgrouping(self):
+        return self.turn
+
+    def is_left_padding(self):
+        return False
+
+
+class CandidatePairsTest(unittest.TestCase):
+
+    def setUp(self):
+        # turns: A:[e1 e2] B:[e3] A:[e4]
+        self.edus = [FakeFusionEDU('e1', 't1', 'A'),
+                     FakeFusionEDU('e2', 't1', 'A'),
+                     FakeFusionEDU('e3', 't2', 'B'),
+                     FakeFusionEDU('e4', 't3', 'A')]
+        e1, _, e3, e4 = self.edus
+        rels = {(fusion.FakeRootEDU, e1): 'ROOT',
+                (e1, e3): 'Question-answer_pair',
+                (e1, e4): 'Continuation'}
+        self.dia = fusion.Dialogue(FakeEDU('d1'), self.edus, rels)
+
+    def test_all_pairs(self):
+        pairs = list(self.dia.edu_pairs())
+        self.assertEqual(len(pairs), 4 + 4 * 3)
+
+    def test_max_edu_distance(self):
+        e1, e2, e3, e4 = self.edus
+        cands = fusion.max_edu_distance(1)
+        pairs = set(self.dia.edu_pairs(candidates=cands))
+        self.assertIn((fusion.FakeRootEDU, e4), pairs)
+        self.assertIn((e3, e2), pairs)
+        self.assertNotIn((e1, e3), pairs)
+
+    def test_max_turn_distance(self):
+        e1, e2, e3, e4 = self.edus
+        cands = fusion.max_turn_distance(1)
+        pairs = set(self.dia.edu_pairs(candidates=cands))
+        self.assertIn((e1, e3), pairs)
+        self.assertNotIn((e1, e4), pairs)
+
+    def test_same_speaker_or_adjacent_turn(self):
+        e1, e2, e3, e4 = self.edus
+        cands = fusion.all_candidates(fusion.max_edu_distance(3),
+                                      fusion.same_speaker_or_adjacent_turn)
+        pairs = set(self.dia.edu_pairs(candidates=cands))
+        self.assertIn((e1, e4), pairs)
+        self.assertIn((e3, e4), pairs)
+
+    def test_pruning_stats(self):
+        stats = fusion.pruning_stats([self.dia],
+                                     fusion.max_edu_distance(2))
+        self.assertEqual(stats.pairs, 16)
+        self.assertEqual(stats.kept_pairs, 4 + 2 * 5)
+        self.assertEqual(stats.gold, 3)
+        self.assertEqual(stats.dropped_gold, 1)
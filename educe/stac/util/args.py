@@ -46,6 +46,9 @@ def check_easy_settings(args):
     --------
     `educe.stac.sanity.main.easy_settings()`
     """
+    if 'corpus' not in args.__dict__:
+        return  # subcommand without corpus (eg. bench-graph)
+
     if args.corpus:
         # 2017-01-25 explicitly break if there is no such folder
         if not os.path.exists(args.corpus):
@@ -215,6 +218,21 @@ def anno_id(string):
     return (parts[0], int(parts[1]))
 
 
+def positive_int(string):
+    """
+    Parse a strictly positive integer (eg. a number of jobs), complaining
+    if it's anything else. Used for argparse
+    """
+    try:
+        val = int(string)
+    except ValueError:
+        val = 0
+    if val < 1:
+        msg = "%r is not a positive integer" % string
+        raise argparse.ArgumentTypeError(msg)
+    return val
+
+
 def comma_span(string):
     """
     Split a comma delimited pair of integers into an educe span
@@ -7,7 +7,8 @@ stac-util subcommands
 
 # pylint: disable=redefined-builtin
 # (we have a command called filter)
-from . import (count,
+from . import (bench_graph,
+               count,
                count_rfc,
                count_shapes,
                dump,
@@ -35,6 +36,9 @@ SUBCOMMAND_SECTIONS = [
     ('Dump', [
         dump,
     ]),
+    ('Benchmarks', [
+        bench_graph,
+    ]),
 ]
 
 SUBCOMMANDS = []
@@ -0,0 +1,256 @@
+"""
+Benchmark the connected components and subgraph copies of
+`educe.graph.Graph` on random hypergraphs with nested CDUs
+"""
+
+from __future__ import print_function
+import collections
+import copy
+import random
+import timeit
+
+from pygraph.algorithms import accessibility
+
+from educe.graph import Graph
+
+NAME = 'bench-graph'
+
+
+def config_argparser(parser):
+    """
+    Subcommand flags.
+
+    You should create and pass in the subparser to which the flags
+    are to be added.
+    """
+    parser.add_argument('--edus', type=int, default=400,
+                        help='number of EDUs in each graph')
+    parser.add_argument('--levels', type=int, default=6,
+                        help='depth of CDU nesting')
+    parser.add_argument('--graphs', type=int, default=3,
+                        help='number of random graphs')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='random seed')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timed runs (best is kept)')
+    parser.add_argument('--no-baseline', action='store_true',
+                        help='do not time the former implementations '
+                        '(they are quadratic or worse)')
+    parser.set_defaults(func=main)
+
+
+# ---------------------------------------------------------------------
+# random graphs
+# ---------------------------------------------------------------------
+
+
+def _add_object(graph, anno_id, type, members=None):
+    """
+    Add a node (and if it has members, its mirror edge) with the
+    attributes the graph expects
+    """
+    # pylint: disable=redefined-builtin
+    graph.add_node(anno_id)
+    if members is None:
+        graph.add_node_attribute(anno_id, ('type', type))
+        graph.add_node_attribute(anno_id, ('mirror', None))
+        return
+    graph.add_edge(anno_id)
+    for attr in [('type', type), ('mirror', anno_id)]:
+        graph.add_node_attribute(anno_id, attr)
+        graph.add_edge_attribute(anno_id, attr)
+    for member in members:
+        graph.link(member, anno_id)
+
+
+def random_graph(rng, num_edus, levels):
+    """
+    Random hypergraph: at each level, relations link nearby units
+    (leaving some of them unconnected), then runs of units are
+    grouped into CDUs that are the units of the next level
+
+    Parameters
+    ----------
+    rng : random.Random
+    num_edus : int
+    levels : int
+        Number of CDU levels
+
+    Returns
+    -------
+    graph : Graph
+    """
+    graph = Graph()
+    graph.corpus = {}
+    graph.doc_key = None
+    graph.doc = None
+    units = []
+    for i in range(num_edus):
+        anno_id = 'e%d' % i
+        _add_object(graph, anno_id, 'EDU')
+        units.append(anno_id)
+    for level in range(levels):
+        for i, unit in enumerate(units):
+            if rng.random() < 0.3:
+                continue
+            other = units[min(len(units) - 1, i + rng.randint(1, 3))]
+            if other != unit:
+                _add_object(graph, 'r%d_%d' % (level, i), 'rel',
+                            [unit, other])
+        next_units = []
+        i = 0
+        while i < len(units):
+            size = rng.randint(1, 4)
+            run = units[i:i + size]
+            if len(run) > 1 and rng.random() < 0.7:
+                anno_id = 'c%d_%d' % (level, i)
+                _add_object(graph, anno_id, 'CDU', run)
+                next_units.append(anno_id)
+            else:
+                next_units.extend(run)
+            i += size
+        units = next_units
+    return graph
+
+
+# ---------------------------------------------------------------------
+# former implementations
+# ---------------------------------------------------------------------
+
+
+def _fixpoint_copy(graph, nodeset):
+    """
+    Baseline: `Graph.copy` as it was before it counted missing links,
+    growing the set of copyable edges until a fixpoint
+    """
+    g = graph.__class__()
+    g.corpus = graph.corpus
+    g.doc_key = graph.doc_key
+    g.doc = graph.doc
+
+    nodes_wanted = set(nodeset)
+    cdus = [x for x in nodes_wanted if graph.is_cdu(x)]
+    for x in cdus:
+        nodes_wanted.update(graph.cdu_members(x, deep=True))
+
+    def is_wanted_edge(e):
+        "all links of the edge are wanted"
+        return all([l in nodes_wanted for l in graph.links(e)])
+
+    keep_growing = True
+    edges_remaining = graph.hyperedges()
+    edges_wanted = set()
+    while keep_growing:
+        keep_growing = False
+        for e in edges_remaining:
+            if is_wanted_edge(e):
+                edges_wanted.add(e)
+                nodes_wanted.add(graph.mirror(e))
+                edges_remaining.remove(e)
+                keep_growing = True
+
+    for n in graph.nodes():
+        if n in nodes_wanted:
+            g.add_node(n)
+            for kv in graph.node_attributes(n):
+                g.add_node_attribute(n, kv)
+    for e in graph.hyperedges():
+        if e in edges_wanted:
+            g.add_hyperedge(e)
+            for kv in graph.edge_attributes(e):
+                g.add_edge_attribute(e, kv)
+            for l in graph.links(e):
+                g.link(l, e)
+    return g
+
+
+def _merged_connected_components(graph):
+    """
+    Baseline: `Graph.connected_components` as it was before the
+    union-find, merging python-graph's components pairwise
+    """
+    ccs = accessibility.connected_components(graph)
+    subgraphs = collections.defaultdict(set)
+    for node, i in ccs.items():
+        subgraphs[i].add(node)
+
+    eaten = set()
+    merged = {}
+    prior = sorted(subgraphs.keys())
+    while sorted(merged.keys()) != prior:
+        prior = sorted(merged.keys())
+        merged = {}
+        for k in subgraphs:
+            if k in eaten:
+                continue
+            subg = subgraphs[k]
+            merged[k] = copy.copy(subg)
+            for n in subg:
+                e = graph.mirror(n)
+                if e is not None:
+                    links = set(graph.links(e))
+                    for k2 in list(subgraphs.keys()):
+                        links2 = subgraphs[k2]
+                        if k2 != k and not links2.isdisjoint(links):
+                            eaten.add(k2)
+                            merged[k] |= links2
+        subgraphs = merged
+    return frozenset([frozenset(v) for v in subgraphs.values()])
+
+
+# ---------------------------------------------------------------------
+# main
+# ---------------------------------------------------------------------
+
+
+def _best_time(func, repeat):
+    "Best wall clock time over several runs of a function"
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def _shape(graph):
+    "nodes and edges of a graph, for comparisons"
+    return (frozenset(graph.nodes()), frozenset(graph.hyperedges()))
+
+
+def main(args):
+    """
+    Subcommand main.
+
+    You shouldn't need to call this yourself if you're using
+    `config_argparser`
+    """
+    rng = random.Random(args.seed)
+    graphs = [random_graph(rng, args.edus, args.levels)
+              for _ in range(args.graphs)]
+    halves = [sorted(g.edus())[:args.edus // 2] for g in graphs]
+    print('{} graphs: {} EDUs, {} CDU levels, {} nodes on average'.format(
+        len(graphs), args.edus, args.levels,
+        sum(len(g.nodes()) for g in graphs) // len(graphs)))
+
+    def run_ccs(func):
+        "components of all the graphs"
+        return [func(g) for g in graphs]
+
+    def run_copies(func):
+        "copies of half the EDUs of all the graphs"
+        return [func(g, h) for g, h in zip(graphs, halves)]
+
+    benches = [
+        ('components',
+         lambda: run_ccs(Graph.connected_components),
+         lambda: run_ccs(_merged_connected_components)),
+        ('copy',
+         lambda: [_shape(x) for x in run_copies(Graph.copy)],
+         lambda: [_shape(x) for x in run_copies(_fixpoint_copy)]),
+    ]
+    for name, current, baseline in benches:
+        t_new = _best_time(current, args.repeat)
+        if args.no_baseline:
+            print('{:10} {:.4f}s'.format(name, t_new))
+            continue
+        if current() != baseline():
+            raise AssertionError('Results of {} differ'.format(name))
+        t_old = _best_time(baseline, args.repeat)
+        print('{:10} before: {:.4f}s\tafter: {:.4f}s\t({:.2f}x)'.format(
+            name, t_old, t_new, t_old / t_new))
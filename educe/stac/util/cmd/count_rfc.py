@@ -41,7 +41,7 @@ def process_doc_violations(corpus, key, strip=False):
     res = Counter()
     dgraph = Graph.from_doc(corpus, key)
     if strip:
-        dgraph.strip_cdus(sloppy=True)
+        dgraph = dgraph.without_cdus(sloppy=True)
     relations = dgraph.relations()
 
     for name, method in RFC_METHODS:
@@ -60,7 +60,7 @@ def process_doc_power(corpus, key, strip=False):
     res = Counter()
     doc_graph = Graph.from_doc(corpus, key)
     if strip:
-        doc_graph.strip_cdus(sloppy=True)
+        doc_graph = doc_graph.without_cdus(sloppy=True)
     anno_to_nodes = dict((doc_graph.annotation(n), n)
                          for n in doc_graph.edus())
     doc = corpus[key]
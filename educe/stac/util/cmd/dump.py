@@ -45,7 +45,7 @@ def config_argparser(parser):
     # add_usual_output_args() already adds '--output', which we'll reuse
     # for 'out_dir'
     parser.add_argument('--out_fmt',
-                        choices=['csv', 'pickle'],
+                        choices=['csv', 'pickle', 'feather', 'columnar'],
                         default='csv',
                         help='Output format for the dump')
     parser.set_defaults(func=main)
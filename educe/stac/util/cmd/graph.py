@@ -16,9 +16,9 @@ import educe.stac
 import educe.stac.graph as stacgraph
 import educe.stac.postag
 
-from ..args import (get_output_dir, anno_id)
+from ..args import (get_output_dir, anno_id, positive_int)
 from ..glozz import (anno_id_from_tuple)
-from ..output import write_dot_graph
+from ..output import write_dot_graph, render_dot_graphs
 
 
 # slightly different from the stock stac-util version because it
@@ -37,6 +37,17 @@ def _read_corpus(args):
     return reader.slurp(anno_files, verbose=True)
 
 
+def _render_dot_graphs(dot_files, args):
+    """
+    Run graphviz on the dot files, reporting (rather than failing)
+    if it can't be run
+    """
+    try:
+        render_dot_graphs(dot_files, jobs=args.jobs)
+    except OSError as oops:
+        print("Couldn't run graphviz. (%s)" % oops, file=sys.stderr)
+
+
 def _main_rel_graph(args):
     """
     Draw graphs showing relation instances between EDUs
@@ -50,6 +61,7 @@ def _main_rel_graph(args):
     else:
         keys = [k for k in corpus if k.stage == 'discourse']
 
+    dot_files = []
     for k in sorted(keys):
         if args.highlight:
             highlights = [anno_id_from_tuple(x) for x in args.highlight]
@@ -62,21 +74,24 @@ def _main_rel_graph(args):
                 gra = gra.without_cdus(mode=args.strip_mode)
             dot_gra = stacgraph.DotGraph(gra)
             if dot_gra.get_nodes():
-                write_dot_graph(k, output_dir, dot_gra,
-                                run_graphviz=args.draw)
+                dot_files.append(write_dot_graph(k, output_dir, dot_gra,
+                                                 run_graphviz=False))
                 if args.split:
                     ccs = gra.connected_components()
                     for part, nodes in enumerate(ccs, 1):
                         gra2 = gra.copy(nodes)
-                        write_dot_graph(k, output_dir,
-                                        stacgraph.DotGraph(gra2),
-                                        part=part,
-                                        run_graphviz=args.draw)
+                        dot_files.append(
+                            write_dot_graph(k, output_dir,
+                                            stacgraph.DotGraph(gra2),
+                                            part=part,
+                                            run_graphviz=False))
             else:
                 print("Skipping %s (empty graph)" % k, file=sys.stderr)
         except graph.DuplicateIdException:
             warning = "WARNING: %s has duplicate annotation ids" % k
             print(warning, file=sys.stderr)
+    if args.draw:
+        _render_dot_graphs(dot_files, args)
 
 
 def _main_rfc_graph(args):
@@ -99,6 +114,7 @@ def _main_rfc_graph(args):
     else:
         keys = [k for k in corpus if k.stage == 'discourse']
 
+    dot_files = []
     for key in sorted(keys):
         gra = stacgraph.Graph.from_doc(corpus, key)
         for subgra_nodes in gra.connected_components():
@@ -112,10 +128,12 @@ def _main_rfc_graph(args):
             gra.annotation(link).features['highlight'] = 'red'
         dot_gra = stacgraph.DotGraph(gra)
         if dot_gra.get_nodes():
-            write_dot_graph(key, output_dir, dot_gra,
-                            run_graphviz=args.draw)
+            dot_files.append(write_dot_graph(key, output_dir, dot_gra,
+                                             run_graphviz=False))
         else:
             print("Skipping %s (empty graph)" % key, file=sys.stderr)
+    if args.draw:
+        _render_dot_graphs(dot_files, args)
 
 
 def _main_enclosure_graph(args):
@@ -130,6 +148,7 @@ def _main_enclosure_graph(args):
     else:
         postags = None
 
+    dot_files = []
     for k in sorted(keys):
         if postags:
             gra_ = stacgraph.EnclosureGraph(corpus[k], postags[k])
@@ -138,10 +157,12 @@ def _main_enclosure_graph(args):
         dot_gra = stacgraph.EnclosureDotGraph(gra_)
         if dot_gra.get_nodes():
             dot_gra.set("ratio", "compress")
-            write_dot_graph(k, output_dir, dot_gra,
-                            run_graphviz=args.draw)
+            dot_files.append(write_dot_graph(k, output_dir, dot_gra,
+                                             run_graphviz=False))
         else:
             print("Skipping %s (empty graph)" % k, file=sys.stderr)
+    if args.draw:
+        _render_dot_graphs(dot_files, args)
 
 # ---------------------------------------------------------------------
 # args
@@ -165,6 +186,9 @@ def config_argparser(parser):
                         dest='draw',
                         default=True,
                         help='Do not actually draw the graph')
+    parser.add_argument('--jobs', '-j', metavar='N', type=positive_int,
+                        help='Run up to N graphviz processes at once '
+                        '(default: number of CPUs)')
     parser.add_argument('--highlight', nargs='+',
                         metavar='ANNO_ID', type=anno_id,
                         help='Highlight these annotations')
@@ -8,7 +8,11 @@ Help writing out corpus files
 from __future__ import print_function
 import codecs
 import copy
+import hashlib
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 import os
+import subprocess
 import sys
 from io import BytesIO
 
@@ -72,15 +76,93 @@ def save_document(output_dir, k, doc):
 def write_dot_graph(doc_key, odir, dot_graph, part=None, run_graphviz=True):
     """
     Write a dot graph and possibly run graphviz on it
+
+    If you are writing more than one graph, you probably want to
+    set `run_graphviz` to False and pass the dot files returned by
+    this function to `render_dot_graphs` in one go.
+
+    Returns
+    -------
+    dot_file : string
+        Path to the dot file
     """
     ofile_basename = output_path_stub(odir, doc_key)
     if part is not None:
         ofile_basename += '_' + str(part)
     dot_file = ofile_basename + '.dot'
-    svg_file = ofile_basename + '.svg'
     mk_parent_dirs(dot_file)
     with codecs.open(dot_file, 'w', encoding='utf-8') as dotf:
         print(dot_graph.to_string(), file=dotf)
     if run_graphviz:
-        print("Creating %s" % svg_file, file=sys.stderr)
-        os.system('dot -T svg -o %s %s' % (svg_file, dot_file))
+        try:
+            render_dot_graphs([dot_file])
+        except OSError as oops:
+            print("Couldn't run graphviz. (%s)" % oops, file=sys.stderr)
+    return dot_file
+
+
+def _render_dot_graph(dot_file, out_file, fmt):
+    """
+    Run graphviz on a dot file, unless the output file was already
+    rendered from the same dot file contents.
+
+    Return True if graphviz was run.
+    """
+    with open(dot_file, 'rb') as fin:
+        digest = hashlib.sha1(fin.read()).hexdigest()
+    stamp_file = out_file + '.sha1'
+    if os.path.exists(out_file) and os.path.exists(stamp_file):
+        with open(stamp_file) as fin:
+            if fin.read().strip() == digest:
+                return False
+    print("Creating %s" % out_file, file=sys.stderr)
+    if subprocess.call(['dot', '-T', fmt, '-o', out_file, dot_file]) == 0:
+        with open(stamp_file, 'w') as fout:
+            print(digest, file=fout)
+    return True
+
+
+def render_dot_graphs(dot_files, fmt='svg', jobs=None):
+    """
+    Run graphviz on a batch of dot files (`foo.dot` is rendered
+    as eg. `foo.svg`), with up to `jobs` concurrent `dot` processes.
+
+    Graphs are only rendered if their dot file has changed since they
+    were last rendered: we keep the hash of the dot file next to the
+    rendered graph (eg. in `foo.svg.sha1`).
+
+    Parameters
+    ----------
+    dot_files : list of string
+        Paths to the dot files
+    fmt : string, defaults to 'svg'
+        Output format (and file extension)
+    jobs : int, optional
+        Maximum number of concurrent `dot` processes ; defaults to
+        the number of CPUs
+
+    Returns
+    -------
+    n_rendered : int
+        Number of graphs that were (re-)rendered
+
+    Raises
+    ------
+    OSError
+        If graphviz could not be run
+    """
+    tasks = [(dot_file, os.path.splitext(dot_file)[0] + '.' + fmt)
+             for dot_file in dot_files]
+    if not tasks:
+        return 0
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    # the work is done by the dot processes, so threads are enough
+    pool = ThreadPool(min(jobs, len(tasks)))
+    try:
+        rendered = pool.map(lambda t: _render_dot_graph(t[0], t[1], fmt),
+                            tasks)
+    finally:
+        pool.close()
+        pool.join()
+    return sum(rendered)
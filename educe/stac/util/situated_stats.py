@@ -5,13 +5,22 @@ respect to the purely linguistic (spect) version.
 
 from __future__ import absolute_import, print_function
 
-import copy
 from glob import glob
 from itertools import chain
+import json
 import os
 import warnings
 
+from joblib import Parallel, delayed
+import numpy as np
 import pandas as pd
+import six
+
+try:
+    import pyarrow  # pylint: disable=unused-import
+    HAS_PYARROW = True  # pandas can read and write parquet, feather
+except ImportError:
+    HAS_PYARROW = False
 
 from educe.stac.annotation import (
     is_dialogue, is_edu, is_paragraph, is_preference, is_relation_instance,
@@ -161,6 +170,34 @@ REL_COLS = [
     'target',
 ]
 
+# explicit types of columns in the columnar dumps: highly repeated
+# strings (annotators, types, speakers...) are stored as categoricals
+CATEGORICAL_COLS = [
+    'doc',
+    'subdoc',
+    'stage',
+    'annotator',
+    'type',
+    'author',
+    'last_modifier',
+    'emitter',
+    'addressee',
+    'surface_act',
+    'arg_scope',
+    'status',
+    'kind',
+    'correctness',
+]
+
+INTEGER_COLS = [
+    'span_beg',
+    'span_end',
+    'seg_idx',
+    'turn_span_beg',
+    'turn_span_end',
+    'len_seg',
+]
+
 
 def compute_rel_attributes(seg_df, rel_df):
     """Compute additional attributes on relations.
@@ -182,47 +219,87 @@ def compute_rel_attributes(seg_df, rel_df):
     """
     discrel_types = frozenset(SUBORDINATING_RELATIONS +
                               COORDINATING_RELATIONS)
-    len_segs = []
-    len_edus = []
-    len_eeus = []
-    for _, row in rel_df[['source', 'target', 'type']].iterrows():
-        if row['type'] not in discrel_types:
-            # non-discourse relations, eg. anaphoric :
-            # don't compute length for the moment
-            # len_segs.append(None)
-            # len_edus.append(None)
-            # len_eeus.append(None)
-            raise ValueError("Unable to compute the length of a "
-                             "non-discourse relation: {}".format(row['type']))
-        # discourse relations
-        seg_src = seg_df[
-            (seg_df['global_id'] == row['source'])
-        ]
-        seg_tgt = seg_df[
-            (seg_df['global_id'] == row['target'])
-        ]
-        # compute length of attachment
-        try:
-            len_seg = (seg_tgt['seg_idx'].values[0] -
-                       seg_src['seg_idx'].values[0])
-        except IndexError:
-            print(row)
-            print('tgt', seg_tgt)
-            print('src', seg_src)
-            raise
-        len_segs.append(len_seg)
-        len_edu = (seg_tgt['edu_idx'].values[0] -
-                   seg_src['edu_idx'].values[0])
-        len_edus.append(len_edu)
-        len_eeu = (seg_tgt['eeu_idx'].values[0] -
-                   seg_src['eeu_idx'].values[0])
-        len_eeus.append(len_eeu)
-    rel_df['len_seg'] = pd.Series(len_segs)
-    rel_df['len_edu'] = pd.Series(len_edus)
-    rel_df['len_eeu'] = pd.Series(len_eeus)
+    non_disc = ~rel_df['type'].isin(discrel_types)
+    if non_disc.any():
+        # non-discourse relations, eg. anaphoric :
+        # don't compute length for the moment
+        raise ValueError("Unable to compute the length of a "
+                         "non-discourse relation: {}".format(
+                             rel_df['type'][non_disc].iloc[0]))
+    # discourse relations: look up the indices of both endpoints
+    # (first segment with the given global_id, as a mask would)
+    seg_idxs = seg_df.drop_duplicates('global_id').set_index('global_id')[
+        ['seg_idx', 'edu_idx', 'eeu_idx']]
+    src_idxs = seg_idxs.reindex(rel_df['source'].values)
+    tgt_idxs = seg_idxs.reindex(rel_df['target'].values)
+    missing = (src_idxs['seg_idx'].isnull().values |
+               tgt_idxs['seg_idx'].isnull().values)
+    if missing.any():
+        row = rel_df[missing].iloc[0]
+        raise IndexError("Unknown endpoint for relation {} ({}: {} -> {})"
+                         "".format(row['global_id'], row['type'],
+                                   row['source'], row['target']))
+    # compute length of attachment
+    rel_df['len_seg'] = pd.Series(tgt_idxs['seg_idx'].values -
+                                  src_idxs['seg_idx'].values)
+    rel_df['len_edu'] = pd.Series(tgt_idxs['edu_idx'].values -
+                                  src_idxs['edu_idx'].values)
+    rel_df['len_eeu'] = pd.Series(tgt_idxs['eeu_idx'].values -
+                                  src_idxs['eeu_idx'].values)
     return rel_df
 
 
+def get_seg_turn_cols(seg_df, turn_df):
+    """Retrieve turn info for segments (EDUs, EEUs).
+
+    Each segment is matched with the turn that contains it, from the
+    same doc and subdoc, by an interval join on the sorted span starts
+    of turns (turns of a subdoc do not overlap).
+
+    Parameters
+    ----------
+    seg_df : DataFrame
+        Segments from a game.
+    turn_df : DataFrame
+        Turns from a game.
+
+    Returns
+    -------
+    seg_turn_cols : DataFrame
+        For each segment (same index as `seg_df`): the turn_id, and the
+        beg and end (char) positions of the segment in the turn text.
+    """
+    segs = seg_df[['doc', 'subdoc', 'span_beg', 'span_end', 'text']]
+    segs = segs.assign(seg_pos=range(len(segs)))
+    segs = segs.sort_values('span_beg', kind='mergesort')
+    turns = turn_df[['doc', 'subdoc', 'span_beg', 'span_end', 'text',
+                     'turn_id']]
+    turns = turns.sort_values('span_beg', kind='mergesort')
+    # last turn that starts at or before each segment
+    cands = pd.merge_asof(
+        segs.astype({'span_beg': 'int64'}),
+        turns.astype({'span_beg': 'int64'}).rename(
+            columns={'span_end': 'turn_end', 'text': 'turn_text'}),
+        on='span_beg', by=['doc', 'subdoc'], direction='backward')
+    cands = cands.sort_values('seg_pos')
+    # NB: each segment should be in a unique turn
+    if not (cands['span_end'] <= cands['turn_end']).all():
+        raise ValueError("Segment outside of any turn")
+    # compute the beg and end (char) positions of the segment in the turn
+    # so we can match between the situated and linguistic versions when
+    # the segmentation has changed
+    turn_span_beg = [turn_text.find(seg_text) for turn_text, seg_text
+                     in zip(cands['turn_text'], cands['text'])]
+    turn_span_end = [beg + len(seg_text) for beg, seg_text
+                     in zip(turn_span_beg, cands['text'])]
+    return pd.DataFrame({
+        'turn_id': cands['turn_id'].values,
+        'turn_span_beg': turn_span_beg,
+        'turn_span_end': turn_span_end,
+    }, index=seg_df.index, columns=['turn_id', 'turn_span_beg',
+                                    'turn_span_end'])
+
+
 def read_game_as_dataframes(game_folder, sel_annotator=None, thorough=True,
                             strip_cdus=False, attach_len=False):
     """Read an annotated game as dataframes.
@@ -465,8 +542,7 @@ def read_game_as_dataframes(game_folder, sel_annotator=None, thorough=True,
         if strip_cdus:
             endpts = dict()  # map relation ids to (src_id, tgt_id)
             dgr = Graph.from_doc(game_corpus, doc_key)
-            dgraph = copy.deepcopy(dgr)
-            dgraph.strip_cdus(sloppy=True, mode='head')
+            dgraph = dgr.without_cdus(sloppy=True, mode='head')
             for edge in dgraph.relations():
                 if "asoubeille_1414085458642" in edge:
                     print('Wop', edge)
@@ -475,9 +551,9 @@ def read_game_as_dataframes(game_folder, sel_annotator=None, thorough=True,
                 # get the identifiers of the relation and its endpoints
                 # to replace CDU ids with segment indices
                 anno_rel = dgraph.annotation(edge)
-                # as of 2017-06-24, anno_rel has no origin (why?) at
-                # this point
-                anno_rel.origin = doc_key  # temporary(?) fix
+                # relations created by without_cdus have no origin
+                if anno_rel.origin is None:
+                    anno_rel.origin = doc_key
                 #
                 anno_src = dgraph.annotation(links[0])
                 anno_tgt = dgraph.annotation(links[1])
@@ -559,32 +635,7 @@ def read_game_as_dataframes(game_folder, sel_annotator=None, thorough=True,
     # add columns computed from other dataframes
     # * for segments: retrieve the turn_id and the char positions of the
     # beg and end of the segment in the turn text
-    def get_seg_turn_cols(seg):
-        """Helper to retrieve turn info for a segment (EDU, EEU)."""
-        doc = seg['doc']
-        subdoc = seg['subdoc']
-        seg_beg = seg['span_beg']
-        seg_end = seg['span_end']
-        cand_turns = df_turns[(df_turns['span_beg'] <= seg_beg) &
-                              (seg_end <= df_turns['span_end']) &
-                              (doc == df_turns['doc']) &
-                              (subdoc == df_turns['subdoc'])]
-        # NB: cand_turns should contain a unique turn
-        # compute the beg and end (char) positions of the segment in the turn
-        # so we can match between the situated and linguistic versions when
-        # the segmentation has changed
-        turn_text = cand_turns['text'].item()
-        seg_text = seg['text']
-        turn_span_beg = turn_text.find(seg_text)
-        turn_span_end = turn_span_beg + len(seg_text)
-        turn_dict = {
-            'turn_id': cand_turns['turn_id'].item(),
-            'turn_span_beg': turn_span_beg,
-            'turn_span_end': turn_span_end,
-        }
-        return pd.Series(turn_dict)
-
-    seg_turn_cols = df_segs.apply(get_seg_turn_cols, axis=1)
+    seg_turn_cols = get_seg_turn_cols(df_segs, df_turns)
     df_segs = pd.concat([df_segs, seg_turn_cols], axis=1)
     # * length of attachments
     # 2017-06-29 restricted to *discourse* relations, for the time being
@@ -597,9 +648,12 @@ def read_game_as_dataframes(game_folder, sel_annotator=None, thorough=True,
 
 def read_corpus_as_dataframes(stac_data_dir, version='situated', split='all',
                               strip_cdus=False, attach_len=False,
-                              sel_games=None, exc_games=None):
+                              sel_games=None, exc_games=None, n_jobs=1,
+                              verbose=0):
     """Read the entire corpus as dataframes.
 
+    Games are read in parallel, each by `read_game_as_dataframes`.
+
     Parameters
     ----------
     stac_data_dir : str
@@ -619,6 +673,11 @@ def read_corpus_as_dataframes(stac_data_dir, version='situated', split='all',
     exc_games : list of str, optional
         List of excluded games. If `None`, all games for the selected
         version and split. Applies after, hence overrides, `sel_games`.
+    n_jobs : int, defaults to 1
+        Number of worker processes used to read the games, as in
+        `joblib.Parallel` (1 to read them in turn, -1 for one per CPU).
+    verbose : int, defaults to 0
+        Verbosity level of `joblib.Parallel`.
 
     Returns
     -------
@@ -653,19 +712,9 @@ def read_corpus_as_dataframes(stac_data_dir, version='situated', split='all',
     if exc_games is not None:
         game_dict = {k: v for k, v in game_dict.items()
                      if k not in exc_games}
-    # lists of dataframes
     # TODO dataframe of docs? or glozz documents = subdocs?
     # what fields should be included?
-    turn_dfs = []
-    dlg_dfs = []
-    seg_dfs = []
-    act_dfs = []
-    schm_dfs = []
-    schm_mbr_dfs = []
-    disc_rel_dfs = []
-    unit_rel_dfs = []
-    res_dfs = []
-    pref_dfs = []
+    game_folders = []
     for game_name, game_folder in game_dict.items():
         # TMP 2017-06-23 skip unfinished games
         if (version == 'situated' and
@@ -676,66 +725,180 @@ def read_corpus_as_dataframes(stac_data_dir, version='situated', split='all',
             # skip for now
             continue
         # end TMP
+        game_folders.append(game_folder)
+    if not game_folders:
+        raise ValueError("No game to read in {}".format(stac_data_dir))
 
-        game_dfs = read_game_as_dataframes(
+    game_dfs = Parallel(n_jobs=n_jobs, verbose=verbose)(
+        delayed(read_game_as_dataframes)(
             game_folder, strip_cdus=strip_cdus, attach_len=attach_len)
-        turn_dfs.append(game_dfs[0])
-        dlg_dfs.append(game_dfs[1])
-        seg_dfs.append(game_dfs[2])
-        act_dfs.append(game_dfs[3])
-        schm_dfs.append(game_dfs[4])
-        schm_mbr_dfs.append(game_dfs[5])
-        disc_rel_dfs.append(game_dfs[6])
-        res_dfs.append(game_dfs[7])
-        pref_dfs.append(game_dfs[8])
-        unit_rel_dfs.append(game_dfs[9])
-    # concatenate each list into a single dataframe
-    turns = pd.concat(turn_dfs, ignore_index=True)
-    dlgs = pd.concat(dlg_dfs, ignore_index=True)
-    segs = pd.concat(seg_dfs, ignore_index=True)
-    acts = pd.concat(act_dfs, ignore_index=True)
-    schms = pd.concat(schm_dfs, ignore_index=True)
-    schm_mbrs = pd.concat(schm_mbr_dfs, ignore_index=True)
-    disc_rels = pd.concat(disc_rel_dfs, ignore_index=True)
-    unit_rels = pd.concat(unit_rel_dfs, ignore_index=True)
-    res = pd.concat(res_dfs, ignore_index=True)
-    pref = pd.concat(pref_dfs, ignore_index=True)
-    return (turns, dlgs, segs, acts, schms, schm_mbrs, disc_rels, res, pref,
-            unit_rels)
-
-
-def load_corpus_dataframes(base_dir, dump_fmt='csv'):
+        for game_folder in game_folders)
+    # lists of dataframes: turns, dlgs, segs, acts, schms, schm_mbrs,
+    # disc_rels, res, pref, unit_rels
+    kind_dfs = [list(x) for x in zip(*game_dfs)]
+    del game_dfs
+    # concatenate each list into a single dataframe, one kind at a time
+    # and dropping the per-game dataframes as we go, so that we never
+    # hold two copies of the whole corpus
+    corpus_dfs = []
+    while kind_dfs:
+        corpus_dfs.append(pd.concat(kind_dfs.pop(0), ignore_index=True))
+    return tuple(corpus_dfs)
+
+
+def set_column_types(df):
+    """Give explicit types to the known columns of a corpus DataFrame.
+
+    Columns in `CATEGORICAL_COLS` become categoricals, columns in
+    `INTEGER_COLS` become integers if they have no missing value.
+
+    Parameters
+    ----------
+    df : DataFrame
+        Corpus DataFrame.
+
+    Returns
+    -------
+    df : DataFrame
+        Copy of the DataFrame with typed columns.
+    """
+    dtypes = {}
+    for col in df.columns:
+        if col in CATEGORICAL_COLS:
+            dtypes[col] = 'category'
+        elif col in INTEGER_COLS and not df[col].isnull().any():
+            dtypes[col] = 'int64'
+    return df.astype(dtypes)
+
+
+def _dump_npz(df, path):
+    """Dump a DataFrame to a numpy .npz archive, column by column.
+
+    Strings are stored as one utf-8 buffer with the offsets of each
+    string and a mask for missing values, categoricals as codes and
+    categories. Only columns of python objects other than strings need
+    pickling.
+    """
+    def is_str(values):
+        "if all values are strings"
+        return all(isinstance(x, six.string_types) for x in values)
+
+    arrays = {}
+    encodings = {}
+    for col in df.columns:
+        ser = df[col]
+        if ser.dtype.name == 'category':
+            encodings[col] = 'category'
+            arrays[col] = ser.cat.codes.values
+            categories = ser.cat.categories.values
+            if is_str(categories):
+                categories = np.array(categories, dtype='U')
+            arrays[col + '.categories'] = categories
+        elif ser.dtype == object or ser.dtype.name in ('str', 'string'):
+            values = np.asarray(ser, dtype=object)
+            isna = pd.isnull(values)
+            if is_str(values[~isna]):
+                encodings[col] = 'str'
+                strs = np.where(isna, u'', values)
+                arrays[col] = np.frombuffer(
+                    u''.join(strs).encode('utf-8'), dtype=np.uint8)
+                arrays[col + '.offsets'] = np.cumsum(
+                    [0] + [len(x) for x in strs])
+                arrays[col + '.isna'] = isna
+            else:
+                encodings[col] = 'object'
+                arrays[col] = values
+        else:
+            encodings[col] = 'raw'
+            arrays[col] = ser.values
+    meta = {'columns': list(df.columns), 'encodings': encodings}
+    arrays['__meta__'] = np.array(json.dumps(meta))
+    arrays['__index__'] = df.index.values
+    np.savez(path, **arrays)
+
+
+def _load_npz(path, columns=None):
+    """Load a DataFrame dumped by `_dump_npz`, maybe only some columns.
+
+    The archive is read lazily, so unselected columns are never read.
+    """
+    with np.load(path, allow_pickle=True) as npz:
+        meta = json.loads(str(npz['__meta__']))
+        if columns is None:
+            columns = meta['columns']
+        data = {}
+        for col in columns:
+            encoding = meta['encodings'][col]
+            if encoding == 'category':
+                data[col] = pd.Categorical.from_codes(
+                    npz[col], npz[col + '.categories'])
+            elif encoding == 'str':
+                joined = npz[col].tobytes().decode('utf-8')
+                offsets = npz[col + '.offsets'].tolist()
+                values = np.array([joined[beg:end] for beg, end
+                                   in zip(offsets, offsets[1:])],
+                                  dtype=object)
+                values[npz[col + '.isna']] = None
+                data[col] = values
+            else:
+                data[col] = npz[col]
+        return pd.DataFrame(data, columns=list(columns),
+                            index=pd.Index(npz['__index__']))
+
+
+def load_corpus_dataframes(base_dir, dump_fmt='csv', columns=None):
     """Load the dataframes from a corpus dump.
 
     Parameters
     ----------
     base_dir : str
         Path to the base folder for the dump.
-    dump_fmt : str, one of {'csv', 'pickle'}
+    dump_fmt : str, one of {'csv', 'pickle', 'feather', 'columnar'}
         Format of the dump ; determines the exact path as base_dir/subdir.
+    columns : dict(str, list of str), optional
+        Columns to load for some of the DataFrames, eg.
+        `{'segs': ['global_id', 'text']}` ; all columns if `None` or
+        for DataFrames absent from the dict. Columnar formats only read
+        the selected columns from disk.
 
     Returns
     -------
     corpus_dfs : tuple of DataFrame
         Corpus DataFrames.
     """
-    if dump_fmt not in ('csv', 'pickle'):
-        raise ValueError("dump_fmt must be one of {'csv', 'pickle'}")
+    if dump_fmt not in ('csv', 'pickle', 'feather', 'columnar'):
+        raise ValueError("dump_fmt must be one of {'csv', 'pickle', "
+                         "'feather', 'columnar'}")
     base_dir = os.path.abspath(base_dir)
     dump_dir = os.path.join(base_dir, dump_fmt)
     if not os.path.exists(dump_dir) or not os.path.isdir(dump_dir):
         raise ValueError("Unable to find data at {}".format(dump_dir))
+    if columns is None:
+        columns = {}
+
+    def load_columnar(fname, cols):
+        "load whichever of parquet or npz was dumped"
+        if os.path.exists(fname + '.parquet'):
+            return pd.read_parquet(fname + '.parquet', columns=cols)
+        return _load_npz(fname + '.npz', columns=cols)
+
     # loading function
     load_fns = {
-        'csv': lambda p: pd.DataFrame.from_csv(p, sep='\t', encoding='utf-8'),
-        'pickle': lambda p: pd.read_pickle(p),
+        'csv': lambda p, c: pd.DataFrame.from_csv(p, sep='\t',
+                                                  encoding='utf-8'),
+        'pickle': lambda p, c: pd.read_pickle(p),
+        'feather': lambda p, c: pd.read_feather(p, columns=c),
+        'columnar': load_columnar,
     }
     load_fn = load_fns[dump_fmt]
     #
     dfs = []
     for df_name in DF_NAMES:
         fname = os.path.join(dump_dir, df_name)
-        df = load_fn(fname)
+        cols = columns.get(df_name)
+        df = load_fn(fname, cols)
+        if cols is not None and dump_fmt in ('csv', 'pickle'):
+            df = df[cols]
         dfs.append(df)
     return tuple(dfs)
 
@@ -750,19 +913,30 @@ def dump_corpus_dataframes(corpus_dfs, out_dir, out_fmt='csv'):
         acts, schms, schm_mbrs, rels, res, pref.
     out_dir : str
         Output folder.
-    out_fmt : one of {'csv', 'pickle', 'feather'}
-        Output format.
+    out_fmt : one of {'csv', 'pickle', 'feather', 'columnar'}
+        Output format. 'columnar' stores typed columns (see
+        `set_column_types`) as parquet if pyarrow is available, numpy
+        .npz archives otherwise.
     """
+    def dump_columnar(df, path):
+        "dump typed columns to parquet or npz"
+        df = set_column_types(df)
+        if HAS_PYARROW:
+            df.to_parquet(path + '.parquet')
+        else:
+            _dump_npz(df, path + '.npz')
+
     # dump function
     dump_fns = {
         'csv': lambda x, p: x.to_csv(path_or_buf=p, sep='\t',
                                      encoding='utf-8'),
         'pickle': lambda x, p: x.to_pickle(p),
         'feather': lambda x, p: x.to_feather(p),
+        'columnar': dump_columnar,
     }
     if out_fmt not in dump_fns.keys():
         raise ValueError('out_fmt needs to be one of {}'.format(
-            out_fmts.keys()))
+            dump_fns.keys()))
     dump_fn = dump_fns[out_fmt]  # dump function
     # output dir
     out_dir = os.path.abspath(os.path.join(out_dir, out_fmt))
@@ -234,7 +234,8 @@ class FakeGraph(educe.Graph):
 
     def _add_fake_node(self, anno_id, type):
         attrs = {
-            'type': type
+            'type': type,
+            'mirror': None
         }
         self.add_node(anno_id)
         for x in attrs.items():
@@ -345,6 +346,60 @@ class BasicGraphTest(unittest.TestCase):
         self.assertEqual(xset2, gr4.edus())
         self.assertEqual(set(['X1', 'X2']), gr4.cdus())
 
+    def test_connected_components(self):
+        "relations to a CDU connect to its members"
+        gr = FakeGraph()
+        gr.add_edus(1, 2, 3, 4, 5)
+        gr.add_cdu('X', [2, 3])
+        gr.add_cdu('Y', ['X', 4])
+        gr.add_rel('a', 1, 'Y')
+        expected = frozenset([frozenset(['1', '2', '3', '4', 'a', 'X', 'Y']),
+                              frozenset(['5'])])
+        self.assertEqual(expected, gr.connected_components())
+
+    def test_index_refresh(self):
+        "attribute and adjacency lookups follow graph modifications"
+        gr = FakeGraph()
+        gr.add_edus(1, 2, 3)
+        gr.add_rel('a', 1, 2)
+        self.assertEqual('rel', gr.type('a'))
+        self.assertEqual(['a'], gr.incoming_relations('2'))
+        self.assertEqual(['a'], gr.outgoing_relations('1'))
+        self.assertEqual(None, gr.containing_cdu('1'))
+        self.assertRaises(KeyError, gr.annotation, '1')
+
+        gr.add_rel('b', 3, 2)
+        gr.add_cdu('X', [1, 3])
+        self.assertEqual(['a', 'b'], gr.incoming_relations('2'))
+        self.assertEqual('X', gr.containing_cdu('3'))
+        self.assertEqual(frozenset(['a', 'b']), gr.relations())
+
+        gr.del_edge('a')
+        self.assertEqual(['b'], gr.incoming_relations('2'))
+        self.assertEqual(frozenset(['b']), gr.relations())
+        # the node form of 'a' stays in the graph
+        self.assertEqual('rel', gr.type('a'))
+        gr.del_node('a')
+        self.assertRaises(Exception, gr.type, 'a')
+
+        gr.add_node_attribute('1', ('annotation', 'one'))
+        self.assertEqual('one', gr.annotation('1'))
+
+    def test_cdu_hierarchy_refresh(self):
+        "CDU membership and containment follow graph modifications"
+        gr = FakeGraph()
+        gr.add_edus(1, 2, 3)
+        gr.add_cdu('X', [1, 2])
+        self.assertEqual(['X'], gr.containing_cdu_chain('1'))
+        self.assertEqual(frozenset(['1', '2']), gr.cdu_members('X', deep=True))
+
+        self.assertEqual([], gr.containing_cdu_chain('3'))
+        gr.add_cdu('Y', [3])
+        gr.add_cdu('Z', ['X', 'Y'])
+        self.assertEqual(['Y'], gr.containing_cdu_chain('3'))
+        self.assertEqual(frozenset(['1', '2', '3', 'X', 'Y']),
+                         gr.cdu_members('Z', deep=True))
+
 
 def test_relative_indices():
     """Test for relative_indices"""
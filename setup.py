@@ -22,6 +22,8 @@ REQS = [
     'nltk >= 3.0.0',
     'soundex',
     'pandas >= 0.17',
+    'scipy',
+    'joblib',
 ]
 
 